@@ -0,0 +1,68 @@
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from cnc_warmup.generators import fanuc31i_warmup, tnc640_warmup  # noqa: E402
+
+"""
+
+Template fill vs. line-by-line generation.
+
+Compares generate_program (precompiled template, single fill-and-join) with
+joining iter_program (every block rebuilt and every number formatted per call)
+over a parameter sweep.
+
+Usage:
+python benchmarks/bench_templates.py [repeat]
+
+"""
+
+
+# Parameter sweep: every call differs in travels, feeds and steps
+def _sweep(n: int = 200) -> list:
+    return [
+        dict(
+            program_name=f"WARMUP_{i}",
+            x_travel=500 + i * 1.5,
+            y_travel=400 + i * 0.25,
+            z_travel=300 + i,
+            start_feed_mm_min=1000 + i,
+            finish_feed_mm_min=2000 + i * 2,
+            steps=2 + i % 10,
+            start_rpm=500,
+            finish_rpm=6000 + i,
+            seconds_per_step=60,
+            include_coolant=bool(i % 2),
+            machine_label=f"Machine {i}" if i % 3 else None,
+        )
+        for i in range(n)
+    ]
+
+
+def main() -> None:
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    params = _sweep()
+    for name, mod in (("tnc640", tnc640_warmup), ("fanuc31i", fanuc31i_warmup)):
+        for p in params:
+            assert mod.generate_program(**p) == "".join(b + "\n" for b in mod.iter_program(**p))
+
+        def lines() -> None:
+            for p in params:
+                "".join(b + "\n" for b in mod.iter_program(**p))
+
+        def template() -> None:
+            for p in params:
+                mod.generate_program(**p)
+
+        t_lines = min(timeit.repeat(lines, number=1, repeat=repeat)) / len(params)
+        t_template = min(timeit.repeat(template, number=1, repeat=repeat)) / len(params)
+        print(
+            f"{name:9} lines: {t_lines * 1e6:8.1f} us/program   template: {t_template * 1e6:8.1f} us/program"
+            f"   speedup: {t_lines / t_template:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import os
+import random
+import sys
+from typing import List, Optional
+
+"""
+
+Local stand-in FTP server for trying `python -m cnc_warmup deploy`.
+
+Listens on one port per simulated machine and stores uploads under
+<root>/<port>/<directory>/<name>. Only what ftplib's login and storbinary
+need is implemented (USER, PASS, SYST, TYPE, PWD, CWD, MKD, PASV, EPSV, STOR,
+SIZE, NOOP, QUIT); any user/password is accepted. --delay adds latency to
+every reply and --fail-rate makes that share of STOR commands fail with 451,
+so connection reuse, concurrency and retries can be observed.
+
+Usage:
+python benchmarks/ftp_standin.py --root /tmp/ftp --ports 2121 2122 2123 [--delay 0.02] [--fail-rate 0.2]
+
+Point machine presets at it with "ftp": {"host": "127.0.0.1", "port": 2121}.
+
+"""
+
+
+class _Session:
+    def __init__(self, root: str, delay: float, fail_rate: float) -> None:
+        self.root = root
+        self.cwd = "/"
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.data_server: Optional[asyncio.AbstractServer] = None
+        self.data_conn: "asyncio.Future[asyncio.StreamReader]" = asyncio.get_running_loop().create_future()
+
+    def local(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self.cwd, name)).lstrip("/\\")
+        return os.path.join(self.root, path)
+
+    # Passive listener for one data connection; returns the port
+    async def open_passive(self) -> int:
+        await self.close_passive()
+        self.data_conn = asyncio.get_running_loop().create_future()
+
+        def accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            if not self.data_conn.done():
+                self.data_conn.set_result(reader)
+
+        self.data_server = await asyncio.start_server(accept, "127.0.0.1", 0)
+        return self.data_server.sockets[0].getsockname()[1]
+
+    async def close_passive(self) -> None:
+        if self.data_server is not None:
+            self.data_server.close()
+            self.data_server = None
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, root: str, delay: float, fail_rate: float) -> None:
+    session = _Session(root, delay, fail_rate)
+
+    async def reply(text: str) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        writer.write((text + "\r\n").encode("latin-1"))
+        await writer.drain()
+
+    await reply("220 cnc_warmup stand-in FTP")
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command, _, arg = line.decode("latin-1").strip().partition(" ")
+            command = command.upper()
+            if command == "USER":
+                await reply("331 Password required")
+            elif command == "PASS":
+                await reply("230 Logged in")
+            elif command == "SYST":
+                await reply("215 UNIX Type: L8")
+            elif command in ("TYPE", "NOOP"):
+                await reply("200 OK")
+            elif command == "PWD":
+                await reply(f'257 "{session.cwd}"')
+            elif command == "CWD":
+                session.cwd = os.path.normpath(os.path.join(session.cwd, arg)).replace("\\", "/")
+                os.makedirs(session.local("."), exist_ok=True)
+                await reply("250 OK")
+            elif command == "MKD":
+                os.makedirs(session.local(arg), exist_ok=True)
+                await reply(f'257 "{arg}" created')
+            elif command == "PASV":
+                port = await session.open_passive()
+                await reply(f"227 Entering Passive Mode (127,0,0,1,{port >> 8},{port & 0xFF})")
+            elif command == "EPSV":
+                port = await session.open_passive()
+                await reply(f"229 Entering Extended Passive Mode (|||{port}|)")
+            elif command == "STOR":
+                if session.data_server is None:
+                    await reply("425 Use PASV first")
+                    continue
+                await reply("150 Ok to send data")
+                data_reader = await session.data_conn
+                data = await data_reader.read()
+                await session.close_passive()
+                if random.random() < fail_rate:
+                    await reply("451 Simulated failure")
+                    continue
+                path = session.local(arg)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(data)
+                await reply("226 Transfer complete")
+            elif command == "SIZE":
+                try:
+                    await reply(f"213 {os.path.getsize(session.local(arg))}")
+                except OSError:
+                    await reply("550 No such file")
+            elif command == "QUIT":
+                await reply("221 Bye")
+                break
+            else:
+                await reply("502 Not implemented")
+    except ConnectionError:
+        pass
+    finally:
+        await session.close_passive()
+        writer.close()
+
+
+async def serve(root: str, ports: List[int], delay: float, fail_rate: float) -> None:
+    servers = []
+    for port in ports:
+        port_root = os.path.join(root, str(port))
+        os.makedirs(port_root, exist_ok=True)
+        servers.append(
+            await asyncio.start_server(
+                lambda r, w, pr=port_root: _handle(r, w, pr, delay, fail_rate), "127.0.0.1", port
+            )
+        )
+    print(f"Stand-in FTP on 127.0.0.1 ports {', '.join(map(str, ports))}, root {root}", file=sys.stderr, flush=True)
+    await asyncio.gather(*(s.serve_forever() for s in servers))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Stand-in FTP server for deploy testing")
+    parser.add_argument("--root", required=True, help="Directory uploads are stored under")
+    parser.add_argument("--ports", type=int, nargs="+", default=[2121])
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds added before every reply")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of STOR commands that fail")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.root, args.ports, args.delay, args.fail_rate))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+
+"""
+
+Load test for `python -m cnc_warmup serve`.
+
+Opens --concurrency keep-alive connections and sends --requests POST /generate
+calls in total, then reports throughput and latency percentiles. A share of
+the requests (--unique) uses distinct parameter sets so both the memoized path
+and the generate path are exercised. --cli N also times N subprocess CLI calls
+for comparison.
+
+Usage:
+python benchmarks/loadtest.py [--url http://127.0.0.1:8765] [--requests 5000]
+    [--concurrency 50] [--unique 0.1] [--cli 20]
+
+Without --url a server is started on a free port for the run.
+
+"""
+
+
+# Request bodies: the first `distinct` differ in travels, the rest repeat a few common ones
+def _payloads(count: int, unique: float) -> List[bytes]:
+    distinct = int(count * unique)
+    payloads = []
+    for i in range(count):
+        n = i if i < distinct else i % 8
+        payloads.append(
+            json.dumps(
+                {
+                    "controller": "fanuc31i" if n % 2 else "tnc640",
+                    "x_travel": 500 + n,
+                    "y_travel": 400 + n * 0.5,
+                    "z_travel": 300 + n % 200,
+                    "rpm_steps": 5,
+                    "seconds_per_step": 60,
+                    "coolant": True,
+                }
+            ).encode()
+        )
+    return payloads
+
+
+# Read one chunked or Content-Length response; returns (status, body size)
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, int]:
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "content-length" in headers:
+        return status, len(await reader.readexactly(int(headers["content-length"])))
+    size = 0
+    while True:
+        chunk_len = int((await reader.readline()).strip(), 16)
+        await reader.readexactly(chunk_len + 2)
+        size += chunk_len
+        if chunk_len == 0:
+            return status, size
+
+
+async def _client(host: str, port: int, queue: "asyncio.Queue[bytes]", latencies: List[float], failures: List[int]) -> None:
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            writer.write(
+                b"POST /generate HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+                % (host.encode(), len(body))
+                + body
+            )
+            status, _ = await _read_response(reader)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                failures.append(status)
+    finally:
+        writer.close()
+
+
+async def _run(host: str, port: int, payloads: List[bytes], concurrency: int) -> Dict[str, Any]:
+    queue: "asyncio.Queue[bytes]" = asyncio.Queue()
+    for p in payloads:
+        queue.put_nowait(p)
+    latencies: List[float] = []
+    failures: List[int] = []
+    started = time.perf_counter()
+    await asyncio.gather(*(_client(host, port, queue, latencies, failures) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {"elapsed": elapsed, "latencies": latencies, "failures": failures}
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+# Time subprocess CLI calls, the way the MES calls it today
+def _time_cli(count: int) -> List[float]:
+    times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "warmup.h")
+        for i in range(count):
+            started = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-m", "cnc_warmup", "--x-travel", str(500 + i), "--y-travel", "400",
+                 "--z-travel", "300", "--output", out],
+                cwd=ROOT,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            times.append(time.perf_counter() - started)
+    return times
+
+
+# Start a server on a free port; returns the process and port
+def _spawn_server() -> Tuple[subprocess.Popen, int]:
+    import socket
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "cnc_warmup", "serve", "--port", str(port)],
+        cwd=ROOT,
+        stderr=subprocess.PIPE,
+    )
+    proc.stderr.readline()  # "Serving warmup programs on ..."
+    return proc, port
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the warmup generator service")
+    parser.add_argument("--url", default="", help="Server URL (default: start one)")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--unique", type=float, default=0.1, help="Share of requests with distinct parameters")
+    parser.add_argument("--cli", type=int, default=0, help="Also time this many subprocess CLI calls")
+    args = parser.parse_args()
+
+    proc = None
+    if args.url:
+        host, _, port_text = args.url.split("://", 1)[-1].rstrip("/").partition(":")
+        port = int(port_text or 80)
+    else:
+        proc, port = _spawn_server()
+        host = "127.0.0.1"
+
+    try:
+        result = asyncio.run(_run(host, port, _payloads(args.requests, args.unique), args.concurrency))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    lat = result["latencies"]
+    print(f"{len(lat)} requests, {args.concurrency} connections, {args.unique:.0%} distinct parameter sets")
+    print(f"throughput: {len(lat) / result['elapsed']:10.1f} req/s")
+    print(
+        f"latency ms: p50 {_percentile(lat, 50) * 1e3:.2f}  p90 {_percentile(lat, 90) * 1e3:.2f}  "
+        f"p99 {_percentile(lat, 99) * 1e3:.2f}  max {max(lat) * 1e3:.2f}"
+    )
+    if result["failures"]:
+        print(f"failures: {len(result['failures'])} (statuses {sorted(set(result['failures']))})")
+
+    if args.cli:
+        times = _time_cli(args.cli)
+        print(f"subprocess CLI: {statistics.mean(times) * 1e3:.1f} ms/call mean over {len(times)} calls")
+
+
+if __name__ == "__main__":
+    main()
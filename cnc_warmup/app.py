@@ -1,95 +1,474 @@
-import argparse
 import sys
+import time
+from typing import Any, Dict, Optional, Tuple
 
-from .generators import generate_tnc_program, generate_fanuc_program
-from .config_loader import load_config, get_defaults
+# Startup is kept cheap for scripted CLI calls: argparse is only imported in CLI
+# mode, the config is only read if a default is actually used, only the selected
+# controller's generator module is loaded, and tkinter only loads for the GUI.
+
+
+# Config defaults, loaded on first use
+class _ConfigDefaults:
+    def __init__(self) -> None:
+        self._config: Optional[Dict[str, Any]] = None
+        self._defaults: Dict[str, Any] = {}
+        self.load_seconds = 0.0  # time spent loading, 0 if never loaded
+
+    # True once the config has been read (for a missing flag, batch mode, ...)
+    @property
+    def loaded(self) -> bool:
+        return self._config is not None
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            started = time.perf_counter()
+            from .config_loader import load_config, get_defaults
+
+            self._config = load_config(disk_cache=True)
+            self._defaults = get_defaults(self._config)
+            self.load_seconds = time.perf_counter() - started
+        return self._config
+
+    def as_dict(self) -> Dict[str, Any]:
+        self.config
+        return dict(self._defaults)
+
+    def get(self, key: str, fallback: Any) -> Any:
+        self.config
+        return self._defaults.get(key, fallback)
+
+
+# (argument dest, config key, fallback, type) for flags that default from the config
+_CONFIG_FLAGS = (
+    ("program_name", "program_name", "WARMUP", str),
+    ("start_rpm", "start_rpm", 500, float),
+    ("finish_rpm", "finish_rpm", 6000, float),
+    ("start_feed", "start_feed", 1000, float),
+    ("finish_feed", "finish_feed", 2000, float),
+    ("rpm_steps", "rpm_steps", 5, int),
+    ("seconds_per_step", "seconds_per_step", 1, int),
+    ("coolant", "coolant", False, bool),
+)
 
 
 def main() -> None:
-    # Load defaults for both GUI and CLI
-    config = load_config()
-    defaults = get_defaults(config)
+    # Long-running local HTTP service
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        from .server import main as serve_main
+
+        serve_main(sys.argv[2:])
+        return
+    # Upload generated programs to the machines
+    if len(sys.argv) > 1 and sys.argv[1] == "deploy":
+        from .deploy import main as deploy_main
+
+        deploy_main(sys.argv[2:])
+        return
+    # Pull programs out of a batch --archive
+    if len(sys.argv) > 1 and sys.argv[1] == "extract":
+        from .archive import main as extract_main
+
+        extract_main(sys.argv[2:])
+        return
+    # Index programs already on disk and their drift from the config
+    if len(sys.argv) > 1 and sys.argv[1] == "index":
+        from .program_index import main as index_main
+
+        index_main(sys.argv[2:])
+        return
+    # Regenerate programs whenever the config changes
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        from .watch import main as watch_main
+
+        watch_main(sys.argv[2:])
+        return
+
+    defaults = _ConfigDefaults()
 
     # If any CLI args are provided (beyond the script name), use CLI mode
     if len(sys.argv) > 1:
-        parser = argparse.ArgumentParser(description="Generate CNC warmup program")
-        parser.add_argument("--program-name", default=str(defaults.get("program_name", "WARMUP")))
-        parser.add_argument(
-            "--controller",
-            choices=["tnc640", "fanuc31i"],
-            default=str(defaults.get("controller", "tnc640")),
+        _run_cli(defaults)
+        return
+
+    _run_gui(defaults)
+
+
+# Program flags, shared by the CLI and the serve mode
+def _build_parser() -> Any:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate CNC warmup program")
+    parser.add_argument("--program-name")
+    parser.add_argument(
+        "--controller",
+        default=None,
+        help="tnc640, fanuc31i or an installed backend (batch mode generates all controllers unless given)",
+    )
+    parser.add_argument("--x-travel", type=float)
+    parser.add_argument("--y-travel", type=float)
+    parser.add_argument("--z-travel", type=float)
+    parser.add_argument("--start-rpm", type=float)
+    parser.add_argument("--finish-rpm", type=float)
+    parser.add_argument("--start-feed", type=float)
+    parser.add_argument("--finish-feed", type=float)
+    parser.add_argument("--rpm-steps", type=int)
+    parser.add_argument("--seconds-per-step", type=int)
+    # --no-coolant too, so a fully specified call never needs the config default
+    parser.add_argument("--coolant", dest="coolant", action=argparse.BooleanOptionalAction, default=None)
+    parser.add_argument("--output", default="", help="Output file path (defaults to stdout)")
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Strip comments and whitespace (and repeated modal words on Fanuc) to minimize program size",
+    )
+    parser.add_argument(
+        "--unrolled",
+        action="store_true",
+        help="Expand every loop into literal blocks, for controls without Custom Macro B / Q parameters "
+        "(streamed to the output)",
+    )
+    parser.add_argument(
+        "--estimate",
+        action="store_true",
+        help="Print the estimated cycle time per phase instead of the program",
+    )
+    parser.add_argument(
+        "--target-minutes",
+        type=float,
+        default=None,
+        help="Choose RPM steps, dwell and feeds to fit this warmup duration",
+    )
+    parser.add_argument(
+        "--ramp",
+        choices=["linear", "geometric", "s-curve", "table"],
+        default=None,
+        help="Spindle/feed ramp shape (table = ramp_table/feed_table from the config)",
+    )
+    parser.add_argument(
+        "--dwell-taper",
+        type=float,
+        default=None,
+        help="Shorten dwells towards finish RPM: the top step dwells (1 - taper) x seconds-per-step",
+    )
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="Run the spindle ramp during the Z/XY passes; only the dwell they do not cover is added after",
+    )
+    parser.add_argument(
+        "--idle-minutes",
+        type=float,
+        default=None,
+        help="Shorten the warmup for a machine idle this long (idle_profile in the config)",
+    )
+    parser.add_argument(
+        "--ambient-c", type=float, default=None, help="Shop temperature; colder than reference lengthens the warmup"
+    )
+    parser.add_argument(
+        "--all-machines",
+        "--batch",
+        dest="batch",
+        action="store_true",
+        help="Generate a program for every machine preset in the config",
+    )
+    parser.add_argument("--output-dir", default="generated", help="Batch mode output directory")
+    parser.add_argument(
+        "--inventory",
+        default="",
+        metavar="FILE",
+        help="Batch mode: stream the machines from a CSV/JSONL/JSON inventory instead of the config presets",
+    )
+    parser.add_argument(
+        "--archive",
+        default="",
+        metavar="FILE",
+        help="Batch mode: write all programs and a SHA-256 manifest into one .zip/.tar[.gz|.bz2|.xz|.zst] instead",
+    )
+    parser.add_argument("--jobs", type=int, default=0, help="Batch mode worker processes (defaults to CPU count)")
+    parser.add_argument(
+        "--idle-brackets",
+        action="store_true",
+        help="Batch mode: also write one shortened program per idle_profile bracket (_IDLE30 ...)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="",
+        help="Batch mode output cache: skip programs whose parameters and files are unchanged",
+    )
+    parser.add_argument("--cache-mb", type=float, default=256.0, help="Output cache size limit (LRU eviction)")
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Check generated programs (travel envelope, spindle/feed limits, syntax) before writing them",
+    )
+    parser.add_argument(
+        "--metrics-out",
+        default="",
+        metavar="FILE",
+        help="Write stage timings, per-program line/byte counts and peak memory as JSON",
+    )
+    parser.add_argument(
+        "--profile",
+        default="",
+        metavar="FILE",
+        help="Run under cProfile, dump the stats to FILE and print a stage summary",
+    )
+    return parser
+
+
+# Fill unset flags from the config (read only if something is missing)
+def _apply_config_defaults(args: Any, defaults: _ConfigDefaults) -> None:
+    for dest, key, fallback, kind in _CONFIG_FLAGS:
+        if getattr(args, dest) is None:
+            setattr(args, dest, kind(defaults.get(key, fallback)))
+    # The config's ramp applies only if the config was read anyway: a call that
+    # passes every _CONFIG_FLAGS value must not read it just for --ramp
+    if args.ramp is None:
+        args.ramp = str(defaults.get("ramp", "linear")) if defaults.loaded else "linear"
+
+
+def _run_cli(defaults: _ConfigDefaults) -> None:
+    started = time.perf_counter()
+    parser = _build_parser()
+    args = parser.parse_args()
+    if not (args.metrics_out or args.profile):
+        _run_parsed(parser, args, defaults, None)
+        return
+
+    from .metrics import RunMetrics
+
+    metrics = RunMetrics(args.profile)
+    metrics.add("parse_args", time.perf_counter() - started)
+    metrics.start_profile()
+    try:
+        _run_parsed(parser, args, defaults, metrics)
+    finally:
+        metrics.stop_profile()
+        if defaults.load_seconds:
+            metrics.add("config_load", defaults.load_seconds)
+        if args.metrics_out:
+            metrics.write(args.metrics_out)
+        if args.profile:
+            print(metrics.format(), file=sys.stderr)
+
+
+# CLI run after argument parsing; metrics (metrics.RunMetrics) collects stage timings if given
+def _run_parsed(parser: Any, args: Any, defaults: _ConfigDefaults, metrics: Any) -> None:
+    _apply_config_defaults(args, defaults)
+    if args.controller is not None:
+        _check_controller(parser, args.controller)
+    if args.target_minutes is not None and not 0 < args.target_minutes < float("inf"):
+        # Also rejects nan, which compares false
+        parser.error("--target-minutes must be a positive number")
+    if args.idle_minutes is not None or args.idle_brackets:
+        _check_idle_profile(parser, args, defaults)
+
+    if args.batch:
+        if args.archive and args.cache_dir:
+            parser.error("--archive cannot be combined with --cache-dir")
+        if args.unrolled and (args.archive or args.cache_dir):
+            # Both hold whole programs in memory; unrolled programs are streamed
+            parser.error("--unrolled cannot be combined with --archive or --cache-dir")
+        from .inventory import InventoryError, inventory_reader
+
+        if args.inventory:
+            try:
+                inventory_reader(args.inventory)
+            except InventoryError as exc:
+                parser.error(str(exc))
+        if args.archive:
+            from .archive import ArchiveError, archive_format
+
+            try:
+                archive_format(args.archive)
+            except ArchiveError as exc:
+                parser.error(str(exc))
+        try:
+            _run_batch(args, defaults, metrics)
+        except InventoryError as exc:
+            # Rows are checked as they are read, so this can come mid-run
+            print(f"Inventory error: {exc}", file=sys.stderr)
+            sys.exit(1)
+        except ValueError as exc:
+            # Bad ramp settings (shape, taper, table or step count)
+            parser.error(str(exc))
+        return
+    if args.archive or args.inventory:
+        parser.error("--archive and --inventory need --all-machines")
+    if args.x_travel is None or args.y_travel is None or args.z_travel is None:
+        parser.error("--x-travel, --y-travel and --z-travel are required (or use --all-machines)")
+
+    try:
+        params, note = _program_params(args, defaults)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if note:
+        print(note, file=sys.stderr)
+
+    if args.estimate:
+        from .estimate import estimate_cycle_time
+
+        print(estimate_cycle_time(args.controller, **params).format())
+        return
+    if args.unrolled:
+        _write_unrolled(parser, args, params, metrics)
+        return
+
+    from .generators import render_program
+
+    stages: Dict[str, float] = {}
+    try:
+        if metrics is None:
+            text = render_program(args.controller, params)
+        else:
+            from .metrics import timed_render
+
+            text, stages = timed_render(args.controller, params)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.compact:
+        full_size = len(render_program(args.controller, dict(params, compact=False)).encode("utf-8"))
+        print(f"Compact output: {_format_savings(full_size, len(text.encode('utf-8')))}", file=sys.stderr)
+
+    if args.validate:
+        from .validate import ValidationError, validate_program
+
+        started = time.perf_counter()
+        try:
+            validate_program(args.controller, text.splitlines(), params, source=args.output or "<stdout>")
+        except ValidationError as exc:
+            print(f"Validation failed: {exc}", file=sys.stderr)
+            sys.exit(1)
+        stages["validate"] = time.perf_counter() - started
+    started = time.perf_counter()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    if metrics is not None:
+        stages["write"] = time.perf_counter() - started
+        size = len(text.encode("utf-8"))
+        metrics.add_program(params["program_name"], args.controller, text.count("\n"), size, stages)
+
+
+# --unrolled single program: streamed to the output a chunk of blocks at a
+# time instead of being rendered to text. Validation, if asked for, runs over
+# a separate generation pass first, so nothing is written for a bad program.
+def _write_unrolled(parser: Any, args: Any, params: Dict[str, Any], metrics: Any) -> None:
+    from .generators import iter_program_blocks, stream_program, write_blocks
+
+    stages: Dict[str, float] = {}
+    try:
+        blocks = iter_program_blocks(args.controller, params)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.validate:
+        from .validate import ValidationError, validate_program
+
+        started = time.perf_counter()
+        try:
+            validate_program(
+                args.controller, iter_program_blocks(args.controller, params), params, source=args.output or "<stdout>"
+            )
+        except ValidationError as exc:
+            print(f"Validation failed: {exc}", file=sys.stderr)
+            sys.exit(1)
+        stages["validate"] = time.perf_counter() - started
+    started = time.perf_counter()
+    if args.output:
+        with open(args.output, "wb") as f:
+            size, lines, _ = write_blocks(blocks, f)
+    else:
+        size, lines, _ = write_blocks(blocks, sys.stdout.buffer)
+        sys.stdout.buffer.flush()
+    stages[f"stream:{args.controller}"] = time.perf_counter() - started
+    if args.compact:
+        full_size = stream_program(args.controller, dict(params, compact=False))[0]
+        print(f"Compact output: {_format_savings(full_size, size)}", file=sys.stderr)
+    if metrics is not None:
+        metrics.add_program(params["program_name"], args.controller, lines, size, stages)
+
+
+# Single-program generate_program arguments from parsed flags (config defaults
+# already applied), solving --target-minutes if given. Also returns the solver
+# summary line ("" without a target). Sets args.controller if it was unset.
+def _program_params(args: Any, defaults: _ConfigDefaults) -> Tuple[Dict[str, Any], str]:
+    if args.controller is None:
+        args.controller = str(defaults.get("controller", "tnc640"))
+    params = dict(
+        program_name=args.program_name,
+        x_travel=args.x_travel,
+        y_travel=args.y_travel,
+        z_travel=args.z_travel,
+        start_feed_mm_min=args.start_feed,
+        finish_feed_mm_min=args.finish_feed,
+        steps=int(args.rpm_steps),
+        start_rpm=args.start_rpm,
+        finish_rpm=args.finish_rpm,
+        seconds_per_step=max(0, int(args.seconds_per_step)),
+        include_coolant=bool(args.coolant),
+        machine_label=None,
+        compact=bool(args.compact),
+    )
+
+    note = ""
+    if args.target_minutes is not None:
+        from .solver import solve
+
+        solution = solve(
+            args.controller,
+            args.x_travel,
+            args.y_travel,
+            args.z_travel,
+            args.target_minutes * 60.0,
+            _solver_bounds(args, defaults),
         )
-        parser.add_argument("--x-travel", type=float, required=True)
-        parser.add_argument("--y-travel", type=float, required=True)
-        parser.add_argument("--z-travel", type=float, required=True)
-        parser.add_argument("--start-rpm", type=float, default=float(defaults.get("start_rpm", 500)))
-        parser.add_argument("--finish-rpm", type=float, default=float(defaults.get("finish_rpm", 6000)))
-        parser.add_argument("--start-feed", type=float, default=float(defaults.get("start_feed", 1000)))
-        parser.add_argument("--finish-feed", type=float, default=float(defaults.get("finish_feed", 2000)))
-        parser.add_argument("--rpm-steps", type=int, default=int(defaults.get("rpm_steps", 5)))
-        parser.add_argument("--seconds-per-step", type=int, default=int(defaults.get("seconds_per_step", 1)))
-        parser.add_argument("--coolant", dest="coolant", action="store_true", default=bool(defaults.get("coolant", False)))
-        parser.add_argument("--output", default="", help="Output file path (defaults to stdout)")
-
-        args = parser.parse_args()
-        gen_func = generate_tnc_program if args.controller == "tnc640" else generate_fanuc_program
-        program_text = gen_func(
-            program_name=args.program_name,
-            x_travel=args.x_travel,
-            y_travel=args.y_travel,
-            z_travel=args.z_travel,
-            start_feed_mm_min=args.start_feed,
-            finish_feed_mm_min=args.finish_feed,
-            steps=int(args.rpm_steps),
-            start_rpm=args.start_rpm,
-            finish_rpm=args.finish_rpm,
-            seconds_per_step=max(0, int(args.seconds_per_step)),
-            include_coolant=bool(args.coolant),
-            machine_label=None,
+        params.update(solution.params())
+        note = f"Target {args.target_minutes:g} min: {solution.format()}"
+    table = args.ramp == "table"
+    if table:
+        # Before the idle profile, which scales the table itself
+        from .ramps import apply_ramp, ramp_settings
+
+        params = apply_ramp(params, ramp_settings(defaults.as_dict(), args.ramp, args.dwell_taper))
+    if args.idle_minutes is not None:
+        from .profiles import IdleProfile
+
+        profile = IdleProfile.from_config(defaults.config)
+        severity = profile.severity(args.idle_minutes, args.ambient_c)
+        params = profile.apply(params, args.idle_minutes, args.ambient_c)
+        idle_note = (
+            f"Idle {args.idle_minutes:g} min: {100.0 * severity:.0f}% warmup "
+            f"({params['steps']} steps x {params['seconds_per_step']} s from {params['start_rpm']:g} rpm)"
         )
+        note = f"{note}\n{idle_note}" if note else idle_note
+    if not table and (args.ramp != "linear" or args.dwell_taper):
+        from .ramps import apply_ramp, ramp_settings
+
+        params = apply_ramp(params, ramp_settings(defaults.as_dict(), args.ramp, args.dwell_taper))
+    if args.overlap:
+        params["overlap"] = True
+    if args.unrolled:
+        params["unrolled"] = True
+    return params, note
 
-        if args.output:
-            with open(args.output, "w", encoding="utf-8") as f:
-                f.write(program_text)
-        else:
-            print(program_text, end="")
-        return
 
-    # Otherwise, run the GUI flow
-    from .gui_config import launch_gui_and_get_config
-    from tkinter import filedialog, messagebox, Tk
+def _run_gui(defaults: _ConfigDefaults) -> None:
+    from .gui_config import launch_gui_and_get_config, program_params
+    from .generators import render_program
+    from tkinter import filedialog, messagebox
 
     cfg = launch_gui_and_get_config()
     if cfg is None:
         return
 
-    program_name = str(getattr(cfg, "program_name", defaults.get("program_name", "WARMUP")))
-    rpm_steps = int(getattr(cfg, "rpm_steps", int(defaults.get("rpm_steps", 5))))
-    seconds_per_step = int(getattr(cfg, "seconds_per_step", int(defaults.get("seconds_per_step", 1))))
-
-    controller_label = str(getattr(cfg, "controller", "Heidenhain TNC 640"))
-    gen_func = generate_tnc_program if controller_label.startswith("Heidenhain") else generate_fanuc_program
-
-    # Machine label for header
-    selected_machine = str(getattr(cfg, "machine", ""))
-    machine_label = selected_machine if selected_machine and selected_machine != "Custom" else "Custom"
-
-    program_text = gen_func(
-        program_name=program_name,
-        x_travel=cfg.x_travel,
-        y_travel=cfg.y_travel,
-        z_travel=cfg.z_travel,
-        start_feed_mm_min=cfg.start_feed,
-        finish_feed_mm_min=cfg.finish_feed,
-        steps=rpm_steps,
-        start_rpm=cfg.start_rpm,
-        finish_rpm=cfg.finish_rpm,
-        seconds_per_step=max(0, seconds_per_step),
-        include_coolant=cfg.coolant,
-        machine_label=machine_label,
-    )
-
-    if gen_func is generate_tnc_program:
+    # The preview pane already rendered the program for these settings, normally
+    controller, params = program_params(cfg)
+    program_text = cfg.program_text or render_program(controller, params)
+
+    if controller == "tnc640":
         defext = ".h"
         ftypes = [("Heidenhain Program", ".h"), ("Text", ".txt"), ("All Files", "*.*")]
     else:
@@ -100,20 +479,227 @@ def main() -> None:
         title="Save Warmup Program",
         defaultextension=defext,
         filetypes=ftypes,
-        initialfile=f"{program_name}{defext}",
+        initialfile=f"{cfg.program_name}{defext}",
     )
     if path:
         with open(path, "w", encoding="utf-8") as f:
             f.write(program_text)
         messagebox.showinfo("Saved", f"Program saved to: {path}")
+
+
+# Batch mode: one program per machine preset and controller
+def _run_batch(args: Any, defaults: _ConfigDefaults, metrics: Any = None) -> None:
+    from .batch import iter_jobs, plan_jobs
+    from .config_loader import get_machine_index
+    from .generators import available_controllers
+
+    controllers = [args.controller] if args.controller else available_controllers()
+    batch_defaults = dict(defaults.as_dict(), program_name=args.program_name)
+    overrides = {
+        "start_feed_mm_min": args.start_feed,
+        "finish_feed_mm_min": args.finish_feed,
+        "steps": int(args.rpm_steps),
+        "start_rpm": args.start_rpm,
+        "finish_rpm": args.finish_rpm,
+        "seconds_per_step": max(0, int(args.seconds_per_step)),
+        "include_coolant": bool(args.coolant),
+        "compact": bool(args.compact),
+    }
+    started = time.perf_counter()
+    if args.inventory:
+        from .inventory import iter_inventory
+
+        # Streamed; only the solver, estimates and the output cache need the whole fleet at once
+        jobs: Any = iter_jobs(iter_inventory(args.inventory), batch_defaults, controllers, args.output_dir, overrides)
+        if args.target_minutes is not None or args.estimate or args.cache_dir:
+            jobs = list(jobs)
     else:
+        jobs = plan_jobs(get_machine_index(defaults.config), batch_defaults, controllers, args.output_dir, overrides)
+    if metrics is not None and isinstance(jobs, list):
+        metrics.add("plan_jobs", time.perf_counter() - started)
+    if args.target_minutes is not None:
+        _solve_batch(args, defaults, jobs)
+    settings = None
+    if args.ramp != "linear" or args.dwell_taper:
+        from .ramps import ramp_settings
+
+        settings = ramp_settings(defaults.as_dict(), args.ramp, args.dwell_taper)
+    if args.idle_minutes is not None or args.idle_brackets:
+        if args.ramp == "table":
+            # The idle profile scales the table itself, so it goes in first
+            jobs = _configure_jobs(jobs, settings, False, metrics is not None, args.validate)
+            settings = None
+        jobs = _apply_idle_profile(args, defaults, jobs)
+    jobs = _configure_jobs(jobs, settings, args.overlap, metrics is not None, args.validate, args.unrolled)
+    if args.estimate:
+        _print_batch_estimates(list(jobs))
+        return
+    cache = None
+    if args.cache_dir:
+        from .output_cache import OutputCache
+
+        cache = OutputCache(args.cache_dir, int(args.cache_mb * 1024 * 1024))
+    archive = None
+    if args.archive:
+        from .archive import ArchiveError, ArchiveWriter
+
         try:
-            root = Tk()
-            root.withdraw()
-            messagebox.showinfo("Program", program_text[:1000] + ("..." if len(program_text) > 1000 else ""))
-            root.destroy()
-        except Exception:
-            print(program_text)
+            archive = ArchiveWriter(args.archive)
+        except ArchiveError as exc:
+            print(f"Archive failed: {exc}", file=sys.stderr)
+            sys.exit(1)
+    from .validate import ValidationError
+
+    try:
+        summary = _run_archived(jobs, args.jobs, cache, archive)
+    except ValidationError as exc:
+        print(f"Validation failed: {exc}", file=sys.stderr)
+        sys.exit(1)
+    if metrics is not None:
+        metrics.add("batch", summary.seconds)
+        for stats in summary.program_stats:
+            metrics.add_program(stats["program"], stats["controller"], stats["lines"], stats["bytes"], stats["stages"])
+    print(summary.format())
+    if cache is not None:
+        print(cache.format())
+    if archive is not None:
+        print(archive.format())
 
 
+# Per-job options (ramp shape, overlap, metrics, validation), applied as the
+# jobs are consumed. Lists stay lists.
+def _configure_jobs(
+    jobs: Any, settings: Any, overlap: bool, metrics: bool, validate: bool, unrolled: bool = False
+) -> Any:
+    from .ramps import apply_ramp
+
+    def configured() -> Any:
+        for job in jobs:
+            if settings is not None:
+                job.params = apply_ramp(job.params, settings)
+            if overlap:
+                job.params["overlap"] = True
+            if unrolled:
+                job.params["unrolled"] = True
+            job.metrics = metrics
+            job.validate = validate
+            yield job
+
+    return list(configured()) if isinstance(jobs, list) else configured()
+
+
+# run_batch, completing the archive (if any) on success and dropping it on failure
+def _run_archived(jobs: list, workers: int, cache: Any, archive: Any) -> Any:
+    from .batch import run_batch
+
+    if archive is None:
+        return run_batch(jobs, workers, cache)
+    with archive:
+        return run_batch(jobs, workers, archive=archive)
+
+
+# Search bounds: config defaults, overridden by explicit CLI values
+def _solver_bounds(args: Any, defaults: _ConfigDefaults) -> Any:
+    from .solver import SolverBounds
+
+    return SolverBounds.from_defaults(
+        dict(
+            defaults.as_dict(),
+            start_rpm=args.start_rpm,
+            finish_rpm=args.finish_rpm,
+            start_feed=args.start_feed,
+            finish_feed=args.finish_feed,
+            rpm_steps=args.rpm_steps,
+        )
+    )
+
+
+# Batch mode with --target-minutes: solve the whole fleet per controller, then update the jobs
+def _solve_batch(args: Any, defaults: _ConfigDefaults, jobs: list) -> None:
+    from .solver import solve_fleet
+
+    started = time.perf_counter()
+    bounds = _solver_bounds(args, defaults)
+    infeasible = []
+    for controller in dict.fromkeys(j.controller for j in jobs):
+        group = [j for j in jobs if j.controller == controller]
+        travels = [(j.params["x_travel"], j.params["y_travel"], j.params["z_travel"]) for j in group]
+        for job, solution in zip(group, solve_fleet(controller, travels, args.target_minutes * 60.0, bounds)):
+            job.params.update(solution.params())
+            if not solution.feasible:
+                infeasible.append(job)
+    elapsed = time.perf_counter() - started
+    print(f"Solved {len(jobs)} programs for a {args.target_minutes:g} min target in {elapsed:.3f} s")
+    for job in infeasible:
+        print(f"  {job.params['program_name']}: target too short, using the shortest program", file=sys.stderr)
+
+
+# Reject an unknown --controller before any mode runs. Built-in keys skip the
+# entry point scan, which is slow to import.
+def _check_controller(parser: Any, controller: str) -> None:
+    from .generators import CONTROLLER_MODULES, available_controllers
+
+    if controller in CONTROLLER_MODULES:
+        return
+    choices = available_controllers()
+    if controller not in choices:
+        parser.error(f"Unknown controller: {controller} (choose from {', '.join(choices)})")
+
+
+# Reject bad idle flags and an invalid idle_profile in the config up front
+def _check_idle_profile(parser: Any, args: Any, defaults: _ConfigDefaults) -> None:
+    from .profiles import IdleProfile
+
+    if args.idle_minutes is not None and args.idle_minutes < 0:
+        parser.error("--idle-minutes cannot be negative")
+    if args.idle_minutes is not None and args.idle_brackets:
+        parser.error("--idle-minutes and --idle-brackets cannot be combined")
+    try:
+        IdleProfile.from_config(defaults.config)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+
+# Batch mode with --idle-minutes (scale every program) or --idle-brackets (add a
+# shortened program per idle bracket next to each full one). Lazy job streams
+# stay lazy.
+def _apply_idle_profile(args: Any, defaults: _ConfigDefaults, jobs: Any) -> Any:
+    from .profiles import IdleProfile, bracket_jobs
+
+    profile = IdleProfile.from_config(defaults.config)
+    if args.idle_brackets:
+        if isinstance(jobs, list):
+            return bracket_jobs(jobs, profile, args.ambient_c)
+        return (expanded for job in jobs for expanded in bracket_jobs([job], profile, args.ambient_c))
+    severity = profile.severity(args.idle_minutes, args.ambient_c)
+    print(f"Idle {args.idle_minutes:g} min: {100.0 * severity:.0f}% warmup", file=sys.stderr)
+
+    def scaled() -> Any:
+        for job in jobs:
+            job.params = profile.apply(job.params, args.idle_minutes, args.ambient_c)
+            yield job
+
+    return list(scaled()) if isinstance(jobs, list) else scaled()
+
+
+# Batch mode with --estimate: one line per program, estimated in a single call per controller
+def _print_batch_estimates(jobs: list) -> None:
+    from .estimate import estimate_batch, format_duration
+
+    for controller in dict.fromkeys(j.controller for j in jobs):
+        group = [j for j in jobs if j.controller == controller]
+        names = (
+            "x_travel", "y_travel", "z_travel", "start_feed_mm_min", "finish_feed_mm_min", "steps",
+            "start_rpm", "finish_rpm", "seconds_per_step",
+        )
+        columns = {n: [j.params[n] for j in group] for n in names}
+        columns.update({n: [j.params.get(n) for j in group] for n in ("spindle_ramp", "feed_ramp", "overlap")})
+        totals = estimate_batch(controller, columns)["total_seconds"]
+        for job, total in zip(group, totals):
+            print(f"{job.params['program_name']:<32} {controller:<9} {format_duration(total):>12}  {job.machine}")
+
 
+# "2477 -> 1500 bytes (39.4% smaller)"
+def _format_savings(full_size: int, size: int) -> str:
+    saved = 100.0 * (full_size - size) / full_size if full_size else 0.0
+    return f"{full_size} -> {size} bytes ({saved:.1f}% smaller)"
@@ -0,0 +1,330 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from .generators import GENERATOR_VERSION
+from .output_cache import file_sha256, write_atomic
+
+"""
+
+Single-file archive output for batch runs (--archive) and its extractor.
+
+Batch mode normally writes one file per program. With --archive out.zip (or
+.tar, .tar.gz/.tgz, .tar.bz2, .tar.xz, .tar.zst/.tzst) the pool workers send
+the program bytes back instead, and the parent adds each chunk to the archive
+as soon as it finishes: nothing is staged on disk. The archive is written
+under a temporary name and renamed when complete, so a failed or interrupted
+run never leaves a partial archive at the target path.
+
+The last member, MANIFEST.json, lists every program: member name, machine,
+controller, generate_program parameters, size and SHA-256.
+
+Extract with:
+python -m cnc_warmup extract out.zip [--dest generated] [--since old.zip] [--all] [--dry-run]
+
+By default only members whose destination file is missing or differs from
+the manifest SHA-256 are written; --since compares against an older archive's
+manifest instead, so the destination files need not be read. Every member is
+checked against the manifest before it is written.
+
+Notes:
+.tar.zst needs the zstandard package (pip install zstandard); the other
+formats use the standard library only. Tar archives are written and read as
+streams; the extractor reads a tar twice (manifest, then members), which costs
+one extra decompression of what are small text files.
+Members (and manifest entries) are in the order the chunks finish, so with
+--jobs > 1 the order, not the content, can differ between runs. Manifest
+entries are spooled to a temporary file while the batch runs, so memory
+does not grow with the number of programs.
+
+"""
+
+MANIFEST_NAME = "MANIFEST.json"
+# Bump when the manifest layout changes
+_MANIFEST_FORMAT = 1
+
+# Archive suffix -> (container, compression)
+ARCHIVE_FORMATS: Dict[str, Tuple[str, str]] = {
+    ".zip": ("zip", ""),
+    ".tar": ("tar", ""),
+    ".tar.gz": ("tar", "gz"),
+    ".tgz": ("tar", "gz"),
+    ".tar.bz2": ("tar", "bz2"),
+    ".tar.xz": ("tar", "xz"),
+    ".tar.zst": ("tar", "zst"),
+    ".tzst": ("tar", "zst"),
+}
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+# (container, compression) for an archive path, from its suffix
+def archive_format(path: str) -> Tuple[str, str]:
+    lower = path.lower()
+    for suffix in sorted(ARCHIVE_FORMATS, key=len, reverse=True):
+        if lower.endswith(suffix):
+            return ARCHIVE_FORMATS[suffix]
+    raise ArchiveError(f"Unsupported archive type: {path} (use one of {', '.join(ARCHIVE_FORMATS)})")
+
+
+def _zstandard() -> Any:
+    try:
+        import zstandard
+    except ImportError:
+        raise ArchiveError(".tar.zst archives need the zstandard package (pip install zstandard)") from None
+    return zstandard
+
+
+# Streams programs into one archive; close() appends the manifest and moves
+# the archive into place.
+class ArchiveWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.container, self.compression = archive_format(path)
+        if self.compression == "zst":
+            _zstandard()
+        self.programs = 0
+        self.bytes_in = 0
+        self._names: Dict[str, str] = {}
+        self._mtime = time.time()
+        # MANIFEST.json, built up as programs are added
+        self._manifest = tempfile.TemporaryFile()
+        head = json.dumps(
+            {
+                "format": _MANIFEST_FORMAT,
+                "generator": GENERATOR_VERSION,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._mtime)),
+            }
+        )
+        self._manifest.write(f'{head[:-1]}, "programs": [\n'.encode("utf-8"))
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._raw = open(self._tmp_path, "wb")
+        self._stream: Any = None
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        if self.container == "zip":
+            self._zip = zipfile.ZipFile(self._raw, "w", compression=zipfile.ZIP_DEFLATED)
+        elif self.compression == "zst":
+            self._stream = _zstandard().ZstdCompressor(write_checksum=True).stream_writer(self._raw, closefd=False)
+            self._tar = tarfile.open(fileobj=self._stream, mode="w|", format=tarfile.PAX_FORMAT)
+        else:
+            self._tar = tarfile.open(fileobj=self._raw, mode=f"w|{self.compression}", format=tarfile.PAX_FORMAT)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # Add a member of size bytes read from f
+    def _write_member(self, name: str, f: Any, size: int) -> None:
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, date_time=time.localtime(self._mtime)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            info.file_size = size
+            with self._zip.open(info, "w") as dst:
+                shutil.copyfileobj(f, dst)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = int(self._mtime)
+            info.mode = 0o644
+            self._tar.addfile(info, f)
+
+    # Add one program. digest is its SHA-256, if already known.
+    def add(
+        self, name: str, data: bytes, machine: str, controller: str, params: Mapping[str, Any], digest: str = ""
+    ) -> None:
+        if name == MANIFEST_NAME:
+            raise ArchiveError(f"Program name clashes with the manifest: {name}")
+        if name in self._names:
+            raise ArchiveError(f"Machines '{self._names[name]}' and '{machine}' map to the same member: {name}")
+        self._names[name] = machine
+        self._write_member(name, io.BytesIO(data), len(data))
+        entry = {
+            "name": name,
+            "machine": machine,
+            "controller": controller,
+            "params": dict(params),
+            "bytes": len(data),
+            "sha256": digest or hashlib.sha256(data).hexdigest(),
+        }
+        separator = ",\n" if self.programs else ""
+        self._manifest.write((separator + json.dumps(entry, default=str)).encode("utf-8"))
+        self.programs += 1
+        self.bytes_in += len(data)
+
+    def close(self) -> None:
+        self._manifest.write(b"\n]}\n")
+        size = self._manifest.tell()
+        self._manifest.seek(0)
+        self._write_member(MANIFEST_NAME, self._manifest, size)
+        self._finish()
+        os.replace(self._tmp_path, self.path)
+
+    # Drop the partial archive
+    def abort(self) -> None:
+        try:
+            self._finish()
+        finally:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+
+    def _finish(self) -> None:
+        if self._raw.closed:
+            return
+        self._manifest.close()
+        try:
+            if self._zip is not None:
+                self._zip.close()
+            if self._tar is not None:
+                self._tar.close()
+            if self._stream is not None:
+                self._stream.close()
+        finally:
+            self._raw.close()
+
+    def format(self) -> str:
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        ratio = f", {100.0 * size / self.bytes_in:.1f}% of the program bytes" if self.bytes_in else ""
+        return f"Archive {self.path}: {self.programs} programs + {MANIFEST_NAME}, {size} bytes{ratio}"
+
+
+# Open a tar archive as a stream
+def _open_tar(raw: Any, compression: str) -> tarfile.TarFile:
+    if compression == "zst":
+        stream = _zstandard().ZstdDecompressor().stream_reader(raw)
+        return tarfile.open(fileobj=stream, mode="r|")
+    return tarfile.open(fileobj=raw, mode="r|*")
+
+
+# (member name, bytes) for every file in the archive, in archive order
+def iter_members(path: str) -> Iterator[Tuple[str, bytes]]:
+    container, compression = archive_format(path)
+    if container == "zip":
+        with zipfile.ZipFile(path) as zf:
+            for info in zf.infolist():
+                if not info.is_dir():
+                    yield info.filename, zf.read(info)
+        return
+    with open(path, "rb") as raw, _open_tar(raw, compression) as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, tar.extractfile(member).read()
+
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    container, compression = archive_format(path)
+    data: Optional[bytes] = None
+    try:
+        if container == "zip":
+            with zipfile.ZipFile(path) as zf:
+                if MANIFEST_NAME in zf.namelist():
+                    data = zf.read(MANIFEST_NAME)
+        else:
+            with open(path, "rb") as raw, _open_tar(raw, compression) as tar:
+                for member in tar:
+                    if member.name == MANIFEST_NAME:
+                        data = tar.extractfile(member).read()
+                        break
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as exc:
+        raise ArchiveError(f"{path}: {exc}") from None
+    if data is None:
+        raise ArchiveError(f"{path}: no {MANIFEST_NAME} (not written by --archive?)")
+    try:
+        manifest = json.loads(data)
+    except json.JSONDecodeError as exc:
+        raise ArchiveError(f"{path}: unreadable {MANIFEST_NAME}: {exc}") from None
+    if manifest.get("format") != _MANIFEST_FORMAT:
+        raise ArchiveError(f"{path}: unsupported manifest format {manifest.get('format')}")
+    return manifest
+
+
+# Members the manifest lists, keyed by name
+def manifest_entries(manifest: Mapping[str, Any]) -> Dict[str, Dict[str, Any]]:
+    return {entry["name"]: entry for entry in manifest.get("programs", [])}
+
+
+# Names of the members to extract: all, those changed since an older
+# archive's manifest, or those whose file under dest is missing or different
+def changed_members(
+    entries: Mapping[str, Mapping[str, Any]], dest: str, since: Optional[Mapping[str, Any]] = None
+) -> List[str]:
+    if since is not None:
+        old = manifest_entries(since)
+        return [name for name, e in entries.items() if old.get(name, {}).get("sha256") != e["sha256"]]
+    return [name for name, e in entries.items() if file_sha256(os.path.join(dest, name)) != e["sha256"]]
+
+
+# Write the selected members under dest, checking each against the manifest.
+# Returns the names written.
+def extract_members(path: str, dest: str, names: List[str], entries: Mapping[str, Mapping[str, Any]]) -> List[str]:
+    wanted = set(names)
+    written: List[str] = []
+    os.makedirs(dest, exist_ok=True)
+    for name, data in iter_members(path):
+        if name not in wanted:
+            continue
+        if os.path.basename(name) != name:
+            raise ArchiveError(f"{path}: refusing member outside the destination: {name}")
+        if hashlib.sha256(data).hexdigest() != entries[name]["sha256"]:
+            raise ArchiveError(f"{path}: {name} does not match its manifest SHA-256")
+        write_atomic(os.path.join(dest, name), data)
+        written.append(name)
+    missing = wanted.difference(written)
+    if missing:
+        raise ArchiveError(f"{path}: listed in the manifest but missing: {', '.join(sorted(missing))}")
+    return written
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m cnc_warmup extract", description="Extract programs from a batch --archive"
+    )
+    parser.add_argument("archive", help="Archive written by --archive")
+    parser.add_argument("--dest", default="generated", help="Directory to extract into")
+    parser.add_argument("--since", default="", metavar="OLD_ARCHIVE", help="Only members changed since this archive")
+    parser.add_argument("--all", action="store_true", help="Extract every member, changed or not")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be extracted")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        entries = manifest_entries(read_manifest(args.archive))
+        if args.all:
+            names = list(entries)
+        else:
+            names = changed_members(entries, args.dest, read_manifest(args.since) if args.since else None)
+        if args.dry_run:
+            for name in names:
+                entry = entries[name]
+                print(f"{name}  ({entry['machine']}, {entry['controller']}, {entry['bytes']} bytes)")
+            return
+        written = extract_members(args.archive, args.dest, names, entries) if names else []
+    except ArchiveError as exc:
+        print(f"Extract failed: {exc}", file=sys.stderr)
+        sys.exit(1)
+    print(
+        f"Extracted {len(written)} of {len(entries)} programs to {args.dest} "
+        f"({len(entries) - len(written)} unchanged) in {time.perf_counter() - started:.3f} s"
+    )
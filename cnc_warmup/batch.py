@@ -0,0 +1,438 @@
+import hashlib
+import itertools
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .config_loader import MachinePreset
+from .generators import iter_program_blocks, load_generator, render_program, stream_program, write_blocks
+
+"""
+
+Fleet batch generation.
+
+Builds one job per machine preset and controller, then fans the generator calls
+out over a process pool. Each worker streams its program straight into its own
+file, so program text never travels back to the parent process.
+
+With validation enabled, each worker checks its program before writing it
+and the batch stops at the first failure: pending chunks are cancelled, so
+at most the chunks already running finish.
+
+Programs are rendered from the cached WarmupPlan (cnc_warmup.plan), so the
+controllers of one machine share a plan within a worker.
+
+With an archive (cnc_warmup.archive), workers return the program bytes
+instead of writing files, and the parent adds each chunk to the archive as
+it completes.
+
+Jobs can also be streamed: iter_jobs plans them as machines are read (for
+example from cnc_warmup.inventory), and run_batch consumes such a stream
+chunk by chunk, so large fleets are generated with bounded memory.
+
+Unrolled jobs (params["unrolled"], see --unrolled) can run to hundreds of
+thousands of blocks; they are streamed block chunk by block chunk into a
+temporary file instead of being rendered to text first.
+
+Notes:
+File names follow the scheme used in generated_examples/, e.g.
+WARMUP_TNC_MACHINE1.h and WARMUP_FANUC_MACHINE1.nc. Installed backends
+name theirs from their FILE_TAG / FILE_EXTENSION.
+
+"""
+
+# Jobs per chunk when the job count is not known up front (lazy job streams)
+STREAM_CHUNK = 64
+
+# Controller key -> (file name tag, file extension)
+CONTROLLER_FILES: Dict[str, Tuple[str, str]] = {
+    "tnc640": ("TNC", ".h"),
+    "fanuc31i": ("FANUC", ".nc"),
+}
+
+
+# (file name tag, extension) for a controller, built-in or installed backend
+def controller_files(controller: str) -> Tuple[str, str]:
+    if controller in CONTROLLER_FILES:
+        return CONTROLLER_FILES[controller]
+    backend = load_generator(controller)
+    return str(getattr(backend, "FILE_TAG", controller.upper())), str(getattr(backend, "FILE_EXTENSION", ".nc"))
+
+
+# One program to generate and write
+@dataclass
+class BatchJob:
+    machine: str
+    controller: str
+    path: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    cache_object: str = ""  # output cache object path to fill, if caching
+    validate: bool = False  # check the program (validate.py) before writing it
+    metrics: bool = False  # time the stages and count lines (metrics.py)
+    archive: bool = False  # return the program bytes instead of writing job.path
+
+
+# Totals reported at the end of a batch run
+@dataclass
+class BatchSummary:
+    programs: int
+    bytes_written: int  # program bytes generated (including files left unchanged)
+    seconds: float
+    jobs: int
+    uncompacted_bytes: int = 0  # size the same programs would have without --compact
+    unchanged: int = 0  # files already holding identical bytes, left untouched
+    program_stats: List[Dict[str, Any]] = field(default_factory=list)  # per program, for metrics jobs
+
+    @property
+    def programs_per_second(self) -> float:
+        return self.programs / self.seconds if self.seconds > 0 else 0.0
+
+    def format(self) -> str:
+        if not self.programs:
+            return "Generated 0 programs (nothing to regenerate)"
+        return (
+            f"Generated {self.programs} programs ({self.bytes_written} bytes) "
+            f"in {self.seconds:.3f} s with {self.jobs} job(s): "
+            f"{self.programs_per_second:.1f} programs/s, "
+            f"{self.bytes_written / self.seconds if self.seconds > 0 else 0.0:.0f} bytes/s"
+        ) + (self._format_compact() if self.uncompacted_bytes else "") + (
+            f"\n{self.unchanged} file(s) already up to date, not rewritten" if self.unchanged else ""
+        )
+
+    def _format_compact(self) -> str:
+        saved = 100.0 * (self.uncompacted_bytes - self.bytes_written) / self.uncompacted_bytes
+        return f"\nCompact output: {self.uncompacted_bytes} -> {self.bytes_written} bytes ({saved:.1f}% smaller)"
+
+
+# Turn a preset name into a file name fragment ("Machine 1" -> "MACHINE1")
+def machine_slug(name: str) -> str:
+    return re.sub(r"[^A-Z0-9]+", "", str(name).upper()) or "MACHINE"
+
+
+# Config "defaults" key -> (generate_program argument, fallback, type)
+DEFAULT_PARAMS = (
+    ("start_feed", "start_feed_mm_min", 1000, float),
+    ("finish_feed", "finish_feed_mm_min", 2000, float),
+    ("rpm_steps", "steps", 5, int),
+    ("start_rpm", "start_rpm", 500, float),
+    ("finish_rpm", "finish_rpm", 6000, float),
+    ("seconds_per_step", "seconds_per_step", 1, int),
+    ("coolant", "include_coolant", False, bool),
+)
+
+
+# generate_program arguments for the config "defaults" keys present in values
+def default_params(values: Mapping[str, Any], fill: bool = True) -> Dict[str, Any]:
+    params = {
+        param: kind(values[key] if key in values else fallback)
+        for key, param, fallback, kind in DEFAULT_PARAMS
+        if fill or key in values
+    }
+    if "seconds_per_step" in params:
+        params["seconds_per_step"] = max(0, params["seconds_per_step"])
+    return params
+
+
+# Build one job per machine and controller.
+def plan_jobs(
+    machines: Mapping[str, MachinePreset],
+    defaults: Dict[str, Any],
+    controllers: Sequence[str],
+    output_dir: str,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> List[BatchJob]:
+    return list(iter_jobs(machines.values(), defaults, controllers, output_dir, overrides))
+
+
+# Jobs for a stream of machines, built as they are consumed. Each machine is a
+# MachinePreset, or an inventory.MachineRow whose per-machine overrides take
+# precedence over the fleet-wide values (defaults, then overrides). A row that
+# names one of the requested controllers gets only that controller's program;
+# a row naming another one (--controller given) gets the requested ones.
+def iter_jobs(
+    machines: Iterable[Any],
+    defaults: Mapping[str, Any],
+    controllers: Sequence[str],
+    output_dir: str,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> Iterator[BatchJob]:
+    base = default_params(defaults)
+    base.update(overrides or {})
+    prefix = str(defaults.get("program_name", "WARMUP"))
+
+    used: Dict[str, Tuple[str, Optional[int]]] = {}
+    files = {controller: controller_files(controller) for controller in controllers}
+    for machine in machines:
+        row: Dict[str, Any] = {}
+        targets = controllers
+        line: Optional[int] = None  # inventory rows only
+        if isinstance(machine, MachinePreset):
+            preset = machine
+        else:
+            preset = machine.preset
+            row = default_params(machine.overrides, fill=False)
+            line = machine.line
+            if preset.controller in files:
+                targets = [preset.controller]
+        name = preset.name
+        slug = machine_slug(name)
+        for controller in targets:
+            tag, ext = files[controller]
+            program_name = f"{prefix}_{tag}_{slug}"
+            path = os.path.join(output_dir, program_name + ext)
+            if path in used:
+                first, first_line = used[path]
+                message = f"Machines '{first}' and '{name}' map to the same file: {path}"
+                if line is not None:
+                    from .inventory import InventoryError
+
+                    raise InventoryError(f"line {line or '?'}: {message} (first on line {first_line or '?'})")
+                raise ValueError(message)
+            used[path] = (name, line)
+            params = dict(base)
+            params.update(row)
+            params.update(
+                program_name=program_name,
+                x_travel=preset.x_travel,
+                y_travel=preset.y_travel,
+                z_travel=preset.z_travel,
+                machine_label=str(name),
+            )
+            yield BatchJob(machine=str(name), controller=controller, path=path, params=params)
+
+
+# True if path already holds exactly data
+def _same_content(path: str, data: bytes) -> bool:
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+# Same check for a streamed program, by size and SHA-256 read in chunks
+def _same_digest(path: str, size: int, digest: str) -> bool:
+    try:
+        if os.path.getsize(path) != size:
+            return False
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        return sha.hexdigest() == digest
+    except OSError:
+        return False
+
+
+# run_job for an unrolled program (params["unrolled"]): streamed into a
+# temporary file next to the target, so memory stays constant whatever the
+# program length, then moved over the target unless that is identical.
+# Never archived or cached (the CLI rejects those with --unrolled).
+def _run_streamed_job(job: BatchJob) -> Tuple[int, int, str, bool, Dict[str, Any], bytes]:
+    stages: Dict[str, float] = {}
+    blocks = iter_program_blocks(job.controller, job.params)
+    if job.validate:
+        from .validate import validate_program
+
+        started = time.perf_counter()
+        validate_program(job.controller, iter_program_blocks(job.controller, job.params), job.params, source=job.path)
+        stages["validate"] = time.perf_counter() - started
+    started = time.perf_counter()
+    temp = f"{job.path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, "wb") as f:
+            size, lines, digest = write_blocks(blocks, f)
+        written = not _same_digest(job.path, size, digest)
+        if written:
+            os.replace(temp, job.path)
+        else:
+            os.remove(temp)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    stages[f"stream:{job.controller}"] = time.perf_counter() - started
+    full = 0
+    if job.params.get("compact"):
+        full = stream_program(job.controller, dict(job.params, compact=False))[0]
+    stats: Dict[str, Any] = {}
+    if job.metrics:
+        stats = {
+            "program": job.params.get("program_name", ""),
+            "controller": job.controller,
+            "lines": lines,
+            "bytes": size,
+            "stages": stages,
+        }
+    return size, full, "", written, stats, b""
+
+
+# Generate and write a single program. An existing file with identical content
+# is left alone, so its timestamp does not change.
+# Returns (size, uncompacted size or 0, SHA-256 if caching or archiving else "",
+# written, metrics stats or {}, program bytes if archiving else b"").
+# Module-level so it can be pickled into pool workers.
+def run_job(job: BatchJob) -> Tuple[int, int, str, bool, Dict[str, Any], bytes]:
+    if job.params.get("unrolled"):
+        return _run_streamed_job(job)
+    stages: Dict[str, float] = {}
+    if job.metrics:
+        from .metrics import timed_render
+
+        text, stages = timed_render(job.controller, job.params)
+    else:
+        text = render_program(job.controller, job.params)
+    if job.validate:
+        from .validate import validate_program
+
+        started = time.perf_counter()
+        validate_program(job.controller, text.splitlines(), job.params, source=job.path)
+        stages["validate"] = time.perf_counter() - started
+    data = text.encode("utf-8")
+    digest = ""
+    written = True
+    if job.archive:
+        digest = hashlib.sha256(data).hexdigest()
+    else:
+        started = time.perf_counter()
+        written = not _same_content(job.path, data)
+        if written:
+            with open(job.path, "wb") as f:
+                f.write(data)
+        stages["write"] = time.perf_counter() - started
+    if job.cache_object:
+        from .output_cache import store_object
+
+        store_object(job.cache_object, data)
+        digest = hashlib.sha256(data).hexdigest()
+    full = 0
+    if job.params.get("compact"):
+        full = len(render_program(job.controller, dict(job.params, compact=False)).encode("utf-8"))
+    stats: Dict[str, Any] = {}
+    if job.metrics:
+        stats = {
+            "program": job.params.get("program_name", ""),
+            "controller": job.controller,
+            "lines": text.count("\n"),
+            "bytes": len(data),
+            "stages": stages,
+        }
+    return len(data), full, digest, written, stats, data if job.archive else b""
+
+
+def _run_chunk(jobs: List[BatchJob]) -> List[Tuple[int, int, str, bool, Dict[str, Any], bytes]]:
+    return [run_job(j) for j in jobs]
+
+
+# Add an archiving job's program to the archive; returns its result without the bytes
+def _archive_result(
+    archive: Any, job: BatchJob, result: Tuple[int, int, str, bool, Dict[str, Any], bytes]
+) -> Tuple[int, int, str, bool, Dict[str, Any], bytes]:
+    size, full, digest, written, stats, data = result
+    started = time.perf_counter()
+    archive.add(os.path.basename(job.path), data, job.machine, job.controller, job.params, digest)
+    if stats:
+        stats["stages"]["write"] = time.perf_counter() - started
+    return size, full, digest, written, stats, b""
+
+
+# Successive lists of up to size jobs
+def _chunks(jobs: Iterable[BatchJob], size: int) -> Iterator[List[BatchJob]]:
+    it = iter(jobs)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Run all jobs, in-process for jobs == 1, otherwise over a process pool.
+# With an OutputCache, unchanged programs are skipped or restored from the
+# cache and only the misses are generated. With an ArchiveWriter, programs
+# go into the archive instead of files (no cache).
+# jobs may be a lazy iterable (iter_jobs): it is consumed chunk by chunk, with
+# at most two chunks per worker in flight, and results are folded into the
+# summary as they arrive, so memory does not grow with the fleet. The cache
+# needs the whole job list up front.
+def run_batch(
+    jobs: Iterable[BatchJob], workers: int = 0, cache: Optional[Any] = None, archive: Optional[Any] = None
+) -> BatchSummary:
+    keys: Dict[str, str] = {}
+    if archive is not None and cache is not None:
+        raise ValueError("An output cache cannot be combined with archive output")
+    if cache is not None:
+        job_list = list(jobs)
+        for d in {os.path.dirname(j.path) for j in job_list}:
+            if d:
+                os.makedirs(d, exist_ok=True)
+        job_list, keys = cache.prepare(job_list)
+        for job in job_list:
+            job.cache_object = cache.object_path(keys[os.path.abspath(job.path)])
+        jobs = job_list
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+    if isinstance(jobs, Sequence):
+        workers = max(1, min(workers, len(jobs) or 1))
+        # Large chunks keep IPC overhead low when there are thousands of presets
+        chunksize = max(1, len(jobs) // (workers * 4))
+    else:
+        chunksize = STREAM_CHUNK
+
+    summary = BatchSummary(programs=0, bytes_written=0, seconds=0.0, jobs=workers)
+    made_dirs = set()
+
+    # Directories for a chunk, then the chunk itself
+    def prepared(chunk: List[BatchJob]) -> List[BatchJob]:
+        for job in chunk:
+            job.archive = archive is not None
+            d = os.path.dirname(job.path)
+            if d and not job.archive and d not in made_dirs:
+                os.makedirs(d, exist_ok=True)
+                made_dirs.add(d)
+        return chunk
+
+    def collect(chunk: List[BatchJob], results: List[Tuple[int, int, str, bool, Dict[str, Any], bytes]]) -> None:
+        for job, result in zip(chunk, results):
+            if archive is not None:
+                result = _archive_result(archive, job, result)
+            size, full, digest, written, stats, _ = result
+            summary.programs += 1
+            summary.bytes_written += size
+            summary.uncompacted_bytes += full
+            summary.unchanged += not written
+            if stats:
+                summary.program_stats.append(stats)
+            if cache is not None:
+                cache.record(job.path, keys[os.path.abspath(job.path)], digest, size)
+
+    started = time.perf_counter()
+    chunks = (prepared(chunk) for chunk in _chunks(jobs, chunksize))
+    if workers == 1:
+        for chunk in chunks:
+            collect(chunk, _run_chunk(chunk))
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            pending = {}
+            for chunk in itertools.islice(chunks, 2 * workers):
+                pending[pool.submit(_run_chunk, chunk)] = chunk
+            # The first failed chunk raises here; archive members are added as chunks finish
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = pending.pop(future)
+                    collect(chunk, future.result())
+                    for chunk in itertools.islice(chunks, 1):
+                        pending[pool.submit(_run_chunk, chunk)] = chunk
+        finally:
+            # Fail fast: drop chunks that have not started yet
+            pool.shutdown(wait=True, cancel_futures=True)
+    summary.seconds = time.perf_counter() - started
+
+    if cache is not None:
+        cache.save()
+    return summary
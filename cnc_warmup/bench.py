@@ -0,0 +1,395 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config_loader import clear_config_cache, get_machine_index, load_config
+from .generators import generate_fanuc_program, generate_tnc_program, iter_program_blocks, stream_program
+
+"""
+
+Benchmark suite for the hot paths.
+
+Run with:
+python -m cnc_warmup.bench [--quick] [--save FILE] [--compare BASELINE]
+
+Each case reports ops/sec, peak traced allocation per call (tracemalloc, in this
+process only, so not meaningful for the CLI case) and output bytes per call.
+The unrolled_* cases time --unrolled output with UNROLLED_STEPS spindle steps:
+*_format only produces the blocks, *_stream also encodes and writes them to a
+file, and its peak allocation shows whether streaming stays in constant memory.
+Results can be saved as JSON and compared against a stored baseline
+(benchmarks/baseline.json); the exit code is 1 if any case is slower than the
+baseline by more than --tolerance. Runs record their grid sizes (suite_grid),
+and a baseline from a different grid (--quick against a full run, say) is
+refused instead of compared.
+
+--check-startup enforces the CLI startup budget: with every value on the
+command line, the cnc_warmup imports (best of STARTUP_RUNS) must stay under
+STARTUP_BUDGET_MS, scaled up on machines that import the STARTUP_CALIBRATION
+modules slower than the reference machine, and must not load the JSON config,
+tkinter, the other controller's generator or the installed-backend registry
+(importlib.metadata).
+
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# CLI startup budget: cumulative import time of cnc_warmup modules when every
+# value is given on the command line (best of STARTUP_RUNS, on the reference
+# machine), and modules that must not load then.
+STARTUP_BUDGET_MS = 25.0
+STARTUP_RUNS = 9
+# Calibration imports and their best time on the reference machine; the budget
+# scales by how much slower this machine imports them
+STARTUP_CALIBRATION = ("argparse", "dataclasses", "typing", "re", "math")
+STARTUP_CALIBRATION_MS = 38.0
+STARTUP_FORBIDDEN = (
+    "json", "tkinter", "cnc_warmup.config_loader", "cnc_warmup.generators.fanuc31i_warmup", "importlib.metadata",
+)
+STARTUP_ARGS = [
+    "--controller", "tnc640", "--program-name", "WARMUP",
+    "--x-travel", "762", "--y-travel", "508", "--z-travel", "500",
+    "--start-rpm", "500", "--finish-rpm", "6000", "--start-feed", "1000", "--finish-feed", "2000",
+    "--rpm-steps", "5", "--seconds-per-step", "60", "--coolant",
+]
+
+
+# Parameter grid over travels, RPM steps and dwell values
+def parameter_grid(quick: bool = False) -> List[Dict[str, Any]]:
+    travels = [(500, 400, 300), (762, 508, 500), (1270.5, 660.25, 610)]
+    steps = [2, 5, 20] if quick else [2, 5, 10, 20, 50]
+    dwells = [0, 60] if quick else [0, 1, 60, 300]
+    return [
+        dict(
+            program_name="WARMUP",
+            x_travel=x,
+            y_travel=y,
+            z_travel=z,
+            start_feed_mm_min=1000,
+            finish_feed_mm_min=2000,
+            steps=n,
+            start_rpm=500,
+            finish_rpm=6000,
+            seconds_per_step=d,
+            include_coolant=True,
+            machine_label="Machine 1",
+        )
+        for (x, y, z), n, d in itertools.product(travels, steps, dwells)
+    ]
+
+
+# Spindle steps per unrolled program: fine-grained enough for tens of thousands of blocks
+UNROLLED_STEPS = 20000
+UNROLLED_STEPS_QUICK = 2000
+
+
+# --unrolled inputs: linear ramps of UNROLLED_STEPS steps, with and without compaction
+def unrolled_grid(quick: bool = False) -> List[Dict[str, Any]]:
+    steps = UNROLLED_STEPS_QUICK if quick else UNROLLED_STEPS
+    return [
+        dict(
+            program_name="WARMUP",
+            x_travel=x,
+            y_travel=y,
+            z_travel=z,
+            start_feed_mm_min=1000,
+            finish_feed_mm_min=2000,
+            steps=steps,
+            start_rpm=500,
+            finish_rpm=12000,
+            seconds_per_step=1,
+            include_coolant=True,
+            machine_label="Machine 1",
+            compact=compact,
+            unrolled=True,
+        )
+        for (x, y, z), compact in itertools.product([(762, 508, 500), (1270.5, 660.25, 610)], [False, True])
+    ]
+
+
+# Bytes of program text in the unrolled blocks, without writing them
+def _format_unrolled(controller: str, params: Dict[str, Any]) -> int:
+    return sum(len(block) + 1 for block in iter_program_blocks(controller, params))
+
+
+def _stream_unrolled(controller: str, params: Dict[str, Any], path: str) -> int:
+    with open(path, "wb") as f:
+        return stream_program(controller, params, f)[0]
+
+
+# Time fn() over all inputs, repeated until min_seconds have elapsed.
+def _measure(name: str, fn: Callable[[Any], Any], inputs: List[Any], min_seconds: float) -> Dict[str, Any]:
+    calls = 0
+    started = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < min_seconds or calls == 0:
+        for item in inputs:
+            fn(item)
+        calls += len(inputs)
+        elapsed = time.perf_counter() - started
+
+    # Allocation and output size from one traced pass (kept out of the timing)
+    out_bytes = 0
+    peak = 0
+    tracemalloc.start()
+    try:
+        for item in inputs:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            result = fn(item)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+            if isinstance(result, str):
+                out_bytes += len(result.encode("utf-8"))
+            elif isinstance(result, int):
+                out_bytes += result
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "name": name,
+        "calls": calls,
+        "seconds": elapsed,
+        "ops_per_sec": calls / elapsed,
+        "peak_alloc_bytes": peak,
+        "bytes_per_call": out_bytes / len(inputs),
+    }
+
+
+# Load the config and its preset index as a fresh process would.
+def _load_config_cold(disk_cache: bool) -> None:
+    clear_config_cache()
+    get_machine_index(load_config(disk_cache=disk_cache))
+
+
+# Run `python -m cnc_warmup` once writing to output; returns the output size.
+def _run_cli(argv: List[str], output: str) -> int:
+    subprocess.run(
+        [sys.executable, "-m", "cnc_warmup", *argv, "--output", output],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    return os.path.getsize(output)
+
+
+# Import times from one interpreter run under -X importtime.
+# Returns (top-level cnc_warmup milliseconds, other top-level milliseconds, all module names).
+def _import_times(argv: List[str], cwd: str = ROOT) -> Tuple[float, float, List[str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *argv], cwd=cwd, check=True, capture_output=True, text=True
+    )
+    ours = other = 0.0
+    modules: List[str] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # header line
+        modules.append(name.strip())
+        # Top-level entries (one leading space) already include their children
+        if name.startswith(" cnc_warmup"):
+            ours += int(cumulative) / 1000.0
+        elif not name.startswith("  "):
+            other += int(cumulative) / 1000.0
+    return ours, other, modules
+
+
+# Run the fully specified CLI under -X importtime.
+# Returns (best cnc_warmup import milliseconds over runs, all imported module names).
+def measure_startup(runs: int = STARTUP_RUNS) -> Tuple[float, List[str]]:
+    best = float("inf")
+    modules: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "warmup.h")
+        for _ in range(runs):
+            total, _, modules = _import_times(["-m", "cnc_warmup", *STARTUP_ARGS, "--output", out])
+            best = min(best, total)
+    return best, modules
+
+
+# Best import time of the STARTUP_CALIBRATION stdlib modules (interpreter
+# startup included): how fast this machine imports, for scaling the budget
+def measure_calibration(runs: int = STARTUP_RUNS) -> float:
+    argv = ["-c", "import " + ", ".join(STARTUP_CALIBRATION)]
+    return min(_import_times(argv)[1] for _ in range(runs))
+
+
+# Check the startup budget; returns a list of problems (empty if within budget).
+# The budget is scaled up on machines slower than the reference one, so only a
+# change in the cnc_warmup imports themselves fails the check.
+def check_startup(budget_ms: float = STARTUP_BUDGET_MS, runs: int = STARTUP_RUNS) -> List[str]:
+    import_ms, modules = measure_startup(runs)
+    scale = max(1.0, measure_calibration(runs) / STARTUP_CALIBRATION_MS)
+    budget_ms *= scale
+    problems = [f"{name} imported during CLI startup" for name in STARTUP_FORBIDDEN if name in modules]
+    if import_ms > budget_ms:
+        problems.append(f"cnc_warmup imports took {import_ms:.1f} ms (budget {budget_ms:.1f} ms)")
+    print(
+        f"CLI startup: cnc_warmup imports {import_ms:.1f} ms (budget {budget_ms:.1f} ms, "
+        f"x{scale:.2f} for this machine), {len(modules)} modules, best of {runs} runs"
+    )
+    return problems
+
+
+# Input sizes of a run; results are only comparable between equal grids
+def suite_grid(quick: bool = False) -> Dict[str, Any]:
+    return {
+        "parameters": len(parameter_grid(quick)),
+        "unrolled_steps": UNROLLED_STEPS_QUICK if quick else UNROLLED_STEPS,
+        "unrolled_cases": len(unrolled_grid(quick)),
+    }
+
+
+def run_suite(quick: bool = False, min_seconds: float = 0.5) -> Dict[str, Any]:
+    grid = parameter_grid(quick)
+    results = [
+        _measure("generate_tnc_program", lambda p: generate_tnc_program(**p), grid, min_seconds),
+        _measure("generate_fanuc_program", lambda p: generate_fanuc_program(**p), grid, min_seconds),
+        _measure("load_config", lambda _: _load_config_cold(False), [None], min_seconds),
+        _measure("load_config_disk_cache", lambda _: _load_config_cold(True), [None], min_seconds),
+    ]
+
+    unrolled = unrolled_grid(quick)
+    for controller, tag in (("tnc640", "tnc"), ("fanuc31i", "fanuc")):
+        results.append(
+            _measure(f"unrolled_{tag}_format", lambda p: _format_unrolled(controller, p), unrolled, min_seconds)
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "warmup.h")
+        for controller, tag in (("tnc640", "tnc"), ("fanuc31i", "fanuc")):
+            results.append(
+                _measure(
+                    f"unrolled_{tag}_stream", lambda p: _stream_unrolled(controller, p, out), unrolled, min_seconds
+                )
+            )
+        cli_args = ["--x-travel", "762", "--y-travel", "508", "--z-travel", "500"]
+        results.append(
+            _measure("cli_end_to_end", lambda _: _run_cli(cli_args, out), [None], 0.0 if quick else min_seconds)
+        )
+
+    import_ms, modules = measure_startup(runs=3 if quick else 10)
+    results.append(
+        {
+            "name": "cli_startup_imports",
+            "calls": 1,
+            "seconds": import_ms / 1000.0,
+            "ops_per_sec": 1000.0 / import_ms if import_ms else 0.0,
+            "peak_alloc_bytes": 0,
+            "bytes_per_call": 0,
+            "import_ms": import_ms,
+            "modules": len(modules),
+        }
+    )
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": quick,
+        "grid": suite_grid(quick),
+        "results": results,
+    }
+
+
+# Why a baseline cannot be compared with a run of this grid, or "" if it can
+def grid_mismatch(baseline: Dict[str, Any], quick: bool) -> str:
+    if bool(baseline.get("quick")) != quick:
+        kind = "a --quick" if baseline.get("quick") else "a full"
+        return f"baseline is {kind} run; compare runs of the same kind"
+    if baseline.get("grid") != suite_grid(quick):
+        return f"baseline grid {baseline.get('grid')} differs from {suite_grid(quick)}; regenerate it with --save"
+    return ""
+
+
+# Compare against a baseline; returns the names of regressed cases.
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    mismatch = grid_mismatch(baseline, bool(current.get("quick")))
+    if mismatch:
+        raise ValueError(mismatch)
+    base = {r["name"]: r for r in baseline.get("results", [])}
+    regressed = []
+    for r in current["results"]:
+        b = base.get(r["name"])
+        if not b:
+            print(f"{r['name']:<24} (no baseline)")
+            continue
+        ratio = r["ops_per_sec"] / b["ops_per_sec"] if b["ops_per_sec"] else 0.0
+        flag = ""
+        if ratio < 1.0 - tolerance:
+            flag = "  REGRESSION"
+            regressed.append(r["name"])
+        print(f"{r['name']:<24} {ratio:6.2f}x baseline ops/sec{flag}")
+    return regressed
+
+
+def _print_results(suite: Dict[str, Any]) -> None:
+    print(f"{'case':<24} {'ops/sec':>12} {'peak alloc/call':>16} {'bytes/call':>11}")
+    for r in suite["results"]:
+        print(
+            f"{r['name']:<24} {r['ops_per_sec']:12.1f} {r['peak_alloc_bytes']:14d} B "
+            f"{r['bytes_per_call']:11.0f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark CNC warmup generation")
+    parser.add_argument("--quick", action="store_true", help="Smaller grid and shorter runs")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum timing duration per case")
+    parser.add_argument("--save", default="", help="Write results as JSON to this path")
+    parser.add_argument(
+        "--compare",
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        default="",
+        help="Compare against a baseline JSON (defaults to benchmarks/baseline.json)",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed ops/sec drop before failing")
+    parser.add_argument(
+        "--check-startup",
+        action="store_true",
+        help="Only check the CLI startup budget (-X importtime); exit 1 if exceeded",
+    )
+    args = parser.parse_args(argv)
+
+    if args.check_startup:
+        problems = check_startup()
+        for problem in problems:
+            print(f"FAIL: {problem}")
+        return 1 if problems else 0
+
+    baseline = None
+    if args.compare:
+        # Checked up front: a mismatched baseline would report made-up ratios
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        mismatch = grid_mismatch(baseline, args.quick)
+        if mismatch:
+            parser.error(f"{args.compare}: {mismatch}")
+
+    suite = run_suite(quick=args.quick, min_seconds=args.min_seconds)
+    _print_results(suite)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(suite, f, indent=2)
+            f.write("\n")
+
+    if baseline is not None:
+        print()
+        if compare(suite, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,153 @@
-import json
+
+
+import marshal
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+"""
+
+Config loading with caching.
+
+Parsed configs are cached in memory keyed on path + (mtime, size), so repeated
+load_config calls in one process return the same dict until the file changes.
+Callers must treat the returned dict as read-only.
+
+With disk_cache=True the parsed config and its preset index are also written
+to __pycache__/ next to the config file (marshal format), so later processes
+skip JSON parsing entirely while the file is unchanged.
+
+"""
+
+# Bump when the on-disk cache layout changes
+_DISK_CACHE_VERSION = 2
+
+# path -> ((mtime_ns, size), config)
+_CONFIG_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+
+# id(config) -> (config, value); holding config keeps the id from being reused
+_MACHINES_CACHE: Dict[int, Tuple[Dict[str, Any], Dict[str, Dict[str, str]]]] = {}
+_INDEX_CACHE: Dict[int, Tuple[Dict[str, Any], Dict[str, "MachinePreset"]]] = {}
+# Bound for the derived caches when callers pass configs not from load_config
+_MAX_DERIVED = 32
+
+
+# Typed machine preset; controller and cell are optional grouping labels
+class MachinePreset(NamedTuple):
+    name: str
+    x_travel: float
+    y_travel: float
+    z_travel: float
+    controller: str = ""
+    cell: str = ""
+
 
 def default_config_path() -> str:
     root = os.path.dirname(os.path.dirname(__file__))
     return os.path.join(root, "config", "warmup_config.json")
 
-def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+
+def _disk_cache_path(cfg_path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(cfg_path))
+    return os.path.join(directory, "__pycache__", name + ".cache")
+
+
+def _build_index(config: Dict[str, Any]) -> Dict[str, MachinePreset]:
+    machines = config.get("machines", {})
+    return {
+        str(k): MachinePreset(
+            str(k),
+            float(v.get("x_travel", 300)),
+            float(v.get("y_travel", 300)),
+            float(v.get("z_travel", 300)),
+            str(v.get("controller", "")),
+            str(v.get("cell", "")),
+        )
+        for k, v in machines.items()
+    }
+
+
+# Read the marshal cache if it matches the config's stamp.
+def _read_disk_cache(cfg_path: str, stamp: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_disk_cache_path(cfg_path), "rb") as f:
+            # loads(read()) is much faster than load(f), which reads in small chunks
+            version, cached_stamp, config, presets = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != _DISK_CACHE_VERSION or tuple(cached_stamp) != stamp:
+        return None
+    _INDEX_CACHE[id(config)] = (config, {p[0]: MachinePreset(*p) for p in presets})
+    return config
+
+
+def _write_disk_cache(cfg_path: str, stamp: Tuple[int, int], config: Dict[str, Any]) -> None:
+    cache_path = _disk_cache_path(cfg_path)
+    presets = [tuple(p) for p in get_machine_index(config).values()]
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            f.write(marshal.dumps((_DISK_CACHE_VERSION, stamp, config, presets)))
+        os.replace(tmp_path, cache_path)
+    except (OSError, ValueError):
+        # The cache is an optimization only (read-only install, unmarshalable values, ...)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+# Forget in-memory cached configs (the on-disk cache is left alone).
+def clear_config_cache() -> None:
+    _CONFIG_CACHE.clear()
+    _MACHINES_CACHE.clear()
+    _INDEX_CACHE.clear()
+
+
+def load_config(path: Optional[str] = None, disk_cache: bool = False) -> Dict[str, Any]:
     cfg_path = path or default_config_path()
-    with open(cfg_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    st = os.stat(cfg_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    cached = _CONFIG_CACHE.get(cfg_path)
+    if cached is not None:
+        if cached[0] == stamp:
+            return cached[1]
+        # Stale: drop the derived views of the old dict too
+        _MACHINES_CACHE.pop(id(cached[1]), None)
+        _INDEX_CACHE.pop(id(cached[1]), None)
+
+    config = _read_disk_cache(cfg_path, stamp) if disk_cache else None
+    if config is None:
+        import json
+
+        with open(cfg_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        if disk_cache:
+            _write_disk_cache(cfg_path, stamp, config)
+
+    _CONFIG_CACHE[cfg_path] = (stamp, config)
+    return config
+
+
+# Preset name -> typed travels, built once per loaded config.
+def get_machine_index(config: Dict[str, Any]) -> Dict[str, MachinePreset]:
+    cached = _INDEX_CACHE.get(id(config))
+    if cached is not None and cached[0] is config:
+        return cached[1]
+    index = _build_index(config)
+    if len(_INDEX_CACHE) >= _MAX_DERIVED:
+        _INDEX_CACHE.clear()
+    _INDEX_CACHE[id(config)] = (config, index)
+    return index
+
 
 def get_machines(config: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+    cached = _MACHINES_CACHE.get(id(config))
+    if cached is not None and cached[0] is config:
+        return cached[1]
     machines = config.get("machines", {})
-    return {
+    result = {
         str(k): {
             "x_travel": str(v.get("x_travel", 300)),
             "y_travel": str(v.get("y_travel", 300)),
@@ -21,8 +155,11 @@ def get_machines(config: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
         }
         for k, v in machines.items()
     }
+    if len(_MACHINES_CACHE) >= _MAX_DERIVED:
+        _MACHINES_CACHE.clear()
+    _MACHINES_CACHE[id(config)] = (config, result)
+    return result
+
 
 def get_defaults(config: Dict[str, Any]) -> Dict[str, Any]:
     return dict(config.get("defaults", {}))
-
-
@@ -0,0 +1,348 @@
+import argparse
+import asyncio
+import ftplib
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .batch import CONTROLLER_FILES, plan_jobs
+from .config_loader import get_defaults, get_machine_index, load_config
+
+"""
+
+Fleet upload over FTP.
+
+Run with:
+python -m cnc_warmup deploy [--output-dir generated] [--jobs 8] [--force]
+
+Targets come from an "ftp" object on each machine preset in
+warmup_config.json:
+
+  "Machine 1": {"x_travel": 762, ..., "controller": "tnc640",
+                "ftp": {"host": "10.0.4.21", "port": 21, "user": "user",
+                        "password_env": "TNC_FTP_PASSWORD", "directory": "TNC:/warmup"}}
+
+Only the files batch mode writes for that machine are sent (the preset's
+controller, or every controller if it has none). Files are grouped per FTP
+account so each host gets one connection for all its files, hosts are served
+by a bounded pool of workers, and each upload is retried with exponential
+backoff (reconnecting first). The SHA-256 of every uploaded file is kept in
+<output-dir>/.deploy-state.json, so later runs only send files whose content
+changed (--force sends everything).
+
+Notes:
+ftplib is blocking, so each host's session runs on a worker thread driven from
+asyncio. benchmarks/ftp_standin.py is a local stand-in FTP server for trying
+deploys without machines.
+
+"""
+
+STATE_NAME = ".deploy-state.json"
+
+
+# FTP account and directory for one machine
+@dataclass(frozen=True)
+class DeployTarget:
+    host: str
+    port: int = 21
+    user: str = "anonymous"
+    password: str = ""
+    directory: str = ""
+    passive: bool = True
+
+    @property
+    def account(self) -> Tuple[str, int, str, str]:
+        return (self.host, self.port, self.user, self.password)
+
+    def remote_path(self, name: str) -> str:
+        return f"{self.host}:{self.port}/{self.directory.strip('/')}/{name}"
+
+
+# One file to send
+@dataclass
+class Upload:
+    machine: str
+    local_path: str
+    target: DeployTarget
+    sha256: str = ""
+    size: int = 0
+
+
+# Per-host outcome
+@dataclass
+class HostReport:
+    host: str
+    uploaded: int = 0
+    skipped: int = 0
+    bytes_sent: int = 0
+    connect_seconds: float = 0.0
+    seconds: float = 0.0
+    retries: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+
+# Machine name -> DeployTarget for every preset with an "ftp" object
+def targets_from_config(config: Mapping[str, Any]) -> Dict[str, DeployTarget]:
+    targets = {}
+    for name, spec in config.get("machines", {}).items():
+        ftp = spec.get("ftp") if isinstance(spec, dict) else None
+        if not ftp:
+            continue
+        if not ftp.get("host"):
+            raise ValueError(f"Machine '{name}': ftp.host is required")
+        password = str(ftp.get("password", ""))
+        if ftp.get("password_env"):
+            password = os.environ.get(str(ftp["password_env"]), password)
+        targets[str(name)] = DeployTarget(
+            host=str(ftp["host"]),
+            port=int(ftp.get("port", 21)),
+            user=str(ftp.get("user", "anonymous")),
+            password=password,
+            directory=str(ftp.get("directory", "")),
+            passive=bool(ftp.get("passive", True)),
+        )
+    return targets
+
+
+# Files batch mode writes for each target machine (existing ones only)
+def plan_uploads(
+    config: Mapping[str, Any],
+    output_dir: str,
+    controllers: Optional[Sequence[str]] = None,
+    program_name: Optional[str] = None,
+) -> Tuple[List[Upload], List[str]]:
+    targets = targets_from_config(config)
+    presets = get_machine_index(config)
+    defaults = get_defaults(config)
+    if program_name:
+        defaults["program_name"] = program_name
+    uploads: List[Upload] = []
+    missing: List[str] = []
+    for name, target in targets.items():
+        preset = presets[name]
+        wanted = [preset.controller] if preset.controller in CONTROLLER_FILES else list(CONTROLLER_FILES)
+        if controllers:
+            wanted = [c for c in wanted if c in controllers]
+        for job in plan_jobs({name: preset}, defaults, wanted, output_dir):
+            if os.path.exists(job.path):
+                uploads.append(Upload(machine=name, local_path=job.path, target=target))
+            else:
+                missing.append(job.path)
+    return uploads, missing
+
+
+def _load_state(path: str) -> Dict[str, str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(path: str, state: Mapping[str, str]) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+# One FTP session per account; blocking calls, run on the worker pool
+class _Session:
+    def __init__(self, target: DeployTarget, timeout: float) -> None:
+        self.target = target
+        self.timeout = timeout
+        self.ftp: Optional[ftplib.FTP] = None
+        self.home = ""
+        self.cwd = ""
+        self.logged_in = False  # True once any login succeeded
+
+    def connect(self) -> None:
+        self.close()
+        ftp = ftplib.FTP(timeout=self.timeout)
+        ftp.connect(self.target.host, self.target.port)
+        ftp.login(self.target.user, self.target.password)
+        ftp.set_pasv(self.target.passive)
+        self.ftp = ftp
+        self.logged_in = True
+        self.home = ftp.pwd()
+        self.cwd = ""
+
+    def store(self, upload: Upload) -> None:
+        directory = upload.target.directory
+        if directory != self.cwd:
+            # Relative directories start from the login directory, not the previous file's
+            if self.cwd:
+                self.ftp.cwd(self.home)
+            if directory:
+                self.ftp.cwd(directory)
+            self.cwd = directory
+        with open(upload.local_path, "rb") as f:
+            self.ftp.storbinary(f"STOR {os.path.basename(upload.local_path)}", f)
+
+    def close(self) -> None:
+        if self.ftp is None:
+            return
+        try:
+            self.ftp.quit()
+        except (OSError, EOFError, ftplib.Error):
+            self.ftp.close()
+        self.ftp = None
+
+
+class Deployer:
+    def __init__(self, jobs: int = 8, retries: int = 3, backoff: float = 0.5, timeout: float = 10.0) -> None:
+        self.jobs = max(1, jobs)
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.timeout = timeout
+
+    # Upload every changed file; state maps remote path -> last uploaded SHA-256 and is updated in place
+    def run(self, uploads: List[Upload], state: Dict[str, str], force: bool = False) -> List[HostReport]:
+        return asyncio.run(self._run(uploads, state, force))
+
+    async def _run(self, uploads: List[Upload], state: Dict[str, str], force: bool) -> List[HostReport]:
+        groups: Dict[Tuple[str, int, str, str], List[Upload]] = {}
+        for upload in uploads:
+            groups.setdefault(upload.target.account, []).append(upload)
+        limit = asyncio.Semaphore(self.jobs)
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            tasks = [self._run_host(files, state, force, limit, pool) for files in groups.values()]
+            return list(await asyncio.gather(*tasks))
+
+    async def _run_host(
+        self, files: List[Upload], state: Dict[str, str], force: bool, limit: asyncio.Semaphore, pool: Any
+    ) -> HostReport:
+        loop = asyncio.get_running_loop()
+        target = files[0].target
+        report = HostReport(host=f"{target.host}:{target.port}")
+
+        # Hash locally before taking a worker slot; unchanged files never open a connection
+        pending = []
+        for upload in files:
+            with open(upload.local_path, "rb") as f:
+                data = f.read()
+            upload.sha256 = hashlib.sha256(data).hexdigest()
+            upload.size = len(data)
+            if not force and state.get(upload.target.remote_path(os.path.basename(upload.local_path))) == upload.sha256:
+                report.skipped += 1
+            else:
+                pending.append(upload)
+        if not pending:
+            return report
+
+        async with limit:
+            started = time.perf_counter()
+            session = _Session(target, self.timeout)
+            try:
+                for upload in pending:
+                    name = os.path.basename(upload.local_path)
+                    error = await self._upload_with_retries(session, upload, report, loop, pool)
+                    if error is None:
+                        state[upload.target.remote_path(name)] = upload.sha256
+                        report.uploaded += 1
+                        report.bytes_sent += upload.size
+                        continue
+                    report.errors.append(f"{name}: {error}")
+                    if not session.logged_in:
+                        # Host unreachable or login refused: do not retry every remaining file as well
+                        report.errors += [
+                            f"{os.path.basename(u.local_path)}: not attempted" for u in pending[pending.index(upload) + 1:]
+                        ]
+                        break
+            finally:
+                await loop.run_in_executor(pool, session.close)
+            report.seconds = time.perf_counter() - started
+        return report
+
+    # Send one file, reconnecting and backing off between attempts; returns the last error or None
+    async def _upload_with_retries(
+        self, session: "_Session", upload: Upload, report: HostReport, loop: Any, pool: Any
+    ) -> Optional[Exception]:
+        for attempt in range(self.retries + 1):
+            try:
+                if session.ftp is None:
+                    t0 = time.perf_counter()
+                    await loop.run_in_executor(pool, session.connect)
+                    report.connect_seconds += time.perf_counter() - t0
+                await loop.run_in_executor(pool, session.store, upload)
+                return None
+            except (OSError, EOFError, ftplib.Error) as exc:
+                await loop.run_in_executor(pool, session.close)
+                if attempt == self.retries:
+                    return exc
+                report.retries += 1
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        return None
+
+
+def format_reports(reports: Sequence[HostReport], elapsed: float) -> str:
+    lines = [f"{'host':<24} {'sent':>5} {'same':>5} {'bytes':>9} {'connect ms':>10} {'total ms':>9} {'retries':>7}  status"]
+    for r in sorted(reports, key=lambda r: r.host):
+        status = "ok" if r.ok else "FAILED: " + "; ".join(r.errors)
+        lines.append(
+            f"{r.host:<24} {r.uploaded:5d} {r.skipped:5d} {r.bytes_sent:9d} "
+            f"{r.connect_seconds * 1e3:10.1f} {r.seconds * 1e3:9.1f} {r.retries:7d}  {status}"
+        )
+    sent = sum(r.bytes_sent for r in reports)
+    files = sum(r.uploaded for r in reports)
+    rate = sent / elapsed if elapsed > 0 else 0.0
+    lines.append(
+        f"Uploaded {files} file(s), {sent} bytes to {len(reports)} host(s) in {elapsed:.3f} s "
+        f"({rate / 1024:.1f} KiB/s, {files / elapsed if elapsed > 0 else 0.0:.1f} files/s)"
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m cnc_warmup deploy", description="Upload generated programs over FTP")
+    parser.add_argument("--config", default=None, help="Config file (defaults to config/warmup_config.json)")
+    parser.add_argument("--output-dir", default="generated", help="Directory batch mode wrote the programs to")
+    parser.add_argument("--program-name", default=None, help="Program name prefix used for the batch run")
+    parser.add_argument("--controller", choices=list(CONTROLLER_FILES), default=None, help="Only this controller's files")
+    parser.add_argument("--jobs", type=int, default=8, help="Hosts uploaded concurrently")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per file (exponential backoff)")
+    parser.add_argument("--backoff", type=float, default=0.5, help="First retry delay in seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="FTP socket timeout in seconds")
+    parser.add_argument("--force", action="store_true", help="Upload files even if unchanged since the last deploy")
+    parser.add_argument("--dry-run", action="store_true", help="List what would be uploaded")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, disk_cache=True)
+    try:
+        uploads, missing = plan_uploads(
+            config, args.output_dir, [args.controller] if args.controller else None, args.program_name
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    for path in missing:
+        print(f"Not generated yet, skipping: {path}", file=sys.stderr)
+    if not uploads:
+        print("Nothing to deploy (no machine preset has an \"ftp\" target with generated files)")
+        return
+    if args.dry_run:
+        for upload in uploads:
+            name = os.path.basename(upload.local_path)
+            print(f"{upload.local_path} -> ftp://{upload.target.remote_path(name)}")
+        return
+
+    state_path = os.path.join(args.output_dir, STATE_NAME)
+    state = _load_state(state_path)
+    started = time.perf_counter()
+    deployer = Deployer(jobs=args.jobs, retries=args.retries, backoff=args.backoff, timeout=args.timeout)
+    try:
+        reports = deployer.run(uploads, state, force=args.force)
+    finally:
+        _save_state(state_path, state)
+    print(format_reports(reports, time.perf_counter() - started))
+    if not all(r.ok for r in reports):
+        sys.exit(1)
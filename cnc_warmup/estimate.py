@@ -0,0 +1,178 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+"""
+
+Cycle-time estimator for generated warmup programs.
+
+Times are derived from the same parameters passed to generate_program, following
+what each controller's program actually executes:
+
+- Fanuc 31i: four feed steps; each Z step is a down+up stroke between Z top-safe
+  (5% of travel capped at 10 mm) and Z bottom; each XY step traverses the full
+  diagonal four times (center -> A -> C -> A -> C -> center). The spindle loop
+  dwells at max(2, steps) speeds.
+- TNC 640: four single Z moves over the full Z travel and four full XY diagonals
+  at the start, +1/3, +2/3 and finish feeds. The spindle starts at RPM_START
+  without a dwell, then the LBL loop runs Q22 = max(1, steps) dwells.
+
+With ramp tables (spindle_ramp/feed_ramp, see cnc_warmup.ramps) the spindle
+phase is the sum of the per-step dwells and the axis phases use the table
+feeds.
+
+With overlap (see cnc_warmup.schedule) the spindle phase is only the residual
+dwell left after the axis passes; the axis phases are unchanged.
+
+Notes:
+Rapid (G00/FMAX) positioning and spindle acceleration are not included.
+
+"""
+
+# Number of axis feed steps both generators use
+FEED_STEPS = 4
+
+
+# Per-phase estimate in seconds
+@dataclass
+class CycleEstimate:
+    controller: str
+    z_seconds: float
+    xy_seconds: float
+    spindle_seconds: float
+
+    @property
+    def total_seconds(self) -> float:
+        return self.z_seconds + self.xy_seconds + self.spindle_seconds
+
+    def format(self) -> str:
+        return "\n".join(
+            [
+                f"Estimated cycle time ({self.controller}):",
+                f"  Z axis:   {format_duration(self.z_seconds)}",
+                f"  XY axes:  {format_duration(self.xy_seconds)}",
+                f"  Spindle:  {format_duration(self.spindle_seconds)}",
+                f"  Total:    {format_duration(self.total_seconds)}",
+                "  (rapid positioning not included)",
+            ]
+        )
+
+
+# Seconds as "12m 03.5s"
+def format_duration(seconds: float) -> str:
+    if math.isinf(seconds):
+        return "inf"
+    minutes, secs = divmod(float(seconds), 60.0)
+    return f"{int(minutes)}m {secs:04.1f}s"
+
+
+# Sum of 1/feed over the feed steps, in minutes per mm (inf if any feed <= 0)
+def _inverse_feed_sum(start_feed: float, finish_feed: float, feeds: Optional[Sequence[float]] = None) -> float:
+    if not feeds:
+        delta = (finish_feed - start_feed) / (FEED_STEPS - 1)
+        feeds = [start_feed + delta * k for k in range(FEED_STEPS)]
+    total = 0.0
+    for feed in feeds:
+        if feed <= 0:
+            return math.inf
+        total += 1.0 / feed
+    return total
+
+
+# Estimate one program. Extra generate_program arguments (program_name, ...) are ignored,
+# so the same keyword dict can be passed to both.
+def estimate_cycle_time(
+    controller: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float = 0.0,
+    finish_rpm: float = 0.0,
+    seconds_per_step: int = 0,
+    spindle_ramp: Optional[Sequence[Tuple[float, float]]] = None,
+    feed_ramp: Optional[Sequence[float]] = None,
+    overlap: bool = False,
+    **_ignored: Any,
+) -> CycleEstimate:
+    columns = estimate_batch(
+        controller,
+        {
+            "x_travel": [x_travel],
+            "y_travel": [y_travel],
+            "z_travel": [z_travel],
+            "start_feed_mm_min": [start_feed_mm_min],
+            "finish_feed_mm_min": [finish_feed_mm_min],
+            "steps": [steps],
+            "seconds_per_step": [seconds_per_step],
+            "start_rpm": [start_rpm],
+            "finish_rpm": [finish_rpm],
+            "spindle_ramp": [spindle_ramp],
+            "feed_ramp": [feed_ramp],
+            "overlap": [overlap],
+        },
+    )
+    return CycleEstimate(
+        controller=controller,
+        z_seconds=columns["z_seconds"][0],
+        xy_seconds=columns["xy_seconds"][0],
+        spindle_seconds=columns["spindle_seconds"][0],
+    )
+
+
+# Estimate many parameter combinations in one call.
+# Takes equal-length columns keyed like generate_program arguments and returns
+# z_seconds, xy_seconds, spindle_seconds and total_seconds columns. The
+# spindle_ramp and feed_ramp columns are optional (None entries = linear ramp),
+# and so is overlap (true entries = overlapped spindle, see cnc_warmup.schedule;
+# needs start_rpm/finish_rpm columns for rows without a spindle_ramp).
+def estimate_batch(controller: str, columns: Mapping[str, Sequence[float]]) -> Dict[str, List[float]]:
+    if controller not in ("tnc640", "fanuc31i"):
+        raise ValueError(f"Unknown controller: {controller}")
+    fanuc = controller == "fanuc31i"
+
+    x = columns["x_travel"]
+    y = columns["y_travel"]
+    z = columns["z_travel"]
+    start_feed = columns["start_feed_mm_min"]
+    finish_feed = columns["finish_feed_mm_min"]
+    steps = columns["steps"]
+    dwell = columns["seconds_per_step"]
+
+    # Distances travelled per feed step, in mm
+    if fanuc:
+        z_dist = [2.0 * (abs(zz) - min(abs(zz) * 0.05, 10.0)) for zz in z]
+        xy_dist = [4.0 * math.hypot(xx, yy) for xx, yy in zip(x, y)]
+        min_steps = 2
+    else:
+        z_dist = [abs(zz) for zz in z]
+        xy_dist = [math.hypot(xx, yy) for xx, yy in zip(x, y)]
+        min_steps = 1
+
+    # Same feeds for every step of a row, so time = distance * sum(1/feed) * 60
+    feed_ramps = columns.get("feed_ramp") or [None] * len(x)
+    inv = [_inverse_feed_sum(float(s), float(f), r) for s, f, r in zip(start_feed, finish_feed, feed_ramps)]
+    z_seconds = [60.0 * d * i if d else 0.0 for d, i in zip(z_dist, inv)]
+    xy_seconds = [60.0 * d * i if d else 0.0 for d, i in zip(xy_dist, inv)]
+    spindle_seconds = [float(max(min_steps, int(n)) * max(0, int(t))) for n, t in zip(steps, dwell)]
+    for i, ramp in enumerate(columns.get("spindle_ramp") or ()):
+        if ramp:
+            spindle_seconds[i] = float(sum(max(0, int(t)) for _, t in ramp))
+    overlap = columns.get("overlap") or ()
+    if any(overlap):
+        from .schedule import overlap_schedule
+
+        names = [name for name in columns if name != "overlap"]
+        for i, flag in enumerate(overlap):
+            if flag:
+                row = {name: columns[name][i] for name in names}
+                spindle_seconds[i] = overlap_schedule(controller, row).residual_seconds
+
+    return {
+        "z_seconds": z_seconds,
+        "xy_seconds": xy_seconds,
+        "spindle_seconds": spindle_seconds,
+        "total_seconds": [a + b + c for a, b, c in zip(z_seconds, xy_seconds, spindle_seconds)],
+    }
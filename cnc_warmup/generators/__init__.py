@@ -1,10 +1,175 @@
-# re-export generator entry points
-from .fanuc31i_warmup import generate_program as generate_fanuc_program
-from .tnc640_warmup import generate_program as generate_tnc_program
+import importlib
+from types import ModuleType
+from typing import IO, Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+# Generator modules are imported on first use, so a CLI call only pays for the
+# controller it generates.
+#
+# A backend renders a controller-neutral WarmupPlan (cnc_warmup.plan):
+#   render_plan(plan, program_name, machine_label=None, compact=False) -> str
+#   iter_plan(plan, program_name, machine_label=None, compact=False) -> Iterator[str]
+# plus optional FILE_TAG / FILE_EXTENSION for batch file names, and optionally
+#   iter_unrolled(plan, program_name, machine_label=None, compact=False) -> Iterator[str]
+# for --unrolled output (literal blocks, no macro variables or loops). The
+# built-in modules also keep the generate_program / iter_program / write_program API.
+# Other controllers are installed as packages registering a backend module
+# under the BACKEND_GROUP entry point group, e.g. in their pyproject.toml:
+#   [project.entry-points."cnc_warmup.backends"]
+#   sinumerik840d = "warmup_sinumerik.backend"
+# Entry points are only read when a controller that is not built in is asked
+# for, or when listing controllers.
+
+# Bump whenever generated output changes for the same arguments; part of the
+# output cache key (see cnc_warmup.output_cache)
+GENERATOR_VERSION = "1"
+
+# Controller key -> generator module
+CONTROLLER_MODULES: Dict[str, str] = {
+    "tnc640": "tnc640_warmup",
+    "fanuc31i": "fanuc31i_warmup",
+}
+
+# Entry point group for third-party backends
+BACKEND_GROUP = "cnc_warmup.backends"
+
+# re-export generator entry points (resolved lazily)
+_EXPORTS: Dict[str, Tuple[str, str]] = {
+    "generate_fanuc_program": ("fanuc31i_warmup", "generate_program"),
+    "iter_fanuc_program": ("fanuc31i_warmup", "iter_program"),
+    "write_fanuc_program": ("fanuc31i_warmup", "write_program"),
+    "generate_tnc_program": ("tnc640_warmup", "generate_program"),
+    "iter_tnc_program": ("tnc640_warmup", "iter_program"),
+    "write_tnc_program": ("tnc640_warmup", "write_program"),
+}
 
 __all__ = [
+    "BACKEND_GROUP",
+    "CONTROLLER_MODULES",
+    "GENERATOR_VERSION",
     "generate_fanuc_program",
     "generate_tnc_program",
+    "iter_fanuc_program",
+    "iter_tnc_program",
+    "available_controllers",
+    "iter_program_blocks",
+    "load_generator",
+    "render_program",
+    "stream_program",
+    "write_blocks",
+    "write_fanuc_program",
+    "write_tnc_program",
 ]
 
 
+# Installed third-party backends: name -> entry point, read once
+_plugin_backends: Optional[Dict[str, Any]] = None
+
+
+def _entry_points() -> Dict[str, Any]:
+    global _plugin_backends
+    if _plugin_backends is None:
+        from importlib.metadata import entry_points
+
+        _plugin_backends = {
+            ep.name: ep for ep in entry_points(group=BACKEND_GROUP) if ep.name not in CONTROLLER_MODULES
+        }
+    return _plugin_backends
+
+
+# Built-in controller keys, then installed backends
+def available_controllers() -> List[str]:
+    return list(CONTROLLER_MODULES) + sorted(_entry_points())
+
+
+# Import and return the generator module (backend) for a controller key.
+def load_generator(controller: str) -> ModuleType:
+    module = CONTROLLER_MODULES.get(controller)
+    if module is not None:
+        return importlib.import_module(f"{__name__}.{module}")
+    entry_point = _entry_points().get(controller)
+    if entry_point is None:
+        raise ValueError(f"Unknown controller: {controller}")
+    return entry_point.load()
+
+
+# Program text for generate_program keyword arguments, rendered by any backend.
+# The plan is cached (cnc_warmup.plan.build_plan), so rendering the same
+# machine for several controllers builds it once.
+def render_program(controller: str, params: Mapping[str, Any]) -> str:
+    from ..plan import build_plan
+
+    if params.get("unrolled"):
+        return "".join(f"{block}\n" for block in iter_program_blocks(controller, params))
+    return load_generator(controller).render_plan(
+        build_plan(**params),
+        params["program_name"],
+        params.get("machine_label"),
+        bool(params.get("compact", False)),
+    )
+
+
+# Program blocks (no newlines) for generate_program keyword arguments; the
+# backend's iter_unrolled when params["unrolled"] is set. Raises ValueError
+# (before yielding anything) if the backend has no unrolled output.
+def iter_program_blocks(controller: str, params: Mapping[str, Any]) -> Iterator[str]:
+    from ..plan import build_plan
+
+    backend = load_generator(controller)
+    if params.get("unrolled"):
+        render = getattr(backend, "iter_unrolled", None)
+        if render is None:
+            raise ValueError(f"{controller} has no unrolled output")
+    else:
+        render = backend.iter_plan
+    return render(
+        build_plan(**params),
+        params["program_name"],
+        params.get("machine_label"),
+        bool(params.get("compact", False)),
+    )
+
+
+# Blocks encoded and written per write() call by write_blocks
+STREAM_CHUNK_BLOCKS = 4096
+
+
+# Write blocks as program text to a binary file, a chunk at a time, so memory
+# stays constant whatever the program length. With fp None the text is only
+# measured. Returns (bytes, lines, SHA-256 hex digest).
+def write_blocks(blocks: Iterable[str], fp: Optional[IO[bytes]] = None) -> Tuple[int, int, str]:
+    import hashlib
+
+    digest = hashlib.sha256()
+    size = lines = 0
+    chunk: List[str] = []
+    it = iter(blocks)
+    while True:
+        chunk[:] = [block for _, block in zip(range(STREAM_CHUNK_BLOCKS), it)]
+        if not chunk:
+            break
+        chunk.append("")
+        data = "\n".join(chunk).encode("utf-8")
+        digest.update(data)
+        if fp is not None:
+            fp.write(data)
+        size += len(data)
+        lines += len(chunk) - 1
+    return size, lines, digest.hexdigest()
+
+
+# Stream the program for generate_program keyword arguments (see
+# iter_program_blocks) to a binary file; returns (bytes, lines, SHA-256)
+def stream_program(
+    controller: str, params: Mapping[str, Any], fp: Optional[IO[bytes]] = None
+) -> Tuple[int, int, str]:
+    return write_blocks(iter_program_blocks(controller, params), fp)
+
+
+def __getattr__(name: str) -> Any:
+    try:
+        module, attr = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(importlib.import_module(f"{__name__}.{module}"), attr)
+    globals()[name] = value
+    return value
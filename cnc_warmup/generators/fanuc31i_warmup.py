@@ -1,4 +1,9 @@
-from typing import List
+import re
+from functools import lru_cache
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Mapping, Sequence, Tuple
+
+from ..plan import WarmupPlan, build_plan
+from .template import ProgramTemplate, compile_template, slot_marker
 
 """
 
@@ -10,6 +15,17 @@ configurable steps and dwell times.
 
 Notes:
 Warmup is done from the center of the machine using G53 to reference absolute positions.
+The program is rendered from a WarmupPlan (cnc_warmup.plan); generate_program
+and friends build the plan from their arguments.
+Compact mode strips comments and spaces and drops repeated modal words to save
+part-program memory. With spindle_ramp/feed_ramp (see cnc_warmup.ramps) the
+per-step RPM, dwell and feed values are stored in #301.., #401.. and #361..
+and read by step number with #[...], instead of being computed linearly.
+With overlap (see cnc_warmup.schedule) the spindle is started before the Z
+passes at the speeds in #371-#378, and only the dwell the axis passes do not
+cover is run afterwards, as a ramp table.
+iter_unrolled writes the same warmup without Custom Macro B: every pass and
+spindle step as a literal block, with the values the macro program computes.
 
 """
 
@@ -20,172 +36,626 @@ def _format_number(value: float) -> str:
     s = f"{value:.6f}".rstrip("0").rstrip(".")
     return s if s else "0"
 
-# Generate the warmup program text.
-def generate_program(
+# Raw values for every parameter-dependent slot in the program. spindle is the
+# spindle table actually emitted (the plan's, or the overlap residual).
+def _slot_values(
+    plan: WarmupPlan,
     program_name: str,
-    x_travel: float,
-    y_travel: float,
-    z_travel: float,
-    start_feed_mm_min: float,
-    finish_feed_mm_min: float,
-    steps: int,
-    start_rpm: float,
-    finish_rpm: float,
-    seconds_per_step: int,
-    include_coolant: bool = True,
-    machine_label: str | None = None,
-) -> str:
+    machine_label: str | None,
+    spindle: Sequence[Tuple[float, int]],
+    schedule: Any = None,
+) -> Dict[str, object]:
 
-    clamped_steps = max(2, int(steps))
-    clamped_dwell = max(0, int(seconds_per_step))
+    clamped_steps = max(2, plan.spindle.steps)
 
-    max_x = abs(float(x_travel))
-    max_y = abs(float(y_travel))
-    max_z = abs(float(z_travel))
+    max_x = abs(float(plan.x_travel))
+    max_y = abs(float(plan.y_travel))
+    max_z = abs(float(plan.z_travel))
 
     # Machine limits defaults (centered X/Y around 0; Z home at 0)
     half_x = max_x / 2.0
     half_y = max_y / 2.0
-    x_min_safe = -half_x
-    x_max_safe = +half_x
-    y_min_safe = -half_y
-    y_max_safe = +half_y
-    z_home = 0.0
-    # Choose a reasonable top-safe slightly below home: 5% of travel capped at 10mm
-    z_top_safe = -min(max_z * 0.05, 10.0)
-    z_bottom_safe = -max_z
-
-    lines: List[str] = []
-    lines.append("%")
-    lines.append("O0001 (" + str(program_name).upper() + ")")
-    if machine_label:
-        lines.append("(FANUC 31I \u2022 UNITS: MM \u2022 " + machine_label + ")")
+    values: Dict[str, object] = {
+        "program_name": str(program_name).upper(),
+        "machine_label": machine_label or "",
+        "x_min_safe": -half_x,
+        "x_max_safe": +half_x,
+        "y_min_safe": -half_y,
+        "y_max_safe": +half_y,
+        "z_home": 0.0,
+        # Choose a reasonable top-safe slightly below home: 5% of travel capped at 10mm
+        "z_top_safe": -min(max_z * 0.05, 10.0),
+        "z_bottom_safe": -max_z,
+        "start_feed": plan.start_feed,
+        "finish_feed": plan.finish_feed,
+        "start_rpm": plan.spindle.start_rpm,
+        "finish_rpm": plan.spindle.finish_rpm,
+        "rpm_steps": clamped_steps,
+        "dwell": plan.spindle.dwell,
+    }
+    for k, (rpm, dwell) in enumerate(spindle, 1):
+        values[f"ramp_rpm_{k}"] = int(rpm)
+        values[f"ramp_dwell_{k}"] = max(0, int(dwell))
+    for k, feed in enumerate(plan.feed_table, 1):
+        values[f"feed_{k}"] = feed
+    if schedule is not None:
+        values["overlap_summary"] = schedule.summary().upper()
+        for k, label in enumerate(schedule.pass_labels, 1):
+            values[f"overlap_rpm_{k}"] = int(schedule.pass_rpm[k - 1])
+            values[f"overlap_pass_{k}"] = (
+                f"{label[:-1]} PASS {label[-1]} F{_format_number(round(schedule.pass_feeds[k - 1], 3))} "
+                f"{schedule.pass_seconds[k - 1]:.0f} SEC"
+            )
+    return values
+
+
+# Spindle table to emit and overlap schedule (None without overlap) for a plan
+def _spindle_layout(plan: WarmupPlan) -> Tuple[Sequence[Tuple[float, int]], Any]:
+    if not plan.overlap:
+        return plan.spindle.table, None
+    from ..schedule import overlap_schedule
+
+    schedule = overlap_schedule("fanuc31i", plan.params())
+    return schedule.residual, schedule
+
+
+# Slot name -> formatter applied when filling the template
+_SLOT_FORMATS: Dict[str, Callable[[object], str]] = {
+    "program_name": str,
+    "machine_label": str,
+    **{
+        name: _format_number
+        for name in (
+            "x_min_safe", "x_max_safe", "y_min_safe", "y_max_safe", "z_home", "z_top_safe",
+            "z_bottom_safe", "start_feed", "finish_feed", "start_rpm", "finish_rpm", "rpm_steps", "dwell",
+        )
+    },
+}
+
+
+# Slot formats for a program with ramp_steps spindle and feed_steps feed table
+# entries, and the overlap slots if overlap is set
+@lru_cache(maxsize=None)
+def _slot_formats(ramp_steps: int, feed_steps: int, overlap: bool = False) -> Dict[str, Callable[[object], str]]:
+    formats = dict(_SLOT_FORMATS)
+    if overlap:
+        formats["overlap_summary"] = str
+        for k in range(1, 9):
+            formats[f"overlap_rpm_{k}"] = _format_number
+            formats[f"overlap_pass_{k}"] = str
+    for k in range(1, ramp_steps + 1):
+        formats[f"ramp_rpm_{k}"] = _format_number
+        formats[f"ramp_dwell_{k}"] = _format_number
+    for k in range(1, feed_steps + 1):
+        formats[f"feed_{k}"] = _format_number
+    return formats
+
+
+# Yield the program blocks with already formatted slot values.
+# ramp_steps/feed_steps > 0 select the table-driven spindle/feed ramps; with
+# overlap the spindle runs during the axis passes and ramp_steps is the residual.
+def _iter_blocks(
+    v: Mapping[str, str],
+    include_coolant: bool,
+    labeled: bool,
+    ramp_steps: int = 0,
+    feed_steps: int = 0,
+    overlap: bool = False,
+) -> Iterator[str]:
+    table = bool(ramp_steps) or overlap
+
+    yield "%"
+    yield "O0001 (" + v["program_name"] + ")"
+    if labeled:
+        yield "(FANUC 31I \u2022 UNITS: MM \u2022 " + v["machine_label"] + ")"
     else:
-        lines.append("(FANUC 31I \u2022 UNITS: MM)")
-    lines.append("")
+        yield "(FANUC 31I \u2022 UNITS: MM)"
+    yield ""
 
     # Config: machine limits
-    lines.append("(===== CONFIG: MACHINE LIMITS IN MACHINE COORDS (G53) =====)")
-    lines.append(f"#100 = {_format_number(x_min_safe)}     (X_MIN_SAFE)")
-    lines.append(f"#101 = {_format_number(x_max_safe)}     (X_MAX_SAFE)")
-    lines.append(f"#102 = {_format_number(y_min_safe)}     (Y_MIN_SAFE)")
-    lines.append(f"#103 = {_format_number(y_max_safe)}     (Y_MAX_SAFE)")
-    lines.append(f"#104 = {_format_number(z_home)}      (Z_HOME)")
-    lines.append(f"#106 = {_format_number(z_top_safe)}     (Z_TOP_SAFE)")
-    lines.append(f"#107 = {_format_number(z_bottom_safe)}     (Z_BOTTOM_SAFE)")
-    lines.append("")
+    yield "(===== CONFIG: MACHINE LIMITS IN MACHINE COORDS (G53) =====)"
+    yield f"#100 = {v['x_min_safe']}     (X_MIN_SAFE)"
+    yield f"#101 = {v['x_max_safe']}     (X_MAX_SAFE)"
+    yield f"#102 = {v['y_min_safe']}     (Y_MIN_SAFE)"
+    yield f"#103 = {v['y_max_safe']}     (Y_MAX_SAFE)"
+    yield f"#104 = {v['z_home']}      (Z_HOME)"
+    yield f"#106 = {v['z_top_safe']}     (Z_TOP_SAFE)"
+    yield f"#107 = {v['z_bottom_safe']}     (Z_BOTTOM_SAFE)"
+    yield ""
 
     # Config: axis feed ramp
-    lines.append("(===== CONFIG: AXIS FEED RAMP =====)")
-    lines.append(f"#120 = {_format_number(start_feed_mm_min)}     (FEED_START  mm/min)")
-    lines.append(f"#121 = {_format_number(finish_feed_mm_min)}     (FEED_FIN    mm/min)")
-    lines.append(f"#122 = 4     (FEED_STEPS)")
-    lines.append("")
+    yield "(===== CONFIG: AXIS FEED RAMP =====)"
+    yield f"#120 = {v['start_feed']}     (FEED_START  mm/min)"
+    yield f"#121 = {v['finish_feed']}     (FEED_FIN    mm/min)"
+    yield "#122 = 4     (FEED_STEPS)"
+    for k in range(1, feed_steps + 1):
+        yield f"#{360 + k} = {v[f'feed_{k}']}     (FEED STEP {k} mm/min)"
+    yield ""
 
     # Config: spindle warmup
-    lines.append("(===== CONFIG: SPINDLE WARMUP =====)")
-    lines.append(f"#200 = {_format_number(start_rpm)}    (RPM_START)")
-    lines.append(f"#201 = {_format_number(finish_rpm)}    (RPM_FIN)")
-    lines.append(f"#202 = {_format_number(clamped_steps)}    (RPM_STEPS   >=2)")
-    lines.append(f"#203 = {_format_number(clamped_dwell)}    (DWELL PER STEP, seconds)")
-    lines.append("")
+    if overlap:
+        yield "(===== CONFIG: SPINDLE DURING AXIS PASSES =====)"
+        yield "(" + v["overlap_summary"] + ")"
+        for k in range(1, 9):
+            yield f"#{370 + k} = {v[f'overlap_rpm_{k}']}    (" + v[f"overlap_pass_{k}"] + ")"
+        if ramp_steps:
+            yield ""
+    if ramp_steps:
+        yield "(===== CONFIG: SPINDLE RAMP TABLE =====)"
+        yield f"#202 = {ramp_steps}    (RPM_STEPS)"
+        for k in range(1, ramp_steps + 1):
+            yield f"#{300 + k} = {v[f'ramp_rpm_{k}']}    (STEP {k} RPM)"
+            yield f"#{400 + k} = {v[f'ramp_dwell_{k}']}    (STEP {k} DWELL, seconds)"
+    elif not overlap:
+        yield "(===== CONFIG: SPINDLE WARMUP =====)"
+        yield f"#200 = {v['start_rpm']}    (RPM_START)"
+        yield f"#201 = {v['finish_rpm']}    (RPM_FIN)"
+        yield f"#202 = {v['rpm_steps']}    (RPM_STEPS   >=2)"
+        yield f"#203 = {v['dwell']}    (DWELL PER STEP, seconds)"
+    yield ""
 
     # Housekeeping / safe start
-    lines.append("(===== SAFE START =====)")
-    lines.append("G21 G17 G90 G94 G40 G49 G80")
-    lines.append("M05")
-    lines.append("M09")
+    yield "(===== SAFE START =====)"
+    yield "G21 G17 G90 G94 G40 G49 G80"
+    yield "M05"
+    yield "M09"
     if include_coolant:
-        lines.append("M08                  (optional coolant)")
-    lines.append("")
+        yield "M08                  (optional coolant)"
+    yield ""
 
-    # Ensure step counts sane
-    lines.append("IF[#202 LT 2.] THEN #202 = 2.")
-    lines.append("")
+    if not table:
+        # Ensure step counts sane
+        yield "IF[#202 LT 2.] THEN #202 = 2."
+        yield ""
 
     # Precompute step sizes
-    lines.append("#123 = [#121 - #120] / [#122 - 1.]    (axis feed delta per step)")
-    lines.append("#205 = [#201 - #200] / [#202 - 1.]    (spindle rpm delta per step)")
-    lines.append("")
+    if not feed_steps:
+        yield "#123 = [#121 - #120] / [#122 - 1.]    (axis feed delta per step)"
+    if not table:
+        yield "#205 = [#201 - #200] / [#202 - 1.]    (spindle rpm delta per step)"
+    if not (feed_steps and table):
+        yield ""
 
     # Go to safe machine Z before XY motion
-    lines.append("(----- Establish safe machine positions -----)")
-    lines.append("G90 G53 G00 Z#104            (park at Z home)")
-    lines.append("")
+    yield "(----- Establish safe machine positions -----)"
+    yield "G90 G53 G00 Z#104            (park at Z home)"
+    yield ""
     # Move to Z top-safe and XY center
-    lines.append("G90 G53 G00 Z#106            (down to top-safe Z)")
-    lines.append("#110 = [#100 + #101] / 2.    (center X)")
-    lines.append("#111 = [#102 + #103] / 2.    (center Y)")
-    lines.append("G90 G53 G00 X#110 Y#111      (move to XY center)")
-    lines.append("")
+    yield "G90 G53 G00 Z#106            (down to top-safe Z)"
+    yield "#110 = [#100 + #101] / 2.    (center X)"
+    yield "#111 = [#102 + #103] / 2.    (center Y)"
+    yield "G90 G53 G00 X#110 Y#111      (move to XY center)"
+    yield ""
 
     # Z warmup
-    lines.append("(============ Z WARMUP ============)")
-    lines.append("#150 = ABS[#106 - #107]      (positive stroke length)")
-    lines.append("G91                          (incremental moves around the safe center)")
-    lines.append("#130 = 1.")
-    lines.append("WHILE[#130 LE #122] DO1")
-    lines.append("  #131 = #120 + [#123 * [#130 - 1.]]    (current feed)")
-    lines.append("  G01 Z[-#150] F#131                    (down to bottom-safe relative to top-safe)")
-    lines.append("  G01 Z[#150]  F#131                    (back up to top-safe)")
-    lines.append("  #130 = #130 + 1.")
-    lines.append("END1")
-    lines.append("")
+    yield "(============ Z WARMUP ============)"
+    yield "#150 = ABS[#106 - #107]      (positive stroke length)"
+    yield "G91                          (incremental moves around the safe center)"
+    if overlap:
+        yield "S#371 M03                    (spindle on for the axis passes)"
+    yield "#130 = 1."
+    yield "WHILE[#130 LE #122] DO1"
+    if feed_steps:
+        yield "  #131 = #[360 + #130]                  (current feed)"
+    else:
+        yield "  #131 = #120 + [#123 * [#130 - 1.]]    (current feed)"
+    if overlap:
+        yield "  S#[370 + #130]                        (spindle speed for this pass)"
+    yield "  G01 Z[-#150] F#131                    (down to bottom-safe relative to top-safe)"
+    yield "  G01 Z[#150]  F#131                    (back up to top-safe)"
+    yield "  #130 = #130 + 1."
+    yield "END1"
+    yield ""
 
     # XY warmup
-    lines.append("(============ XY WARMUP ============)")
-
-    lines.append("#160 = [#101 - #100]         (rect width)")
-    lines.append("#161 = [#103 - #102]         (rect height)")
-    lines.append("#162 = #160 / 2.             (half width)")
-    lines.append("#163 = #161 / 2.             (half height)")
-    lines.append("")
-    lines.append("#140 = 1.")
-    lines.append("WHILE[#140 LE #122] DO2")
-    lines.append("  #141 = #120 + [#123 * [#140 - 1.]]    (current feed)")
-    lines.append("")
-    lines.append("  (center -> corner A)")
-    lines.append("  G01 X[-#162] Y[-#163] F#141")
-    lines.append("  (A -> corner C (opposite))")
-    lines.append("  G01 X[#160]  Y[#161]  F#141")
-    lines.append("  (C -> A)")
-    lines.append("  G01 X[-#160] Y[-#161] F#141")
-    lines.append("  (A -> C again (second traverse per step))")
-    lines.append("  G01 X[#160]  Y[#161]  F#141")
-    lines.append("  (return to center)")
-    lines.append("  G01 X[-#162] Y[-#163] F#141")
-    lines.append("")
-    lines.append("  #140 = #140 + 1.")
-    lines.append("END2")
-    lines.append("")
+    yield "(============ XY WARMUP ============)"
+
+    yield "#160 = [#101 - #100]         (rect width)"
+    yield "#161 = [#103 - #102]         (rect height)"
+    yield "#162 = #160 / 2.             (half width)"
+    yield "#163 = #161 / 2.             (half height)"
+    yield ""
+    yield "#140 = 1."
+    yield "WHILE[#140 LE #122] DO2"
+    if feed_steps:
+        yield "  #141 = #[360 + #140]                  (current feed)"
+    else:
+        yield "  #141 = #120 + [#123 * [#140 - 1.]]    (current feed)"
+    if overlap:
+        yield "  S#[374 + #140]                        (spindle speed for this pass)"
+    yield ""
+    yield "  (center -> corner A)"
+    yield "  G01 X[-#162] Y[-#163] F#141"
+    yield "  (A -> corner C (opposite))"
+    yield "  G01 X[#160]  Y[#161]  F#141"
+    yield "  (C -> A)"
+    yield "  G01 X[-#160] Y[-#161] F#141"
+    yield "  (A -> C again (second traverse per step))"
+    yield "  G01 X[#160]  Y[#161]  F#141"
+    yield "  (return to center)"
+    yield "  G01 X[-#162] Y[-#163] F#141"
+    yield ""
+    yield "  #140 = #140 + 1."
+    yield "END2"
+    yield ""
 
 
     # Spindle warmup loop
-    lines.append("(============ SPINDLE WARMUP ============)")
-    lines.append("G90")
-    lines.append("#210 = 1.")
-    lines.append("WHILE[#210 LE #202] DO3")
-    lines.append("  #211 = FIX[#200 + [#205 * [#210 - 1.]]] (target RPM)")
-    lines.append("  IF[#210 EQ 1.] THEN")
-    lines.append("    S#211 M03")
-    lines.append("  ELSE")
-    lines.append("    S#211")
-    lines.append("  ENDIF")
-    lines.append("  G04 X#203 (dwell time)")
-    lines.append("  #210 = #210 + 1.")
-    lines.append("END3")
-    lines.append("M05")
+    yield "(============ SPINDLE WARMUP ============)"
+    if overlap and not ramp_steps:
+        yield "(DWELL COVERED BY THE AXIS PASSES)"
+        yield "G90"
+        yield "M05"
+        if include_coolant:
+            yield "M09"
+        yield ""
+        yield "(============ PARK ============)"
+        yield "G90 G53 G00 Z#104"
+        yield "M30"
+        yield "%"
+        return
+    yield "G90"
+    yield "#210 = 1."
+    yield "WHILE[#210 LE #202] DO3"
+    if ramp_steps:
+        yield "  #211 = #[300 + #210] (target RPM)"
+    else:
+        yield "  #211 = FIX[#200 + [#205 * [#210 - 1.]]] (target RPM)"
+    yield "  IF[#210 EQ 1.] THEN"
+    yield "    S#211 M03"
+    yield "  ELSE"
+    yield "    S#211"
+    yield "  ENDIF"
+    yield "  G04 X#[400 + #210] (dwell time)" if ramp_steps else "  G04 X#203 (dwell time)"
+    yield "  #210 = #210 + 1."
+    yield "END3"
+    yield "M05"
     if include_coolant:
-        lines.append("M09")
-    lines.append("")
+        yield "M09"
+    yield ""
 
     # Park
-    lines.append("(============ PARK ============)")
-    lines.append("G90 G53 G00 Z#104")
-    lines.append("M30")
-    lines.append("%")
+    yield "(============ PARK ============)"
+    yield "G90 G53 G00 Z#104"
+    yield "M30"
+    yield "%"
+
+
+# Remove parenthesized comments, including nested ones.
+def _strip_comments(block: str) -> str:
+    out = []
+    depth = 0
+    for ch in block:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth = max(0, depth - 1)
+        elif depth == 0:
+            out.append(ch)
+    return "".join(out)
+
+
+# Modal words tracked for redundancy, by group
+_MODAL_GROUPS = {"G00": "motion", "G01": "motion", "G90": "distance", "G91": "distance"}
+_F_WORD = re.compile(r"F(?:#\d+|[\d.]+)$")
+_ASSIGNMENT = re.compile(r"(#\d+)\s*=")
+
+
+# Compact output: drop comments, blank blocks, spaces and repeated modal words.
+# Modal state is forgotten at every loop/branch boundary so a dropped word can
+# never depend on which way control flow went.
+def _compact_blocks(blocks: Iterable[str]) -> Iterator[str]:
+    modal: Dict[str, str] = {}
+    for block in blocks:
+        text = block.strip()
+        if text.startswith("O"):
+            # Keep the program name comment: the control lists programs by it
+            number, _, name = text.partition(" ")
+            yield number + name.strip()
+            continue
+        if "(" in text:
+            text = _strip_comments(text).strip()
+        if not text:
+            continue
+        head = text.split("[", 1)[0].split(" ", 1)[0]
+        if head.startswith(("WHILE", "END", "ELSE", "GOTO", "M99")) or (head == "IF" and text.endswith("THEN")):
+            modal.clear()
+            yield text.replace(" ", "")
+            continue
+
+        words = []
+        for word in text.split():
+            group = _MODAL_GROUPS.get(word, "F" if _F_WORD.match(word) else None)
+            if group is not None:
+                if modal.get(group) == word:
+                    continue
+                modal[group] = word
+            words.append(word)
+        # Reassigning the variable behind the active F word changes the feed
+        if "#" in text:
+            for var in _ASSIGNMENT.findall(text):
+                if modal.get("F") == "F" + var:
+                    del modal["F"]
+        if words:
+            yield "".join(words)
+
+
+# Compile the program once per block-structure variant.
+@lru_cache(maxsize=None)
+def _template(
+    include_coolant: bool,
+    labeled: bool,
+    compact: bool,
+    ramp_steps: int = 0,
+    feed_steps: int = 0,
+    overlap: bool = False,
+) -> ProgramTemplate:
+    formats = _slot_formats(ramp_steps, feed_steps, overlap)
+    markers = {name: slot_marker(name) for name in formats}
+    blocks = _iter_blocks(markers, include_coolant, labeled, ramp_steps, feed_steps, overlap)
+    return compile_template(_compact_blocks(blocks) if compact else blocks, formats)
 
-    return "\n".join(lines) + "\n"
 
+# Yield the program blocks of a plan in order.
+def iter_plan(
+    plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False
+) -> Iterator[str]:
+    spindle, schedule = _spindle_layout(plan)
+    values = _slot_values(plan, program_name, machine_label, spindle, schedule)
+    overlap = schedule is not None
+    formats = _slot_formats(len(spindle), len(plan.feed_table), overlap)
+    formatted = {name: formats[name](value) for name, value in values.items()}
+    blocks = _iter_blocks(
+        formatted, plan.include_coolant, bool(machine_label), len(spindle), len(plan.feed_table), overlap
+    )
+    return _compact_blocks(blocks) if compact else blocks
+
+
+# Render a plan from the precompiled template.
+def render_plan(plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False) -> str:
+    spindle, schedule = _spindle_layout(plan)
+    template = _template(
+        plan.include_coolant,
+        bool(machine_label),
+        bool(compact),
+        len(spindle),
+        len(plan.feed_table),
+        schedule is not None,
+    )
+    return template.fill(_slot_values(plan, program_name, machine_label, spindle, schedule))
+
+
+# Literal axis or dwell value. Fanuc reads an address without a decimal point
+# in least input increments (X381 is 0.381 mm, G04 X60 is 60 ms), so whole
+# numbers keep their point.
+def _format_literal(value: float) -> str:
+    text = _format_number(value)
+    return text if "." in text else text + "."
+
+
+# (rpm, dwell) of each spindle step, one at a time: the table, or the speeds the
+# linear loop computes with FIX[] (max(2, steps) from start_rpm)
+def _iter_spindle_steps(plan: WarmupPlan, table: Sequence[Tuple[float, int]]) -> Iterator[Tuple[int, int]]:
+    if table:
+        for rpm, dwell in table:
+            yield int(rpm), max(0, int(dwell))
+        return
+    # Same arithmetic as the loop, on the values as formatted into #200/#201
+    start = float(_format_number(plan.spindle.start_rpm))
+    finish = float(_format_number(plan.spindle.finish_rpm))
+    steps = max(2, plan.spindle.steps)
+    delta = (finish - start) / (steps - 1)
+    for k in range(steps):
+        yield int((start + delta * k) // 1), plan.spindle.dwell
+
+
+# Yield the blocks of the unrolled program: every pass and spindle step as
+# literal blocks, no macro variables or loops.
+def _iter_unrolled_blocks(plan: WarmupPlan, program_name: str, machine_label: str | None) -> Iterator[str]:
+    spindle, schedule = _spindle_layout(plan)
+    v = _slot_values(plan, program_name, machine_label, spindle, schedule)
+    # Positions as the macro program computes them from its #100-#107 values
+    n = {name: float(_format_number(v[name])) for name, fmt in _SLOT_FORMATS.items() if fmt is _format_number}
+    width = n["x_max_safe"] - n["x_min_safe"]
+    height = n["y_max_safe"] - n["y_min_safe"]
+    center_x = _format_literal((n["x_min_safe"] + n["x_max_safe"]) / 2.0)
+    center_y = _format_literal((n["y_min_safe"] + n["y_max_safe"]) / 2.0)
+    stroke = abs(n["z_top_safe"] - n["z_bottom_safe"])
+    z_home = _format_literal(n["z_home"])
+    pass_rpm = [str(int(rpm)) for rpm in schedule.pass_rpm] if schedule is not None else []
+
+    yield "%"
+    yield "O0001 (" + str(v["program_name"]) + ")"
+    if machine_label:
+        yield "(FANUC 31I • UNITS: MM • " + str(v["machine_label"]) + ")"
+    else:
+        yield "(FANUC 31I • UNITS: MM)"
+    yield "(UNROLLED: NO MACRO VARIABLES OR LOOPS)"
+    yield ""
+
+    yield "(===== SAFE START =====)"
+    yield "G21 G17 G90 G94 G40 G49 G80"
+    yield "M05"
+    yield "M09"
+    if plan.include_coolant:
+        yield "M08                  (optional coolant)"
+    yield ""
 
+    yield "(----- Establish safe machine positions -----)"
+    yield f"G90 G53 G00 Z{z_home}            (park at Z home)"
+    yield ""
+    yield f"G90 G53 G00 Z{_format_literal(n['z_top_safe'])}            (down to top-safe Z)"
+    yield f"G90 G53 G00 X{center_x} Y{center_y}      (move to XY center)"
+    yield ""
 
+    feeds = [_format_number(feed) for feed in plan.feeds]
+    down, up = _format_literal(-stroke), _format_literal(stroke)
+    yield "(============ Z WARMUP ============)"
+    yield "G91                          (incremental moves around the safe center)"
+    if pass_rpm:
+        yield f"S{pass_rpm[0]} M03                    (spindle on for the axis passes)"
+    for k, feed in enumerate(feeds, 1):
+        yield f"(Z PASS {k} F{feed})"
+        if pass_rpm and k > 1:
+            yield f"S{pass_rpm[k - 1]}"
+        yield f"G01 Z{down} F{feed}"
+        yield f"G01 Z{up} F{feed}"
+    yield ""
+
+    corner = f"X{_format_literal(-width / 2.0)} Y{_format_literal(-height / 2.0)}"
+    across = f"X{_format_literal(width)} Y{_format_literal(height)}"
+    back = f"X{_format_literal(-width)} Y{_format_literal(-height)}"
+    yield "(============ XY WARMUP ============)"
+    for k, feed in enumerate(feeds, 1):
+        yield f"(XY PASS {k} F{feed})"
+        if pass_rpm:
+            yield f"S{pass_rpm[3 + k]}"
+        yield f"G01 {corner} F{feed}"
+        yield f"G01 {across} F{feed}"
+        yield f"G01 {back} F{feed}"
+        yield f"G01 {across} F{feed}"
+        yield f"G01 {corner} F{feed}"
+    yield ""
+
+    yield "(============ SPINDLE WARMUP ============)"
+    covered = schedule is not None and not spindle
+    if covered:
+        yield "(DWELL COVERED BY THE AXIS PASSES)"
+    yield "G90"
+    for k, (rpm, dwell) in enumerate(() if covered else _iter_spindle_steps(plan, spindle)):
+        yield f"S{rpm} M03" if k == 0 else f"S{rpm}"
+        yield f"G04 X{_format_literal(dwell)}"
+    yield "M05"
+    if plan.include_coolant:
+        yield "M09"
+    yield ""
+
+    yield "(============ PARK ============)"
+    yield f"G90 G53 G00 Z{z_home}"
+    yield "M30"
+    yield "%"
+
+
+# Yield the blocks of a plan as an unrolled program (--unrolled), for controls
+# without Custom Macro B. Blocks are produced one at a time, so a ramp of any
+# length is streamed in constant memory.
+def iter_unrolled(
+    plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False
+) -> Iterator[str]:
+    blocks = _iter_unrolled_blocks(plan, program_name, machine_label)
+    return _compact_blocks(blocks) if compact else blocks
+
+
+# Yield the program blocks in order.
+def iter_program(
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> Iterator[str]:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    return iter_plan(plan, program_name, machine_label, compact)
+
+
+# Stream the program to a text file object; returns the number of characters written.
+def write_program(
+    fp: IO[str],
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> int:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    written = 0
+    for block in iter_plan(plan, program_name, machine_label, compact):
+        written += fp.write(block + "\n")
+    return written
+
+
+# Generate the warmup program text from the precompiled template.
+def generate_program(
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> str:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    return render_plan(plan, program_name, machine_label, compact)
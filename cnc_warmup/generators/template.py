@@ -0,0 +1,40 @@
+from typing import Callable, Dict, Iterable, List, Mapping, Tuple
+
+"""
+
+Precompiled program templates.
+
+A generator's block function is run once with marker strings in place of every
+parameter-dependent value. The resulting text is split into static segments and
+typed slots, so producing a program for new parameters is a single fill-and-join
+instead of rebuilding every block.
+
+"""
+
+_MARK = "\x00"
+
+
+class ProgramTemplate:
+    def __init__(self, parts: List[str], slots: List[Tuple[int, str, Callable[[object], str]]]) -> None:
+        self.parts = parts  # static text, with placeholders at slot positions
+        self.slots = slots  # (index into parts, slot name, formatter)
+
+    # Fill every slot from raw values and return the program text.
+    def fill(self, values: Mapping[str, object]) -> str:
+        pieces = self.parts[:]
+        for idx, name, fmt in self.slots:
+            pieces[idx] = fmt(values[name])
+        return "".join(pieces)
+
+
+# Marker value for a slot; contains no whitespace, parentheses or semicolons
+def slot_marker(name: str) -> str:
+    return f"{_MARK}{name}{_MARK}"
+
+
+# Build a template from blocks rendered with slot_marker() values.
+def compile_template(blocks: Iterable[str], formats: Dict[str, Callable[[object], str]]) -> ProgramTemplate:
+    text = "".join(block + "\n" for block in blocks)
+    parts = text.split(_MARK)
+    slots = [(idx, parts[idx], formats[parts[idx]]) for idx in range(1, len(parts), 2)]
+    return ProgramTemplate(parts, slots)
@@ -1,4 +1,8 @@
-from typing import List
+from functools import lru_cache
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Mapping, Sequence, Tuple
+
+from ..plan import WarmupPlan, build_plan
+from .template import ProgramTemplate, compile_template, slot_marker
 
 """
 
@@ -9,6 +13,16 @@ axes and performs a spindle warmup with incremental steps and dwell times.
 
 Notes:
 Warmup is done from the machine datum point, which is assumed to be in the corner of the machine.
+The program is rendered from a WarmupPlan (cnc_warmup.plan); generate_program
+and friends build the plan from their arguments.
+With spindle_ramp/feed_ramp (see cnc_warmup.ramps) the per-step RPM, dwell and
+feed values are stored in Q301.., Q401.. and Q361.. and the spindle steps are
+unrolled into TOOL CALL / DWELL blocks instead of the LBL 2 loop.
+With overlap (see cnc_warmup.schedule) the spindle is started before the Z
+passes at the speeds in Q371-Q378, and only the dwell the axis passes do not
+cover is run afterwards, as a ramp table.
+iter_unrolled writes the same warmup as plain L / TOOL CALL / DWELL blocks,
+without Q parameters, labels or FN jumps.
 
 """
 
@@ -19,120 +33,502 @@ def _format_number(value: float) -> str:
     s = f"{value:.6f}".rstrip("0").rstrip(".")
     return s if s else "0"
 
-# Generate the warmup program text.
-def generate_program(
+# Format a Q-variable value right-aligned in its column
+def _q_value(value: object) -> str:
+    return f"{_format_number(value):>6}"
+
+
+# Raw values for every parameter-dependent slot in the program. spindle is the
+# spindle table actually emitted (the plan's, or the overlap residual).
+def _slot_values(
+    plan: WarmupPlan,
     program_name: str,
-    x_travel: float,
-    y_travel: float,
-    z_travel: float,
-    start_feed_mm_min: float,
-    finish_feed_mm_min: float,
-    steps: int,
-    start_rpm: float,
-    finish_rpm: float,
-    seconds_per_step: int,
-    include_coolant: bool = True,
-    machine_label: str | None = None,
-) -> str:
+    machine_label: str | None,
+    spindle: Sequence[Tuple[float, int]],
+    schedule: Any = None,
+) -> Dict[str, object]:
+    values: Dict[str, object] = {
+        "program_name": program_name,
+        "machine_label": machine_label or "",
+        "x_max_safe": plan.x_travel,
+        "y_max_safe": plan.y_travel,
+        "z_bottom_safe": -plan.z_travel,
+        "start_feed": plan.start_feed,
+        "finish_feed": plan.finish_feed,
+        "start_rpm": plan.spindle.start_rpm,
+        "finish_rpm": plan.spindle.finish_rpm,
+        "rpm_steps": max(1, plan.spindle.steps),
+        "dwell": plan.spindle.dwell,
+    }
+    for k, (rpm, dwell) in enumerate(spindle, 1):
+        values[f"ramp_rpm_{k}"] = int(rpm)
+        values[f"ramp_dwell_{k}"] = max(0, int(dwell))
+    for k, feed in enumerate(plan.feed_table, 1):
+        values[f"feed_{k}"] = feed
+    if schedule is not None:
+        values["overlap_summary"] = schedule.summary()
+        for k, label in enumerate(schedule.pass_labels, 1):
+            values[f"overlap_rpm_{k}"] = schedule.pass_rpm[k - 1]
+            values[f"overlap_pass_{k}"] = (
+                f"{label} RPM (F{_format_number(round(schedule.pass_feeds[k - 1], 3))}, "
+                f"{schedule.pass_seconds[k - 1]:.0f} s)"
+            )
+    return values
 
-    # Format a single Q-variable definition line with an inline comment.
-    def q_line(q: int, value: float, comment: str) -> str:
-        val = _format_number(value)
-        return f"Q{q} = {val:>6}    ; {comment}"
 
-    clamped_steps = max(1, int(steps))
-    clamped_dwell = max(0, int(seconds_per_step))
+# Spindle table to emit and overlap schedule (None without overlap) for a plan
+def _spindle_layout(plan: WarmupPlan) -> Tuple[Sequence[Tuple[float, int]], Any]:
+    if not plan.overlap:
+        return plan.spindle.table, None
+    from ..schedule import overlap_schedule
 
-    lines: List[str] = []
-    lines.append(f"BEGIN PGM {program_name} MM")
-    if machine_label:
-        lines.append(f"; MACHINE: {machine_label}")
+    schedule = overlap_schedule("tnc640", plan.params())
+    return schedule.residual, schedule
+
+
+# Slot name -> formatter applied when filling the template, for a program with
+# ramp_steps spindle and feed_steps feed table entries and, with overlap, the
+# per-pass spindle speeds
+@lru_cache(maxsize=None)
+def _slot_formats(
+    compact: bool, ramp_steps: int = 0, feed_steps: int = 0, overlap: bool = False
+) -> Dict[str, Callable[[object], str]]:
+    number = _format_number if compact else _q_value
+    names = [
+        "x_max_safe", "y_max_safe", "z_bottom_safe", "start_feed", "finish_feed",
+        "start_rpm", "finish_rpm", "rpm_steps", "dwell",
+    ]
+    for k in range(1, ramp_steps + 1):
+        names += [f"ramp_rpm_{k}", f"ramp_dwell_{k}"]
+    names += [f"feed_{k}" for k in range(1, feed_steps + 1)]
+    formats = {"program_name": str, "machine_label": str, **{name: number for name in names}}
+    if overlap:
+        formats["overlap_summary"] = str
+        for k in range(1, 9):
+            formats[f"overlap_rpm_{k}"] = number
+            formats[f"overlap_pass_{k}"] = str
+    return formats
+
+
+
+# Yield the unnumbered program blocks with already formatted slot values.
+# ramp_steps/feed_steps > 0 select the table-driven spindle/feed ramps; with
+# overlap the spindle runs during the axis passes and ramp_steps is the residual.
+def _iter_blocks(
+    v: Mapping[str, str],
+    include_coolant: bool,
+    labeled: bool,
+    ramp_steps: int = 0,
+    feed_steps: int = 0,
+    overlap: bool = False,
+) -> Iterator[str]:
+
+    # Format a single Q-variable definition line with an inline comment.
+    def q_line(q: int, value: str, comment: str) -> str:
+        return f"Q{q} = {value}    ; {comment}"
+
+    yield f"BEGIN PGM {v['program_name']} MM"
+    if labeled:
+        yield f"; MACHINE: {v['machine_label']}"
 
     # Config
-    lines.append("; ===== Config =====")
-    lines.append(q_line(1, 0, "X_MIN_SAFE (mm)"))
-    lines.append(q_line(2, x_travel, "X_MAX_SAFE"))
-    lines.append(q_line(3, 0, "Y_MIN_SAFE"))
-    lines.append(q_line(4, y_travel, "Y_MAX_SAFE"))
-    lines.append(q_line(5, 0, "Z_TOP_SAFE"))
-    lines.append(q_line(6, -z_travel, "Z_BOTTOM_SAFE"))
-    lines.append("")
-    lines.append(q_line(10, start_feed_mm_min, "FEED_START (mm/min)"))
-    lines.append(q_line(11, finish_feed_mm_min, "FEED_FIN"))   
-    lines.append("")
-    lines.append(q_line(20, start_rpm, "RPM_START"))
-    lines.append(q_line(21, finish_rpm, "RPM_FIN"))
-    lines.append(q_line(22, clamped_steps, "RPM_STEPS"))
-    lines.append(q_line(23, clamped_dwell, "DWELL PER STEP (s)"))
-    lines.append("")
+    yield "; ===== Config ====="
+    yield q_line(1, _q_value(0), "X_MIN_SAFE (mm)")
+    yield q_line(2, v["x_max_safe"], "X_MAX_SAFE")
+    yield q_line(3, _q_value(0), "Y_MIN_SAFE")
+    yield q_line(4, v["y_max_safe"], "Y_MAX_SAFE")
+    yield q_line(5, _q_value(0), "Z_TOP_SAFE")
+    yield q_line(6, v["z_bottom_safe"], "Z_BOTTOM_SAFE")
+    yield ""
+    yield q_line(10, v["start_feed"], "FEED_START (mm/min)")
+    yield q_line(11, v["finish_feed"], "FEED_FIN")
+    for k in range(1, feed_steps + 1):
+        yield q_line(360 + k, v[f"feed_{k}"], f"FEED STEP {k}")
+    yield ""
+    if overlap:
+        yield "; Spindle during axis passes: " + v["overlap_summary"]
+        for k in range(1, 9):
+            yield q_line(370 + k, v[f"overlap_rpm_{k}"], v[f"overlap_pass_{k}"])
+        yield ""
+    if ramp_steps:
+        for k in range(1, ramp_steps + 1):
+            yield q_line(300 + k, v[f"ramp_rpm_{k}"], f"STEP {k} RPM")
+            yield q_line(400 + k, v[f"ramp_dwell_{k}"], f"STEP {k} DWELL (s)")
+    elif not overlap:
+        yield q_line(20, v["start_rpm"], "RPM_START")
+        yield q_line(21, v["finish_rpm"], "RPM_FIN")
+        yield q_line(22, v["rpm_steps"], "RPM_STEPS")
+        yield q_line(23, v["dwell"], "DWELL PER STEP (s)")
+    yield ""
 
     # Safe start
-    lines.append("; ===== Safe start =====")
-    lines.append("M5 M9")
-    lines.append("PLANE RESET")
-    lines.append("TRANS DATUM RESET")
-    lines.append("FUNCTION RESET TCPM")
-    lines.append("TOOL CALL 0 Z")
+    yield "; ===== Safe start ====="
+    yield "M5 M9"
+    yield "PLANE RESET"
+    yield "TRANS DATUM RESET"
+    yield "FUNCTION RESET TCPM"
+    yield "TOOL CALL 0 Z"
     if include_coolant:
-        lines.append("M8")
+        yield "M8"
 
     # Compute the feed and RPM increments
-    lines.append("Q80 = +Q11 - Q10        ; FEED_RANGE")
-    lines.append("Q81 = Q80/3             ; FEED_INC")
-    lines.append("Q83 = (Q21 - Q20)/Q22   ; RPM_INC")
-    lines.append("")
+    if not feed_steps:
+        yield "Q80 = +Q11 - Q10        ; FEED_RANGE"
+        yield "Q81 = Q80/3             ; FEED_INC"
+    if not (ramp_steps or overlap):
+        yield "Q83 = (Q21 - Q20)/Q22   ; RPM_INC"
+    yield ""
+
+    # Feed for each of the four axis passes
+    if feed_steps:
+        feeds = ["Q361", "Q362", "Q363", "Q364"]
+    else:
+        feeds = ["Q10", "Q10 + Q81", "Q10 + Q81*2", "Q11"]
+
+    # Spindle speed before each of the eight axis passes (overlap only)
+    def spindle(k: int) -> Iterator[str]:
+        if overlap:
+            yield f"TOOL CALL 0 Z SQ{370 + k}"
+            if k == 1:
+                yield "L  M3                    ; spindle on for the axis passes"
 
     # Move to safe Z
-    lines.append("L  Z+Q5 FMAX M91  ; to safe Z")
+    yield "L  Z+Q5 FMAX M91  ; to safe Z"
 
     # Z axis test: Z top -> Z bottom -> Z top with feeds from start -> finish
-    lines.append("; ===== Z axis test: top -> bottom -> top with increasing feed from start to finish =====")
-    lines.append("Q100 = Q10")
-    lines.append("L  Z+Q6 FQ100 M91        ; to Z bottom at start feed")
-    lines.append("Q100 = Q10 + Q81")
-    lines.append("L  Z+Q5 FQ100 M91        ; back to Z top at start+1/3 range")
-    lines.append("Q100 = Q10 + Q81*2")
-    lines.append("L  Z+Q6 FQ100 M91        ; to Z bottom at start+2/3 range")
-    lines.append("Q100 = Q11")
-    lines.append("L  Z+Q5 FQ100 M91        ; back to Z top at finish feed")
-    lines.append("")
+    yield "; ===== Z axis test: top -> bottom -> top with increasing feed from start to finish ====="
+    yield f"Q100 = {feeds[0]}"
+    yield from spindle(1)
+    yield "L  Z+Q6 FQ100 M91        ; to Z bottom at start feed"
+    yield f"Q100 = {feeds[1]}"
+    yield from spindle(2)
+    yield "L  Z+Q5 FQ100 M91        ; back to Z top at start+1/3 range"
+    yield f"Q100 = {feeds[2]}"
+    yield from spindle(3)
+    yield "L  Z+Q6 FQ100 M91        ; to Z bottom at start+2/3 range"
+    yield f"Q100 = {feeds[3]}"
+    yield from spindle(4)
+    yield "L  Z+Q5 FQ100 M91        ; back to Z top at finish feed"
+    yield ""
 
     # XY axis test: min -> max -> min with feeds from start -> finish
-    lines.append("; ===== XY axis test: min -> max -> min with increasing feed from start to finish =====")
-    lines.append("L  Z+Q5 FMAX M91         ; ensure safe Z for XY motion")
-    lines.append("L  X+Q1  Y+Q3 FQ10 M91   ; go to min corner (0,0) with start feed")
-    lines.append("Q100 = Q10")
-    lines.append("L  X+Q2  Y+Q4 FQ100 M91  ; to max corner at start feed")
-    lines.append("Q100 = Q10 + Q81")
-    lines.append("L  X+Q1  Y+Q3 FQ100 M91  ; back to min corner at start+1/3 range")
-    lines.append("Q100 = Q10 + Q81*2")
-    lines.append("L  X+Q2  Y+Q4 FQ100 M91  ; to max corner at start+2/3 range")
-    lines.append("Q100 = Q11")
-    lines.append("L  X+Q1  Y+Q3 FQ100 M91  ; back to min corner at finish feed")
-    lines.append("")
+    yield "; ===== XY axis test: min -> max -> min with increasing feed from start to finish ====="
+    yield "L  Z+Q5 FMAX M91         ; ensure safe Z for XY motion"
+    yield "L  X+Q1  Y+Q3 FQ10 M91   ; go to min corner (0,0) with start feed"
+    yield f"Q100 = {feeds[0]}"
+    yield from spindle(5)
+    yield "L  X+Q2  Y+Q4 FQ100 M91  ; to max corner at start feed"
+    yield f"Q100 = {feeds[1]}"
+    yield from spindle(6)
+    yield "L  X+Q1  Y+Q3 FQ100 M91  ; back to min corner at start+1/3 range"
+    yield f"Q100 = {feeds[2]}"
+    yield from spindle(7)
+    yield "L  X+Q2  Y+Q4 FQ100 M91  ; to max corner at start+2/3 range"
+    yield f"Q100 = {feeds[3]}"
+    yield from spindle(8)
+    yield "L  X+Q1  Y+Q3 FQ100 M91  ; back to min corner at finish feed"
+    yield ""
 
     # Spindle warmup
-    lines.append("; ===== Spindle warmup =====")
-    lines.append("TOOL CALL 0 Z SQ20")  # Set spindle speed
-    lines.append("L  M3")  # Start spindle
-    lines.append("Q90 = 1")  # Step counter
-    lines.append("LBL 2")  # Spindle warmup loop
-    lines.append("  Q20 = Q20 + Q83")  # Increment spindle speed (rpm)
-    lines.append("  TOOL CALL 0 Z SQ20")  # Set spindle speed
-    lines.append("  FUNCTION DWELL TIME+Q23")  # Dwell (seconds)
-    lines.append("  Q90 = Q90 + 1")  # Increment step counter
-    lines.append("  FN 12: IF +Q90 LT +Q22 GOTO LBL 2")  # Loop while below step count
-    lines.append("  FN 9: IF +Q90 EQU +Q22 GOTO LBL 2")  # End of loop
-    lines.append("LBL 0")  # End of spindle warmup loop
-    lines.append("")
-    lines.append("M5 M9")
-    lines.append(f"END PGM {program_name} MM")
-
-    # Block numbering
-    numbered_lines = [
-        (f"{idx}  {text}" if idx < 10 else f"{idx} {text}")
-        for idx, text in enumerate(lines)
-    ]
-    return "\n".join(numbered_lines) + "\n"
+    yield "; ===== Spindle warmup ====="
+    if ramp_steps or overlap:
+        # Unrolled: Q parameters cannot be indexed by the step counter
+        for k in range(1, ramp_steps + 1):
+            yield f"TOOL CALL 0 Z SQ{300 + k}"
+            if k == 1:
+                yield "L  M3"
+            yield f"FUNCTION DWELL TIME+Q{400 + k}"
+        yield ""
+        yield "M5 M9"
+        yield f"END PGM {v['program_name']} MM"
+        return
+    yield "TOOL CALL 0 Z SQ20"  # Set spindle speed
+    yield "L  M3"  # Start spindle
+    yield "Q90 = 1"  # Step counter
+    yield "LBL 2"  # Spindle warmup loop
+    yield "  Q20 = Q20 + Q83"  # Increment spindle speed (rpm)
+    yield "  TOOL CALL 0 Z SQ20"  # Set spindle speed
+    yield "  FUNCTION DWELL TIME+Q23"  # Dwell (seconds)
+    yield "  Q90 = Q90 + 1"  # Increment step counter
+    yield "  FN 12: IF +Q90 LT +Q22 GOTO LBL 2"  # Loop while below step count
+    yield "  FN 9: IF +Q90 EQU +Q22 GOTO LBL 2"  # End of loop
+    yield "LBL 0"  # End of spindle warmup loop
+    yield ""
+    yield "M5 M9"
+    yield f"END PGM {v['program_name']} MM"
+
+
+# Apply block numbers to a block sequence.
+def _number_blocks(blocks: Iterable[str]) -> Iterator[str]:
+    for idx, text in enumerate(blocks):
+        yield f"{idx}  {text}" if idx < 10 else f"{idx} {text}"
+
+
+# Compact output: drop comments and blank blocks, collapse whitespace.
+# Numbering is applied afterwards, so it stays contiguous.
+def _compact_blocks(blocks: Iterable[str]) -> Iterator[str]:
+    idx = 0
+    for block in blocks:
+        text = " ".join(block.split(";", 1)[0].split())
+        if text:
+            yield f"{idx} {text}"
+            idx += 1
+
+
+# Number the blocks, compacting them first if requested.
+def _finish_blocks(blocks: Iterable[str], compact: bool) -> Iterator[str]:
+    return _compact_blocks(blocks) if compact else _number_blocks(blocks)
+
+
+# Compile the numbered program once per block-structure variant.
+@lru_cache(maxsize=None)
+def _template(
+    include_coolant: bool,
+    labeled: bool,
+    compact: bool,
+    ramp_steps: int = 0,
+    feed_steps: int = 0,
+    overlap: bool = False,
+) -> ProgramTemplate:
+    formats = _slot_formats(compact, ramp_steps, feed_steps, overlap)
+    markers = {name: slot_marker(name) for name in formats}
+    blocks = _iter_blocks(markers, include_coolant, labeled, ramp_steps, feed_steps, overlap)
+    return compile_template(_finish_blocks(blocks, compact), formats)
 
 
+# Yield the numbered program blocks of a plan.
+def iter_plan(
+    plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False
+) -> Iterator[str]:
+    spindle, schedule = _spindle_layout(plan)
+    values = _slot_values(plan, program_name, machine_label, spindle, schedule)
+    overlap = schedule is not None
+    formats = _slot_formats(bool(compact), len(spindle), len(plan.feed_table), overlap)
+    formatted = {name: formats[name](value) for name, value in values.items()}
+    blocks = _iter_blocks(
+        formatted, plan.include_coolant, bool(machine_label), len(spindle), len(plan.feed_table), overlap
+    )
+    return _finish_blocks(blocks, bool(compact))
+
+
+# Render a plan from the precompiled template.
+def render_plan(plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False) -> str:
+    spindle, schedule = _spindle_layout(plan)
+    template = _template(
+        plan.include_coolant,
+        bool(machine_label),
+        bool(compact),
+        len(spindle),
+        len(plan.feed_table),
+        schedule is not None,
+    )
+    return template.fill(_slot_values(plan, program_name, machine_label, spindle, schedule))
+
+
+# Literal coordinate with its sign, as the TNC writes it (X+762, Z-500)
+def _format_literal(value: float) -> str:
+    text = _format_number(value)
+    return text if text.startswith("-") else "+" + text
+
+
+# (rpm, dwell) of each spindle step, one at a time: the table, or the speeds the
+# LBL 2 loop reaches (max(1, steps) increments above start_rpm)
+def _iter_spindle_steps(plan: WarmupPlan, table: Sequence[Tuple[float, int]]) -> Iterator[Tuple[str, int]]:
+    if table:
+        for rpm, dwell in table:
+            yield str(int(rpm)), max(0, int(dwell))
+        return
+    # Same arithmetic as the loop, on the values as formatted into Q20/Q21
+    start = float(_format_number(plan.spindle.start_rpm))
+    finish = float(_format_number(plan.spindle.finish_rpm))
+    steps = max(1, plan.spindle.steps)
+    delta = (finish - start) / steps
+    for k in range(1, steps + 1):
+        yield _format_number(start + delta * k), plan.spindle.dwell
+
+
+# Yield the blocks of the unrolled program: every pass and spindle step as
+# literal blocks, no Q parameters, labels or jumps.
+def _iter_unrolled_blocks(plan: WarmupPlan, program_name: str, machine_label: str | None) -> Iterator[str]:
+    spindle, schedule = _spindle_layout(plan)
+    x_max = _format_literal(float(_format_number(plan.x_travel)))
+    y_max = _format_literal(float(_format_number(plan.y_travel)))
+    z_bottom = _format_literal(float(_format_number(-plan.z_travel)))
+    feeds = [_format_number(feed) for feed in plan.feeds]
+
+    # Spindle speed before each of the eight axis passes (overlap only)
+    def pass_spindle(k: int) -> Iterator[str]:
+        if schedule is not None:
+            yield f"TOOL CALL 0 Z S{_format_number(schedule.pass_rpm[k - 1])}"
+            if k == 1:
+                yield "L  M3                    ; spindle on for the axis passes"
+
+    yield f"BEGIN PGM {program_name} MM"
+    if machine_label:
+        yield f"; MACHINE: {machine_label}"
+    yield "; Unrolled: no Q parameters, labels or jumps"
+    yield ""
+
+    yield "; ===== Safe start ====="
+    yield "M5 M9"
+    yield "PLANE RESET"
+    yield "TRANS DATUM RESET"
+    yield "FUNCTION RESET TCPM"
+    yield "TOOL CALL 0 Z"
+    if plan.include_coolant:
+        yield "M8"
+    yield ""
+    yield "L  Z+0 FMAX M91  ; to safe Z"
+
+    yield "; ===== Z axis test: top -> bottom -> top with increasing feed from start to finish ====="
+    for k, (z, feed) in enumerate(zip((z_bottom, "+0", z_bottom, "+0"), feeds), 1):
+        yield from pass_spindle(k)
+        yield f"L  Z{z} F{feed} M91"
+    yield ""
+
+    yield "; ===== XY axis test: min -> max -> min with increasing feed from start to finish ====="
+    yield "L  Z+0 FMAX M91         ; ensure safe Z for XY motion"
+    yield f"L  X+0  Y+0 F{_format_number(plan.start_feed)} M91   ; go to min corner (0,0) with start feed"
+    corners = (f"X{x_max}  Y{y_max}", "X+0  Y+0")
+    for k, feed in enumerate(feeds, 1):
+        yield from pass_spindle(4 + k)
+        yield f"L  {corners[(k - 1) % 2]} F{feed} M91"
+    yield ""
+
+    yield "; ===== Spindle warmup ====="
+    if schedule is None and not spindle:
+        yield f"TOOL CALL 0 Z S{_format_number(plan.spindle.start_rpm)}"
+        yield "L  M3"
+    if schedule is None or spindle:
+        for k, (rpm, dwell) in enumerate(_iter_spindle_steps(plan, spindle)):
+            yield f"TOOL CALL 0 Z S{rpm}"
+            if k == 0 and spindle:
+                yield "L  M3"
+            yield f"FUNCTION DWELL TIME{dwell}"
+    yield ""
+    yield "M5 M9"
+    yield f"END PGM {program_name} MM"
+
+
+# Yield the numbered blocks of a plan as an unrolled program (--unrolled), for
+# workflows that want plain L blocks. Blocks are produced one at a time, so a
+# ramp of any length is streamed in constant memory.
+def iter_unrolled(
+    plan: WarmupPlan, program_name: str, machine_label: str | None = None, compact: bool = False
+) -> Iterator[str]:
+    return _finish_blocks(_iter_unrolled_blocks(plan, program_name, machine_label), bool(compact))
+
+
+# Yield the program blocks with block numbers applied on the fly.
+def iter_program(
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> Iterator[str]:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    return iter_plan(plan, program_name, machine_label, compact)
+
+
+# Stream the program to a text file object; returns the number of characters written.
+def write_program(
+    fp: IO[str],
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> int:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    written = 0
+    for block in iter_plan(plan, program_name, machine_label, compact):
+        written += fp.write(block + "\n")
+    return written
+
+
+# Generate the warmup program text from the precompiled template.
+def generate_program(
+    program_name: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    machine_label: str | None = None,
+    compact: bool = False,
+    spindle_ramp: Sequence[Tuple[float, float]] | None = None,
+    feed_ramp: Sequence[float] | None = None,
+    overlap: bool = False,
+) -> str:
+    plan = build_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        steps,
+        start_rpm,
+        finish_rpm,
+        seconds_per_step,
+        include_coolant,
+        spindle_ramp,
+        feed_ramp,
+        overlap,
+    )
+    return render_plan(plan, program_name, machine_label, compact)
@@ -1,9 +1,39 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from dataclasses import dataclass
-from .config_loader import load_config, get_machines, get_defaults
-
-"""Tkinter GUI to collect warmup configuration from the user."""
+from typing import Any, Dict, List, Optional, Tuple
+from .config_loader import load_config, get_machine_index, get_defaults
+from .estimate import format_duration
+from .gui_preview import PreviewResult, PreviewWorker, preview_key
+from .preset_index import GROUP_FIELDS, PresetIndex
+
+"""Tkinter GUI to collect warmup configuration from the user.
+
+The preview pane regenerates the program as fields change: edits are
+debounced, rendering runs on a worker thread (cnc_warmup.gui_preview) and
+results are cached per parameter set.
+"""
+
+# Controller key (as used in presets and the config) -> GUI label
+CONTROLLER_LABELS = {"tnc640": "Heidenhain TNC 640", "fanuc31i": "Fanuc 31i"}
+CONTROLLER_KEYS = {label: key for key, label in CONTROLLER_LABELS.items()}
+
+# Preset list rows inserted per idle callback, so the window opens at once
+PRESET_CHUNK = 500
+# Delay before refiltering after a keystroke (ms)
+PRESET_FILTER_DELAY_MS = 120
+# Delay before regenerating the preview after an edit (ms)
+PREVIEW_DELAY_MS = 250
+# How often to collect finished previews from the worker (ms)
+PREVIEW_POLL_MS = 25
+# Preview highlight tag -> color. Later tags take priority.
+PREVIEW_COLORS = {
+    "number": "gray50",
+    "code": "#1f4fb0",
+    "variable": "#8a3ca8",
+    "keyword": "#b05a00",
+    "comment": "#2e7d32",
+}
 
 
 # Dataclass for the warmup config
@@ -22,6 +52,7 @@ class WarmupConfig:
     start_feed: float
     finish_feed: float
     coolant: bool
+    program_text: str = ""  # the previewed program, when it matches these settings
 
 # GUI for the warmup config
 class WarmupConfigGUI:
@@ -29,20 +60,20 @@ class WarmupConfigGUI:
         self.root = tk.Tk()
         self.root.title("CNC Warmup Program - Config")
         self.result: WarmupConfig | None = None
-        self.root.geometry("420x360")
-        self.root.resizable(False, False)
+        self.root.geometry("1020x560")
+        self.root.minsize(760, 520)
 
         # Load config
-        cfg = load_config()
-        machines = get_machines(cfg)
+        cfg = load_config(disk_cache=True)
+        machines = get_machine_index(cfg)
         defaults = get_defaults(cfg)
 
         # Main frame
         main = ttk.Frame(self.root, padding=20)
         main.grid(row=0, column=0, sticky="nsew")
 
-        # Configure the root window
-        self.root.columnconfigure(0, weight=1)
+        # Configure the root window: the preview pane takes the extra space
+        self.root.columnconfigure(1, weight=1)
         self.root.rowconfigure(0, weight=1)
 
         # Program settings
@@ -52,9 +83,9 @@ class WarmupConfigGUI:
 
         # Controller selection
         ttk.Label(main, text="Controller:").grid(row=1, column=0, sticky="w")
-        controllers = ["Heidenhain TNC 640", "Fanuc 31i"]
+        controllers = list(CONTROLLER_LABELS.values())
         default_controller_key = str(defaults.get("controller", "tnc640"))
-        default_controller_label = "Heidenhain TNC 640" if default_controller_key == "tnc640" else "Fanuc 31i"
+        default_controller_label = CONTROLLER_LABELS.get(default_controller_key, "Fanuc 31i")
         self.controller_var = tk.StringVar(value=default_controller_label)
         self.controller_combo = ttk.Combobox(main, textvariable=self.controller_var, values=controllers, state="readonly")
         self.controller_combo.grid(row=1, column=1, sticky="ew")
@@ -94,33 +125,63 @@ class WarmupConfigGUI:
 
         ttk.Separator(main, orient="horizontal").grid(row=10, column=0, columnspan=2, sticky="ew", pady=(10, 10))
 
-        # Machine Travel Limit Preset selection
+        # Machine Travel Limit Preset selection: type-ahead filter over a list that is
+        # filled in chunks, so large fleets do not delay the window
+        self._machines = machines
+        self._index = PresetIndex(machines)
+        first_name = self._index.names[0] if machines else "Custom"
+        self.machine_var = tk.StringVar(value=first_name)
+
         ttk.Label(main, text="Travel Limit Preset:").grid(row=11, column=0, sticky="w")
-        machine_names = (list(machines.keys()) + ["Custom"]) if machines else ["Custom"]
-        self.machine_var = tk.StringVar(value=machine_names[0])
-        self.machine_combo = ttk.Combobox(main, textvariable=self.machine_var, values=machine_names, state="readonly")
-        self.machine_combo.grid(row=11, column=1, sticky="ew")
+        self.preset_filter_var = tk.StringVar()
+        self.preset_filter_entry = ttk.Entry(main, textvariable=self.preset_filter_var)
+        self.preset_filter_entry.grid(row=11, column=1, sticky="ew")
+
+        ttk.Label(main, text="Group By:").grid(row=12, column=0, sticky="w")
+        self._group_choices = {"None": ""}
+        self._group_choices.update({label: key for key, label in GROUP_FIELDS.items()})
+        self.preset_group_var = tk.StringVar(value="None")
+        self.preset_group_combo = ttk.Combobox(
+            main, textvariable=self.preset_group_var, values=list(self._group_choices), state="readonly"
+        )
+        self.preset_group_combo.grid(row=12, column=1, sticky="ew")
+
+        list_frame = ttk.Frame(main)
+        list_frame.grid(row=13, column=1, sticky="ew")
+        list_frame.columnconfigure(0, weight=1)
+        self.preset_list = tk.Listbox(list_frame, height=6, exportselection=False, activestyle="none")
+        self.preset_list.grid(row=0, column=0, sticky="ew")
+        preset_scroll = ttk.Scrollbar(list_frame, orient="vertical", command=self.preset_list.yview)
+        preset_scroll.grid(row=0, column=1, sticky="ns")
+        self.preset_list.configure(yscrollcommand=preset_scroll.set)
+        self.preset_status_var = tk.StringVar()
+        ttk.Label(main, textvariable=self.preset_status_var).grid(row=14, column=1, sticky="w")
+
+        # Listbox row -> preset name ("Custom" included), None for group headings
+        self._preset_rows: List[Optional[str]] = []
+        self._preset_fill_job: Optional[str] = None
+        self._preset_filter_job: Optional[str] = None
 
         # Machine Travel Limit (manual inputs)
-        first_spec = machines.get(machine_names[0], {"x_travel": 300, "y_travel": 300, "z_travel": 300})
-        ttk.Label(main, text="X Travel Limit (mm):").grid(row=12, column=0, sticky="w")
-        self.x_travel_var = tk.StringVar(value=str(first_spec.get("x_travel", 300)))
+        first_spec = machines.get(first_name)
+        ttk.Label(main, text="X Travel Limit (mm):").grid(row=15, column=0, sticky="w")
+        self.x_travel_var = tk.StringVar(value=_format_travel(first_spec.x_travel if first_spec else 300))
         self.x_travel_entry = ttk.Entry(main, textvariable=self.x_travel_var)
-        self.x_travel_entry.grid(row=12, column=1, sticky="ew")
+        self.x_travel_entry.grid(row=15, column=1, sticky="ew")
 
-        ttk.Label(main, text="Y Travel Limit (mm):").grid(row=13, column=0, sticky="w")
-        self.y_travel_var = tk.StringVar(value=str(first_spec.get("y_travel", 300)))
+        ttk.Label(main, text="Y Travel Limit (mm):").grid(row=16, column=0, sticky="w")
+        self.y_travel_var = tk.StringVar(value=_format_travel(first_spec.y_travel if first_spec else 300))
         self.y_travel_entry = ttk.Entry(main, textvariable=self.y_travel_var)
-        self.y_travel_entry.grid(row=13, column=1, sticky="ew")
+        self.y_travel_entry.grid(row=16, column=1, sticky="ew")
 
-        ttk.Label(main, text="Z Travel Limit (mm):").grid(row=14, column=0, sticky="w")
-        self.z_travel_var = tk.StringVar(value=str(first_spec.get("z_travel", 300)))
+        ttk.Label(main, text="Z Travel Limit (mm):").grid(row=17, column=0, sticky="w")
+        self.z_travel_var = tk.StringVar(value=_format_travel(first_spec.z_travel if first_spec else 300))
         self.z_travel_entry = ttk.Entry(main, textvariable=self.z_travel_var)
-        self.z_travel_entry.grid(row=14, column=1, sticky="ew")
+        self.z_travel_entry.grid(row=17, column=1, sticky="ew")
 
         # OK/Cancel Buttons
         button_row = ttk.Frame(main)
-        button_row.grid(row=15, column=0, columnspan=2, sticky="e", pady=(8, 0))
+        button_row.grid(row=18, column=0, columnspan=2, sticky="e", pady=(8, 0))
 
         ttk.Button(button_row, text="Cancel", command=self.root.destroy).grid(row=0, column=0, padx=(0, 6))
         ttk.Button(button_row, text="OK", command=self._on_ok).grid(row=0, column=1)
@@ -129,47 +190,211 @@ class WarmupConfigGUI:
         for i in range(2):
             main.columnconfigure(i, weight=1)
 
-        # Bind preset selection to populate travel fields
-        self.machine_combo.bind("<<ComboboxSelected>>", self._on_preset_change)
-        self._machines = machines
+        # Bind preset selection to populate travel fields; typing refilters the list
+        self.preset_list.bind("<<ListboxSelect>>", self._on_preset_select)
+        self.preset_filter_var.trace_add("write", self._schedule_preset_filter)
+        self.preset_group_combo.bind("<<ComboboxSelected>>", lambda _event: self._refresh_presets())
+        self.preset_filter_entry.bind("<Return>", self._on_filter_return)
+        self.preset_filter_entry.bind("<Down>", lambda _event: self.preset_list.focus_set())
+        self._refresh_presets()
 
         # Initialize travel field enabled state based on selection (disable if not Custom)
         self._set_travel_entries_state(self.machine_var.get() == "Custom")
 
+        # Program preview
+        preview = ttk.Frame(self.root, padding=(0, 20, 20, 20))
+        preview.grid(row=0, column=1, sticky="nsew")
+        preview.columnconfigure(0, weight=1)
+        preview.rowconfigure(1, weight=1)
+        self.preview_status_var = tk.StringVar()
+        ttk.Label(preview, textvariable=self.preview_status_var).grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 6))
+        self.preview_text = tk.Text(preview, wrap="none", font="TkFixedFont", width=60, undo=False, state="disabled")
+        self.preview_text.grid(row=1, column=0, sticky="nsew")
+        preview_yscroll = ttk.Scrollbar(preview, orient="vertical", command=self.preview_text.yview)
+        preview_yscroll.grid(row=1, column=1, sticky="ns")
+        preview_xscroll = ttk.Scrollbar(preview, orient="horizontal", command=self.preview_text.xview)
+        preview_xscroll.grid(row=2, column=0, sticky="ew")
+        self.preview_text.configure(yscrollcommand=preview_yscroll.set, xscrollcommand=preview_xscroll.set)
+        for tag, color in PREVIEW_COLORS.items():
+            self.preview_text.tag_configure(tag, foreground=color)
+
+        # Any field change regenerates the preview (debounced)
+        self._preview = PreviewWorker()
+        self._preview_key: Optional[Tuple[Any, ...]] = None
+        self._preview_job: Optional[str] = None
+        self._preview_poll_job: Optional[str] = None
+        for var in (
+            self.program_name_var,
+            self.controller_var,
+            self.start_rpm_var,
+            self.finish_rpm_var,
+            self.start_feed_var,
+            self.finish_feed_var,
+            self.rpm_steps_var,
+            self.seconds_per_step_var,
+            self.coolant_var,
+            self.machine_var,
+            self.x_travel_var,
+            self.y_travel_var,
+            self.z_travel_var,
+        ):
+            var.trace_add("write", self._schedule_preview)
+        self._update_preview()
+
+    # Current field values; ValueError if a numeric field does not parse
+    def _read_config(self) -> WarmupConfig:
+        return WarmupConfig(
+            machine=self.machine_var.get(),
+            controller=self.controller_var.get(),
+            program_name=str(self.program_name_var.get()).strip() or "WARMUP",
+            rpm_steps=max(1, int(self.rpm_steps_var.get())),
+            seconds_per_step=max(0, int(self.seconds_per_step_var.get())),
+            x_travel=float(self.x_travel_var.get()),
+            y_travel=float(self.y_travel_var.get()),
+            z_travel=float(self.z_travel_var.get()),
+            start_rpm=float(self.start_rpm_var.get()),
+            finish_rpm=float(self.finish_rpm_var.get()),
+            start_feed=float(self.start_feed_var.get()),
+            finish_feed=float(self.finish_feed_var.get()),
+            coolant=self.coolant_var.get(),
+        )
+
     # On OK button click
     def _on_ok(self) -> None:
         try:
-            program_name = str(self.program_name_var.get()).strip() or "WARMUP"
-            rpm_steps = int(self.rpm_steps_var.get())
-            seconds_per_step = int(self.seconds_per_step_var.get())
-            start_rpm = float(self.start_rpm_var.get())
-            finish_rpm = float(self.finish_rpm_var.get())
-            start_feed = float(self.start_feed_var.get())
-            finish_feed = float(self.finish_feed_var.get())
-            x_travel = float(self.x_travel_var.get())
-            y_travel = float(self.y_travel_var.get())
-            z_travel = float(self.z_travel_var.get())
+            config = self._read_config()
         except ValueError:
             messagebox.showerror("Invalid input", "Please enter numeric values (e.g., 123 or 123.4) for RPM, feed rates, and travels.")
             return
 
-        self.result = WarmupConfig(
-            machine=self.machine_var.get(),
-            controller=self.controller_var.get(),
-            program_name=program_name,
-            rpm_steps=max(1, rpm_steps),
-            seconds_per_step=max(0, seconds_per_step),
-            x_travel=x_travel,
-            y_travel=y_travel,
-            z_travel=z_travel,
-            start_rpm=start_rpm,
-            finish_rpm=finish_rpm,
-            start_feed=start_feed,
-            finish_feed=finish_feed,
-            coolant=self.coolant_var.get(),
-        )
+        # Reuse the previewed program if it is up to date
+        cached = self._preview.cached(preview_key(*program_params(config)))
+        if cached is not None:
+            config.program_text = cached.text
+        self.result = config
         self.root.destroy()
 
+    # Debounce preview regeneration while the user is typing
+    def _schedule_preview(self, *_args: object) -> None:
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+        self._preview_job = self.root.after(PREVIEW_DELAY_MS, self._update_preview)
+
+    # Show the cached preview for the current fields, or start rendering it
+    def _update_preview(self) -> None:
+        self._preview_job = None
+        try:
+            controller, params = program_params(self._read_config())
+        except ValueError:
+            self.preview_status_var.set("Preview paused: enter numeric values for RPM, feed rates and travels")
+            return
+        self._preview_key = preview_key(controller, params)
+        result = self._preview.request(controller, params)
+        if result is not None:
+            self._show_preview(result)
+            return
+        self.preview_status_var.set("Generating preview...")
+        if self._preview_poll_job is None:
+            self._preview_poll_job = self.root.after(PREVIEW_POLL_MS, self._poll_preview)
+
+    # Collect finished renders; only the one for the current fields is shown
+    def _poll_preview(self) -> None:
+        self._preview_poll_job = None
+        for key, result in self._preview.poll():
+            if key != self._preview_key:
+                continue
+            if isinstance(result, Exception):
+                self.preview_status_var.set(f"Preview failed: {result}")
+            else:
+                self._show_preview(result)
+        if self._preview.busy:
+            self._preview_poll_job = self.root.after(PREVIEW_POLL_MS, self._poll_preview)
+
+    def _show_preview(self, result: PreviewResult) -> None:
+        top = self.preview_text.yview()[0]
+        self.preview_text.configure(state="normal")
+        self.preview_text.delete("1.0", "end")
+        self.preview_text.insert("1.0", result.text)
+        for tag, start, end in result.spans:
+            self.preview_text.tag_add(tag, start, end)
+        self.preview_text.configure(state="disabled")
+        self.preview_text.yview_moveto(top)
+        estimate = format_duration(result.estimate_seconds) if result.estimate_seconds is not None else "n/a"
+        self.preview_status_var.set(f"Estimated run time {estimate}  |  {result.size:,} bytes  |  {result.lines} lines")
+
+    # Debounce filtering while the user is typing
+    def _schedule_preset_filter(self, *_args: object) -> None:
+        if self._preset_filter_job is not None:
+            self.root.after_cancel(self._preset_filter_job)
+        self._preset_filter_job = self.root.after(PRESET_FILTER_DELAY_MS, self._refresh_presets)
+
+    # Rebuild the preset rows for the current filter and grouping, then fill the list in chunks
+    def _refresh_presets(self) -> None:
+        self._preset_filter_job = None
+        if self._preset_fill_job is not None:
+            self.root.after_cancel(self._preset_fill_job)
+            self._preset_fill_job = None
+
+        query = self.preset_filter_var.get()
+        group_field = self._group_choices.get(self.preset_group_var.get(), "")
+        rows: List[Optional[str]] = ["Custom"]
+        texts = ["Custom"]
+        if group_field:
+            groups = self._index.search_grouped(query, group_field)
+            shown = 0
+            for label, names in groups:
+                rows.append(None)
+                texts.append(f"-- {label} --")
+                rows.extend(names)
+                texts.extend(f"   {name}" for name in names)
+                shown += len(names)
+        else:
+            names = self._index.search(query)
+            rows.extend(names)
+            texts.extend(names)
+            shown = len(names)
+
+        self._preset_rows = rows
+        self.preset_list.delete(0, "end")
+        self.preset_status_var.set(f"{shown} of {len(self._index)} presets")
+        self._fill_preset_chunk(texts, 0)
+
+    def _fill_preset_chunk(self, texts: List[str], start: int) -> None:
+        end = min(start + PRESET_CHUNK, len(texts))
+        self.preset_list.insert("end", *texts[start:end])
+        for i in range(start, end):
+            if self._preset_rows[i] is None:
+                self.preset_list.itemconfigure(i, foreground="gray40", selectforeground="gray40")
+            elif self._preset_rows[i] == self.machine_var.get():
+                self.preset_list.selection_set(i)
+                self.preset_list.see(i)
+        if end < len(texts):
+            self._preset_fill_job = self.root.after(1, self._fill_preset_chunk, texts, end)
+        else:
+            self._preset_fill_job = None
+
+    # Enter in the filter box picks the first match
+    def _on_filter_return(self, _event: object) -> None:
+        for i, name in enumerate(self._preset_rows[1:], start=1):
+            if name is not None:
+                self.preset_list.selection_clear(0, "end")
+                self.preset_list.selection_set(i)
+                self.preset_list.see(i)
+                self._on_preset_select(None)
+                return
+
+    def _on_preset_select(self, _event: object) -> None:
+        selection = self.preset_list.curselection()
+        if not selection:
+            return
+        name = self._preset_rows[selection[0]]
+        if name is None:
+            # Group heading: not selectable
+            self.preset_list.selection_clear(selection[0])
+            return
+        self.machine_var.set(name)
+        self._on_preset_change(None)
+
     def _on_preset_change(self, event: object) -> None:
         name = self.machine_var.get()
         if name == "Custom":
@@ -179,9 +404,11 @@ class WarmupConfigGUI:
         if not spec:
             return
         # Populate travel fields from preset and disable editing
-        self.x_travel_var.set(str(spec.get("x_travel", 300)))
-        self.y_travel_var.set(str(spec.get("y_travel", 300)))
-        self.z_travel_var.set(str(spec.get("z_travel", 300)))
+        self.x_travel_var.set(_format_travel(spec.x_travel))
+        self.y_travel_var.set(_format_travel(spec.y_travel))
+        self.z_travel_var.set(_format_travel(spec.z_travel))
+        if spec.controller in CONTROLLER_LABELS:
+            self.controller_var.set(CONTROLLER_LABELS[spec.controller])
         self._set_travel_entries_state(False)
 
     def _set_travel_entries_state(self, enabled: bool) -> None:
@@ -191,10 +418,38 @@ class WarmupConfigGUI:
         self.z_travel_entry.configure(state=state)
 
 
+# 762.0 -> "762", 1270.5 -> "1270.5"
+def _format_travel(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+# Controller key and generate_program arguments for a GUI config
+def program_params(config: WarmupConfig) -> Tuple[str, Dict[str, Any]]:
+    controller = CONTROLLER_KEYS.get(config.controller, "fanuc31i")
+    machine_label = config.machine if config.machine and config.machine != "Custom" else "Custom"
+    return controller, {
+        "program_name": config.program_name,
+        "x_travel": config.x_travel,
+        "y_travel": config.y_travel,
+        "z_travel": config.z_travel,
+        "start_feed_mm_min": config.start_feed,
+        "finish_feed_mm_min": config.finish_feed,
+        "steps": config.rpm_steps,
+        "start_rpm": config.start_rpm,
+        "finish_rpm": config.finish_rpm,
+        "seconds_per_step": max(0, config.seconds_per_step),
+        "include_coolant": config.coolant,
+        "machine_label": machine_label,
+    }
+
+
 # Launch the GUI and get the config
 def launch_gui_and_get_config() -> WarmupConfig | None:
     gui = WarmupConfigGUI()
-    gui.root.mainloop()
+    try:
+        gui.root.mainloop()
+    finally:
+        gui._preview.close()
     return gui.result
 
 
@@ -0,0 +1,144 @@
+import queue
+import re
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .generators import render_program
+
+"""
+
+Background program preview for the GUI.
+
+PreviewWorker renders programs on a single worker thread so the Tk event loop
+never waits on generation. Results (program text, highlight spans, estimated
+cycle time, byte and line counts) are cached per parameter set, so switching
+back to a controller or preset shown before is answered without the worker.
+
+Tk widgets may only be touched from the main thread: the worker puts finished
+results on a queue, and the GUI collects them with poll() from an after()
+callback. Highlight spans are computed on the worker as Tk text indices, so
+the main thread only inserts the text and applies the tags.
+
+"""
+
+# Parameter sets kept in the preview cache
+PREVIEW_CACHE_SIZE = 64
+
+# Highlight patterns per controller: (tag, regex). Where spans overlap, the GUI
+# gives the later tag priority (comments win).
+_HIGHLIGHT: Dict[str, List[Tuple[str, "re.Pattern[str]"]]] = {
+    "fanuc31i": [
+        ("number", re.compile(r"^[ON]\d+")),
+        ("code", re.compile(r"\b[GM]\d+")),
+        ("variable", re.compile(r"#\d+")),
+        ("keyword", re.compile(r"\b(?:WHILE|DO\d|END\d|IF|THEN|ELSE|ENDIF|GOTO|FIX|ABS)\b")),
+        ("comment", re.compile(r"\([^()]*\)")),
+    ],
+    "tnc640": [
+        ("number", re.compile(r"^\d+")),
+        ("code", re.compile(r"\bM\d+")),
+        ("variable", re.compile(r"\bQ\d+")),
+        ("keyword", re.compile(r"\b(?:BEGIN PGM|END PGM|TOOL CALL|FUNCTION DWELL|LBL|CALL LBL|FN \d+)\b")),
+        ("comment", re.compile(r";.*$")),
+    ],
+}
+
+
+class PreviewResult(NamedTuple):
+    text: str
+    spans: List[Tuple[str, str, str]]  # (tag, start index, end index) in Tk "line.column" form
+    estimate_seconds: Optional[float]  # None where no estimator exists for the controller
+    size: int  # bytes (UTF-8)
+    lines: int
+
+
+# Tk text tag spans for a program
+def highlight_spans(controller: str, text: str) -> List[Tuple[str, str, str]]:
+    patterns = _HIGHLIGHT.get(controller, [])
+    spans = []
+    for number, line in enumerate(text.splitlines(), 1):
+        for tag, pattern in patterns:
+            for match in pattern.finditer(line):
+                spans.append((tag, f"{number}.{match.start()}", f"{number}.{match.end()}"))
+    return spans
+
+
+# Render a program with everything the preview pane shows
+def render_preview(controller: str, params: Dict[str, Any]) -> PreviewResult:
+    text = render_program(controller, params)
+    try:
+        from .estimate import estimate_cycle_time
+
+        seconds: Optional[float] = estimate_cycle_time(controller, **params).total_seconds
+    except ValueError:
+        seconds = None
+    return PreviewResult(
+        text=text,
+        spans=highlight_spans(controller, text),
+        estimate_seconds=seconds,
+        size=len(text.encode("utf-8")),
+        lines=text.count("\n"),
+    )
+
+
+# Cache key for a controller and generate_program arguments
+def preview_key(controller: str, params: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (controller, tuple(sorted(params.items())))
+
+
+class PreviewWorker:
+    def __init__(self, cache_size: int = PREVIEW_CACHE_SIZE) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview")
+        self._done: "queue.Queue[Tuple[Tuple[Any, ...], Any]]" = queue.Queue()
+        self._cache: "OrderedDict[Tuple[Any, ...], PreviewResult]" = OrderedDict()
+        self._pending: Dict[Tuple[Any, ...], Future] = {}
+        self.cache_size = cache_size
+
+    # Cached result for a parameter set, or None
+    def cached(self, key: Tuple[Any, ...]) -> Optional[PreviewResult]:
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        return result
+
+    # Start rendering unless cached or already running. Returns the cached result, if any.
+    # Earlier requests that have not started yet are superseded and cancelled.
+    def request(self, controller: str, params: Dict[str, Any]) -> Optional[PreviewResult]:
+        key = preview_key(controller, params)
+        result = self.cached(key)
+        if result is not None or key in self._pending:
+            return result
+        for pending in self._pending.values():
+            pending.cancel()
+        future = self._executor.submit(render_preview, controller, dict(params))
+        self._pending[key] = future
+        future.add_done_callback(lambda f: self._done.put((key, f)))
+        return None
+
+    # Finished renders since the last call: (key, PreviewResult or exception). Main thread only.
+    def poll(self) -> List[Tuple[Tuple[Any, ...], Any]]:
+        finished = []
+        while True:
+            try:
+                key, future = self._done.get_nowait()
+            except queue.Empty:
+                return finished
+            self._pending.pop(key, None)
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                finished.append((key, error))
+                continue
+            self._cache[key] = future.result()
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            finished.append((key, future.result()))
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._pending)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
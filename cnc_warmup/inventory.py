@@ -0,0 +1,197 @@
+import csv
+import json
+import math
+import os
+from typing import Any, Callable, Dict, Iterator, Mapping, NamedTuple
+
+from .config_loader import MachinePreset, load_config
+from .generators import CONTROLLER_MODULES, available_controllers
+
+"""
+
+Streaming machine inventory.
+
+Machines can come from an inventory export instead of the "machines" object
+of warmup_config.json:
+
+- CSV with a header row: name (or machine), x_travel, y_travel, z_travel and
+  optionally controller, cell and any of OVERRIDE_FIELDS;
+- JSONL (.jsonl/.ndjson): one object per line with the same keys;
+- JSON: a warmup_config.json-style document (its "machines" object).
+
+iter_inventory() yields one MachineRow per machine as the file is read, so a
+fleet of tens of thousands of rows is never held in memory (JSON excepted:
+the document is parsed whole, as load_config does). Each row is validated and
+coerced once: travels must be positive numbers, overrides must parse, and a
+bad row stops the iteration with InventoryError naming the file and line.
+
+A row's overrides are "defaults" keys (start_rpm, finish_feed, rpm_steps,
+...) that apply to that machine only; batch.iter_jobs merges them over the
+fleet-wide values. Empty CSV cells and JSON nulls mean "not overridden".
+
+Notes:
+Columns or keys not listed here (serial numbers, ftp, ...) are ignored.
+A controller must be a built-in key or an installed backend.
+Only the machine names seen so far are kept, to reject duplicates.
+
+"""
+
+
+class InventoryError(ValueError):
+    pass
+
+
+def _bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y", "on"):
+        return True
+    if text in ("0", "false", "no", "n", "off"):
+        return False
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, bool):
+        raise ValueError(f"not a number: {value!r}")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def _whole(value: Any) -> int:
+    number = _number(value)
+    if not number.is_integer():
+        raise ValueError(f"not a whole number: {value!r}")
+    return int(number)
+
+
+# "defaults" keys a row may override -> (coercion, minimum)
+OVERRIDE_FIELDS: Dict[str, Any] = {
+    "start_rpm": (_number, 0.0),
+    "finish_rpm": (_number, 0.0),
+    "start_feed": (_number, 1e-9),
+    "finish_feed": (_number, 1e-9),
+    "rpm_steps": (_whole, 1),
+    "seconds_per_step": (_whole, 0),
+    "coolant": (_bool, None),
+}
+TRAVEL_FIELDS = ("x_travel", "y_travel", "z_travel")
+
+
+class MachineRow(NamedTuple):
+    preset: MachinePreset
+    overrides: Dict[str, Any]  # coerced "defaults" keys for this machine only
+    line: int = 0  # source line (CSV/JSONL), for messages
+
+
+def _blank(value: Any) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _coerce(field: str, value: Any, convert: Callable[[Any], Any], minimum: Any, where: str) -> Any:
+    try:
+        result = convert(value.strip() if isinstance(value, str) else value)
+    except (TypeError, ValueError) as exc:
+        raise InventoryError(f"{where}: {field}: {exc}") from None
+    if minimum is not None and result < minimum:
+        expected = "positive" if minimum > 0 else f"at least {minimum}"
+        raise InventoryError(f"{where}: {field} must be {expected}, got {value!r}")
+    return result
+
+
+# Validate and coerce one raw row (CSV strings or JSON values)
+def coerce_row(raw: Mapping[str, Any], where: str, line: int = 0) -> MachineRow:
+    name = raw.get("name")
+    if _blank(name):
+        name = raw.get("machine")
+    if _blank(name):
+        raise InventoryError(f"{where}: missing machine name")
+    name = str(name).strip()
+    travels = []
+    for field in TRAVEL_FIELDS:
+        if _blank(raw.get(field)):
+            raise InventoryError(f"{where}: {name}: missing {field}")
+        travels.append(_coerce(field, raw[field], _number, 1e-9, f"{where}: {name}"))
+    overrides = {
+        field: _coerce(field, raw[field], convert, minimum, f"{where}: {name}")
+        for field, (convert, minimum) in OVERRIDE_FIELDS.items()
+        if not _blank(raw.get(field))
+    }
+    controller = "" if _blank(raw.get("controller")) else str(raw["controller"]).strip().lower()
+    if controller and controller not in CONTROLLER_MODULES and controller not in available_controllers():
+        raise InventoryError(f"{where}: {name}: unknown controller {raw['controller']!r}")
+    preset = MachinePreset(
+        name,
+        travels[0],
+        travels[1],
+        travels[2],
+        controller,
+        "" if _blank(raw.get("cell")) else str(raw["cell"]).strip(),
+    )
+    return MachineRow(preset, overrides, line)
+
+
+def _iter_csv(path: str) -> Iterator[MachineRow]:
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        columns = {c.strip() for c in reader.fieldnames or ()}
+        missing = [c for c in TRAVEL_FIELDS if c not in columns]
+        if not {"name", "machine"} & columns:
+            missing.insert(0, "name")
+        if missing:
+            raise InventoryError(f"{path}:1: missing column(s): {', '.join(missing)}")
+        for raw in reader:
+            line = reader.line_num
+            yield coerce_row({k.strip(): v for k, v in raw.items() if k is not None}, f"{path}:{line}", line)
+
+
+def _iter_jsonl(path: str) -> Iterator[MachineRow]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line, text in enumerate(f, 1):
+            if not text.strip():
+                continue
+            try:
+                raw = json.loads(text)
+            except json.JSONDecodeError as exc:
+                raise InventoryError(f"{path}:{line}: {exc}") from None
+            if not isinstance(raw, dict):
+                raise InventoryError(f"{path}:{line}: expected a JSON object per line")
+            yield coerce_row(raw, f"{path}:{line}", line)
+
+
+def _iter_json(path: str) -> Iterator[MachineRow]:
+    machines = load_config(path).get("machines", {})
+    for name, raw in machines.items():
+        if not isinstance(raw, dict):
+            raise InventoryError(f"{path}: machines: {name}: expected an object")
+        yield coerce_row(dict(raw, name=name), f"{path}: machines")
+
+
+# Reader for an inventory path, from its extension
+def inventory_reader(path: str) -> Callable[[str], Iterator[MachineRow]]:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _iter_csv
+    if ext in (".jsonl", ".ndjson"):
+        return _iter_jsonl
+    if ext == ".json":
+        return _iter_json
+    raise InventoryError(f"Unsupported inventory type: {path} (use .csv, .jsonl/.ndjson or .json)")
+
+
+# Stream the machines of an inventory file, rejecting duplicate names
+def iter_inventory(path: str) -> Iterator[MachineRow]:
+    seen: Dict[str, int] = {}
+    try:
+        for row in inventory_reader(path)(path):
+            name = row.preset.name
+            if name in seen:
+                first = f" (first on line {seen[name]})" if seen[name] else ""
+                raise InventoryError(f"{path}:{row.line or '?'}: duplicate machine name '{name}'{first}")
+            seen[name] = row.line
+            yield row
+    except (OSError, UnicodeDecodeError, csv.Error) as exc:
+        raise InventoryError(f"{path}: {exc}") from None
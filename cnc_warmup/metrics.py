@@ -0,0 +1,154 @@
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .generators import load_generator
+from .plan import build_plan
+
+"""
+
+Run metrics for --metrics-out / --profile.
+
+Stage timings are wall-clock perf_counter spans; a stage that runs once per
+program (plan, generate:<controller>, validate, write, or stream:<controller>
+for --unrolled programs, which are generated and written in one pass)
+collects one sample per program, and the report gives count/total/min/p50/p90/p99/max for each.
+Programs are also summarized by line and byte count.
+
+With a cProfile dump path, the run executes under cProfile. The report then
+adds the time spent in each generator's _format_number (slot formatting) and
+the functions with the highest cumulative time.
+
+Notes:
+Pool workers are not profiled: use --jobs 1 to profile batch generation.
+Peak memory is the resident set size high-water mark of this process and of
+its finished child processes (resource.getrusage; not available on Windows).
+
+"""
+
+# Functions listed in the profile summary
+TOP_FUNCTIONS = 15
+PERCENTILES = (50, 90, 99)
+
+
+# Nearest-rank percentiles of samples
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    summary = {"count": len(ordered), "total": sum(ordered), "min": ordered[0]}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = ordered[max(0, math.ceil(p / 100.0 * len(ordered)) - 1)]
+    summary["max"] = ordered[-1]
+    return summary
+
+
+# Peak RSS in KiB for this process and its reaped children (None where unsupported)
+def peak_memory() -> Dict[str, Optional[int]]:
+    try:
+        import resource
+    except ImportError:
+        return {"self_kib": None, "children_kib": None}
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1024 if sys.platform == "darwin" else 1
+    return {
+        "self_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // scale,
+        "children_kib": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss // scale,
+    }
+
+
+# Render one program, timing plan building and rendering separately.
+# Returns the text and {stage: seconds}.
+def timed_render(controller: str, params: Dict[str, Any]) -> Tuple[str, Dict[str, float]]:
+    started = time.perf_counter()
+    plan = build_plan(**params)
+    planned = time.perf_counter()
+    text = load_generator(controller).render_plan(
+        plan, params["program_name"], params.get("machine_label"), bool(params.get("compact", False))
+    )
+    return text, {"plan": planned - started, f"generate:{controller}": time.perf_counter() - planned}
+
+
+class RunMetrics:
+    def __init__(self, profile_path: str = "") -> None:
+        self.profile_path = profile_path
+        self.stages: Dict[str, List[float]] = {}
+        self.programs: List[Dict[str, Any]] = []
+        self._profiler: Any = None
+        self._started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages.setdefault(stage, []).append(seconds)
+
+    # One generated program: its name, size and per-stage seconds
+    def add_program(self, name: str, controller: str, text_lines: int, size: int, stages: Dict[str, float]) -> None:
+        self.programs.append(
+            {"program": name, "controller": controller, "lines": text_lines, "bytes": size, "stages": dict(stages)}
+        )
+        for stage, seconds in stages.items():
+            self.add(stage, seconds)
+
+    def start_profile(self) -> None:
+        if self.profile_path and self._profiler is None:
+            import cProfile
+
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop_profile(self) -> None:
+        if self._profiler is not None:
+            self._profiler.disable()
+            self._profiler.dump_stats(self.profile_path)
+
+    # Slot formatting time per generator module and the top functions, from the profile
+    def _profile_report(self) -> Dict[str, Any]:
+        import pstats
+
+        stats = pstats.Stats(self._profiler).stats  # (file, line, name) -> (cc, nc, tt, ct, callers)
+        formatting = {}
+        for (filename, _, name), (_, calls, own, _, _) in stats.items():
+            if name == "_format_number" and "generators" in filename:
+                module = filename.replace("\\", "/").rsplit("/", 1)[-1].rsplit(".", 1)[0]
+                formatting[module] = {"calls": calls, "seconds": own}
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+        return {
+            "dump": self.profile_path,
+            "format_number": formatting,
+            "top_cumulative": [
+                {"function": f"{filename}:{line}({name})", "calls": calls, "own_seconds": own, "cumulative_seconds": cum}
+                for (filename, line, name), (_, calls, own, cum, _) in top
+            ],
+        }
+
+    def report(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "wall_seconds": time.perf_counter() - self._started,
+            "stages": {name: summarize(samples) for name, samples in self.stages.items()},
+            "programs": {
+                "count": len(self.programs),
+                "lines": summarize([p["lines"] for p in self.programs]),
+                "bytes": summarize([p["bytes"] for p in self.programs]),
+                "items": self.programs,
+            },
+            "peak_memory": peak_memory(),
+        }
+        if self._profiler is not None:
+            result["profile"] = self._profile_report()
+        return result
+
+    def write(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2)
+            f.write("\n")
+
+    # Short stderr summary: one line per stage
+    def format(self) -> str:
+        lines = [f"{'stage':<24} {'count':>6} {'total ms':>10} {'p50 ms':>9} {'p99 ms':>9}"]
+        for name, samples in self.stages.items():
+            s = summarize(samples)
+            lines.append(
+                f"{name:<24} {s['count']:>6} {1e3 * s['total']:>10.3f} {1e3 * s['p50']:>9.3f} {1e3 * s['p99']:>9.3f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .generators import GENERATOR_VERSION
+
+"""
+
+Content-addressed cache for batch output.
+
+Each program is keyed by a SHA-256 of its normalized generate_program arguments,
+the controller and GENERATOR_VERSION. The cache directory holds:
+
+- manifest.json: per output path, the key and SHA-256 of the file last written
+  there; per stored object, its size and last use (for LRU eviction).
+- objects/<key[:2]>/<key>: the generated program bytes.
+
+Before a batch runs, every job is classified:
+
+- hit: the path's recorded key matches and the file on disk still hashes to
+  the recorded SHA-256. Nothing is generated or written, so timestamps stay.
+- rewritten: the key is known (stored object) but the file is missing or was
+  changed. The stored bytes are written back without generating.
+- miss: the key is new; the job is generated as usual and its output stored.
+
+Notes:
+Objects are evicted least recently used first once the store exceeds
+max_bytes. One batch run at a time per cache directory; the manifest is
+replaced atomically, so an interrupted run only loses its own updates.
+
+"""
+
+MANIFEST_NAME = "manifest.json"
+# Bump when the manifest layout changes; older manifests are discarded
+_MANIFEST_FORMAT = 1
+
+
+# Cache key for one program
+def cache_key(controller: str, params: Mapping[str, Any]) -> str:
+    normalized: Dict[str, Any] = {}
+    for name, value in params.items():
+        if isinstance(value, bool) or value is None or isinstance(value, str):
+            normalized[name] = value
+        elif isinstance(value, (int, float)):
+            # 762 and 762.0 produce the same program
+            normalized[name] = float(value)
+        else:
+            normalized[name] = str(value)
+    payload = json.dumps(
+        {"generator": GENERATOR_VERSION, "controller": controller, "params": normalized},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+# Write bytes to path via a temporary file, so readers never see a partial file
+def write_atomic(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+# Save generated bytes as a cache object (safe to call from pool workers)
+def store_object(object_path: str, data: bytes) -> None:
+    if not os.path.exists(object_path):
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        write_atomic(object_path, data)
+
+
+class OutputCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.rewritten = 0
+        self.evicted = 0
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._objects: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, MANIFEST_NAME)
+
+    def object_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, "objects", key[:2], key)
+
+    def _load(self) -> None:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(manifest, dict) or manifest.get("format") != _MANIFEST_FORMAT:
+            return
+        self._files = dict(manifest.get("files", {}))
+        self._objects = dict(manifest.get("objects", {}))
+
+    # Split jobs into (misses to generate, keys by path) after applying hits and rewrites.
+    # jobs are BatchJob-like: .controller, .path, .params.
+    def prepare(self, jobs: List[Any]) -> Tuple[List[Any], Dict[str, str]]:
+        now = time.time()
+        misses = []
+        keys: Dict[str, str] = {}
+        for job in jobs:
+            path = os.path.abspath(job.path)
+            key = cache_key(job.controller, job.params)
+            keys[path] = key
+            entry = self._files.get(path)
+            if entry is not None and entry.get("key") == key and file_sha256(path) == entry.get("sha256"):
+                self.hits += 1
+                self._touch(key, now)
+                continue
+            data = self._read_object(key)
+            if data is None:
+                self.misses += 1
+                misses.append(job)
+                continue
+            digest = hashlib.sha256(data).hexdigest()
+            if file_sha256(path) != digest:
+                write_atomic(path, data)
+            self._files[path] = {"key": key, "sha256": digest, "size": len(data)}
+            self._touch(key, now)
+            self.rewritten += 1
+        return misses, keys
+
+    # Record a generated program after a worker wrote it and its object (store_object)
+    def record(self, path: str, key: str, sha256: str, size: int) -> None:
+        self._objects[key] = {"size": size, "used": time.time()}
+        self._files[os.path.abspath(path)] = {"key": key, "sha256": sha256, "size": size}
+
+    # Evict least recently used objects over the size limit, then write the manifest
+    def save(self) -> None:
+        total = sum(int(o.get("size", 0)) for o in self._objects.values())
+        if total > self.max_bytes:
+            for key in sorted(self._objects, key=lambda k: self._objects[k].get("used", 0.0)):
+                if total <= self.max_bytes:
+                    break
+                total -= int(self._objects.pop(key).get("size", 0))
+                self.evicted += 1
+                try:
+                    os.remove(self.object_path(key))
+                except OSError:
+                    pass
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest = {
+            "format": _MANIFEST_FORMAT,
+            "generator_version": GENERATOR_VERSION,
+            "files": self._files,
+            "objects": self._objects,
+        }
+        write_atomic(self.manifest_path, json.dumps(manifest, sort_keys=True).encode("utf-8"))
+
+    def format(self) -> str:
+        text = f"Cache: {self.hits} hit, {self.misses} miss, {self.rewritten} rewritten"
+        return text + (f", {self.evicted} evicted" if self.evicted else "")
+
+    def _read_object(self, key: str) -> Optional[bytes]:
+        if key not in self._objects:
+            return None
+        try:
+            with open(self.object_path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            self._objects.pop(key, None)
+            return None
+
+    def _touch(self, key: str, now: float) -> None:
+        entry = self._objects.get(key)
+        if entry is not None:
+            entry["used"] = now
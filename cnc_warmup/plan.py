@@ -0,0 +1,174 @@
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+"""
+
+Controller-neutral warmup plan.
+
+A WarmupPlan holds everything a warmup program does, independent of the
+controller that will run it: the travels it exercises, the four axis feed
+steps, the spindle ramp (linear start/finish/steps/dwell or an explicit
+table) and the options (coolant, overlapped spindle). Backends render a plan
+into program text; program name, machine label and compact output are
+rendering options, so one plan serves every controller of a machine.
+
+build_plan() normalizes generate_program arguments once (step and dwell
+clamps, ramp tables as tuples) and caches the result, so generating all
+controllers for the same machine builds the plan only once.
+
+The plan is described as operations a backend emits:
+
+- passes: eight AxisPass entries, four Z passes then four XY passes, each at
+  one feed step;
+- spindle: SpindleRamp, whose steps_table() gives the (rpm, dwell) pairs for a
+  backend without a loop convention of its own;
+- overlap: the spindle runs during the passes (see cnc_warmup.schedule).
+
+Notes:
+Plans are NamedTuples rather than dataclasses: the generators import this
+module on the CLI startup path, and importing dataclasses would take most of
+its budget (see cnc_warmup.bench --check-startup).
+How a pass is traversed (Fanuc: down+up strokes and a double diagonal from
+the XY center; TNC: single moves from the datum corner) and how the linear
+spindle ramp is stepped (Fanuc: max(2, steps) speeds from start_rpm; TNC:
+max(1, steps) increments above it) stay with each backend, as the programs
+already on the machines depend on them.
+
+"""
+
+# Axis feed steps per axis
+FEED_STEPS = 4
+
+
+# One axis pass at one feed step
+class AxisPass(NamedTuple):
+    axis: str  # "Z" or "XY"
+    step: int  # feed step, 1..FEED_STEPS
+    feed: float  # mm/min
+
+
+# Spindle ramp: linear start/finish/steps/dwell, or an explicit (rpm, dwell) table
+class SpindleRamp(NamedTuple):
+    start_rpm: float
+    finish_rpm: float
+    steps: int  # as requested; backends clamp to their loop minimum
+    dwell: int  # seconds per step, >= 0
+    table: Tuple[Tuple[float, int], ...] = ()
+
+    # (rpm, dwell) per step: the table, or steps evenly spaced speeds from start to finish
+    def steps_table(self) -> Tuple[Tuple[float, int], ...]:
+        if self.table:
+            return self.table
+        n = max(1, self.steps)
+        if n == 1:
+            return ((self.finish_rpm, self.dwell),)
+        delta = (self.finish_rpm - self.start_rpm) / (n - 1)
+        return tuple((self.start_rpm + delta * k, self.dwell) for k in range(n))
+
+
+class WarmupPlan(NamedTuple):
+    x_travel: float
+    y_travel: float
+    z_travel: float
+    start_feed: float
+    finish_feed: float
+    feed_table: Tuple[float, ...]  # explicit feed steps; () = linear from start to finish
+    spindle: SpindleRamp
+    include_coolant: bool = True
+    overlap: bool = False
+
+    # The FEED_STEPS axis feeds
+    @property
+    def feeds(self) -> Tuple[float, ...]:
+        if self.feed_table:
+            return self.feed_table
+        delta = (self.finish_feed - self.start_feed) / (FEED_STEPS - 1)
+        return tuple(self.start_feed + delta * k for k in range(FEED_STEPS))
+
+    @property
+    def passes(self) -> Tuple[AxisPass, ...]:
+        feeds = self.feeds
+        return tuple(AxisPass(axis, k, feeds[k - 1]) for axis in ("Z", "XY") for k in range(1, FEED_STEPS + 1))
+
+    # generate_program keyword arguments for this plan, without the rendering options
+    # (what cnc_warmup.estimate, .schedule and .validate take)
+    def params(self) -> Dict[str, Any]:
+        return {
+            "x_travel": self.x_travel,
+            "y_travel": self.y_travel,
+            "z_travel": self.z_travel,
+            "start_feed_mm_min": self.start_feed,
+            "finish_feed_mm_min": self.finish_feed,
+            "steps": self.spindle.steps,
+            "start_rpm": self.spindle.start_rpm,
+            "finish_rpm": self.spindle.finish_rpm,
+            "seconds_per_step": self.spindle.dwell,
+            "include_coolant": self.include_coolant,
+            "spindle_ramp": self.spindle.table or None,
+            "feed_ramp": self.feed_table or None,
+            "overlap": self.overlap,
+        }
+
+
+@lru_cache(maxsize=256)
+def _cached_plan(
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool,
+    spindle_ramp: Tuple[Tuple[float, int], ...],
+    feed_ramp: Tuple[float, ...],
+    overlap: bool,
+) -> WarmupPlan:
+    return WarmupPlan(
+        x_travel=x_travel,
+        y_travel=y_travel,
+        z_travel=z_travel,
+        start_feed=start_feed_mm_min,
+        finish_feed=finish_feed_mm_min,
+        feed_table=feed_ramp,
+        spindle=SpindleRamp(start_rpm, finish_rpm, int(steps), max(0, int(seconds_per_step)), spindle_ramp),
+        include_coolant=include_coolant,
+        overlap=overlap,
+    )
+
+
+# Plan for generate_program arguments. Extra arguments (program_name,
+# machine_label, compact) are rendering options and are ignored here.
+def build_plan(
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    start_feed_mm_min: float,
+    finish_feed_mm_min: float,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    include_coolant: bool = True,
+    spindle_ramp: Optional[Sequence[Tuple[float, float]]] = None,
+    feed_ramp: Optional[Sequence[float]] = None,
+    overlap: bool = False,
+    **_ignored: Any,
+) -> WarmupPlan:
+    return _cached_plan(
+        x_travel,
+        y_travel,
+        z_travel,
+        start_feed_mm_min,
+        finish_feed_mm_min,
+        int(steps),
+        start_rpm,
+        finish_rpm,
+        int(seconds_per_step),
+        bool(include_coolant),
+        tuple((rpm, int(dwell)) for rpm, dwell in spindle_ramp or ()),
+        tuple(feed_ramp or ()),
+        bool(overlap),
+    )
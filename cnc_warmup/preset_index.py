@@ -0,0 +1,124 @@
+import bisect
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .config_loader import MachinePreset
+
+"""
+
+Search index over machine preset names, for type-ahead pickers.
+
+Built once per config: case-folded names are kept in a sorted array, so prefix
+matches are a bisect range, and joined into one newline-separated haystack, so
+substring matches are a str.find scan in C rather than a Python loop over every
+preset. Prefix matches are listed first, then the remaining substring matches,
+each in config file order.
+
+Notes:
+No tkinter here; the GUI only renders what search() returns.
+
+"""
+
+# Attributes presets can be grouped by, with display labels
+GROUP_FIELDS: Dict[str, str] = {"controller": "Controller", "cell": "Cell"}
+
+# Heading used for presets without a value for the grouping field
+UNGROUPED = "(none)"
+
+
+# Prefix/substring index over preset names
+class PresetIndex:
+    def __init__(self, presets: Mapping[str, MachinePreset]) -> None:
+        self.presets = presets
+        self.names: List[str] = list(presets)
+        self._keys = [name.casefold() for name in self.names]
+        # Sorted keys with their config positions, for prefix ranges
+        ranked = sorted(zip(self._keys, range(len(self._keys))))
+        self._sorted_keys = [k for k, _ in ranked]
+        self._sorted_pos = [i for _, i in ranked]
+        self._haystack = "\n".join(self._keys)
+        # Start offset of each name in the haystack
+        self._offsets: List[int] = []
+        offset = 0
+        for key in self._keys:
+            self._offsets.append(offset)
+            offset += len(key) + 1
+        self._groups: Dict[str, Dict[str, List[int]]] = {}
+        # Last query and its matches, so typing more characters only narrows them
+        self._last: Tuple[str, List[int]] = ("", list(range(len(self.names))))
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    # Config positions (in order) whose name starts with / contains the query
+    def _match(self, query: str) -> List[int]:
+        last_query, last_hits = self._last
+        if query == last_query:
+            return last_hits
+        if last_query and query.startswith(last_query):
+            # Narrowing: filter the previous hits instead of rescanning
+            keys = self._keys
+            hits = [i for i in last_hits if query in keys[i]]
+        else:
+            hits = []
+            find = self._haystack.find
+            offsets = self._offsets
+            pos = find(query)
+            while pos != -1:
+                i = bisect.bisect_right(offsets, pos) - 1
+                hits.append(i)
+                # Skip to the next name; a name only needs to match once
+                next_start = offsets[i + 1] if i + 1 < len(offsets) else len(self._haystack)
+                pos = find(query, next_start)
+        self._last = (query, hits)
+        return hits
+
+    # Names matching query, prefix matches first. Empty query matches everything.
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        query = query.strip().casefold()
+        if not query:
+            names = self.names
+            return names[:limit] if limit is not None else list(names)
+        hits = self._match(query)
+        lo = bisect.bisect_left(self._sorted_keys, query)
+        hi = bisect.bisect_left(self._sorted_keys, query + "\U0010ffff")
+        prefix = sorted(self._sorted_pos[lo:hi])
+        if len(prefix) == len(hits):
+            ordered = hits
+        else:
+            is_prefix = set(prefix)
+            ordered = prefix + [i for i in hits if i not in is_prefix]
+        if limit is not None:
+            ordered = ordered[:limit]
+        return [self.names[i] for i in ordered]
+
+    # Group name -> config positions for a grouping field, built on first use
+    def _group_positions(self, field: str) -> Dict[str, List[int]]:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"Unknown group field: {field}")
+        groups = self._groups.get(field)
+        if groups is None:
+            groups = {}
+            for i, name in enumerate(self.names):
+                label = getattr(self.presets[name], field) or UNGROUPED
+                groups.setdefault(label, []).append(i)
+            groups = {k: groups[k] for k in sorted(groups, key=lambda g: (g == UNGROUPED, g.casefold()))}
+            self._groups[field] = groups
+        return groups
+
+    # Matching names grouped by controller or cell: [(group, names), ...] in group order.
+    # Within a group names keep the search order; empty groups are dropped.
+    def search_grouped(self, query: str, field: str) -> List[Tuple[str, List[str]]]:
+        groups = self._group_positions(field)
+        if not query.strip():
+            return [(label, [self.names[i] for i in positions]) for label, positions in groups.items()]
+        rank = {name: r for r, name in enumerate(self.search(query))}
+        result = []
+        for label, positions in groups.items():
+            names = sorted((self.names[i] for i in positions if self.names[i] in rank), key=rank.__getitem__)
+            if names:
+                result.append((label, names))
+        return result
+
+    # Distinct values of a grouping field, in display order
+    def group_labels(self, field: str) -> Sequence[str]:
+        return list(self._group_positions(field))
@@ -0,0 +1,174 @@
+import math
+import os
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+"""
+
+Idle-time-aware warmup profiles.
+
+A spindle that stood for 20 minutes is still near operating temperature and
+does not need the weekend-cold warmup. The profile turns idle time (and
+optionally ambient temperature) into a severity between min_fraction and 1,
+then scales the warmup:
+
+- steps and seconds_per_step are multiplied by the severity,
+- the ramp starts closer to finish_rpm (start_rpm moves up by 1 - severity
+  of the ramp span); finish_rpm and the axis passes are unchanged,
+- a spindle_ramp table (--ramp table) keeps its steps from that start RPM
+  up, with each dwell multiplied by the severity.
+
+Decay curves (idle minutes t):
+
+- exponential: 1 - exp(-t / time_constant_minutes), Newton cooling towards
+  ambient; a machine idle for one time constant has lost ~63% of its heat.
+- linear: t / cold_minutes.
+
+Either way the severity is 1 from cold_minutes on. Below reference_temp_c,
+each degree raises the severity by temp_coefficient.
+
+Configured under "idle_profile" in warmup_config.json:
+
+  "idle_profile": {"curve": "exponential", "time_constant_minutes": 120,
+                   "cold_minutes": 480, "min_fraction": 0.2,
+                   "brackets_minutes": [30, 120, 240]}
+
+Notes:
+brackets_minutes defines the program family batch mode writes with
+--idle-brackets: one program per bracket, sized for the bracket's upper bound
+(WARMUP_TNC_MACHINE1_IDLE30.h is enough after up to 30 minutes idle), next to
+the full program for longer stops.
+
+"""
+
+CURVES = ("exponential", "linear")
+
+
+@dataclass(frozen=True)
+class IdleProfile:
+    curve: str = "exponential"
+    time_constant_minutes: float = 120.0
+    cold_minutes: float = 480.0
+    min_fraction: float = 0.2
+    reference_temp_c: float = 20.0
+    temp_coefficient: float = 0.02  # severity added per degree below reference_temp_c
+    brackets_minutes: Tuple[float, ...] = field(default=(30.0, 120.0, 240.0))
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "IdleProfile":
+        raw = config.get("idle_profile", {}) or {}
+        if not isinstance(raw, Mapping):
+            raise ValueError("idle_profile must be an object")
+        profile = cls()
+        values: Dict[str, Any] = {}
+        numbers = ("time_constant_minutes", "cold_minutes", "min_fraction", "reference_temp_c", "temp_coefficient")
+        try:
+            for name in numbers:
+                if name in raw:
+                    values[name] = float(raw[name])
+            if "curve" in raw:
+                values["curve"] = str(raw["curve"])
+            if "brackets_minutes" in raw:
+                values["brackets_minutes"] = tuple(sorted(float(b) for b in raw["brackets_minutes"]))
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"idle_profile: {exc}") from None
+        profile = replace(profile, **values)
+        profile.check()
+        return profile
+
+    def check(self) -> None:
+        if self.curve not in CURVES:
+            raise ValueError(f"idle_profile curve must be one of {', '.join(CURVES)}")
+        if self.time_constant_minutes <= 0 or self.cold_minutes <= 0:
+            raise ValueError("idle_profile time_constant_minutes and cold_minutes must be positive")
+        if not 0.0 < self.min_fraction <= 1.0:
+            raise ValueError("idle_profile min_fraction must be in (0, 1]")
+        if any(b <= 0 for b in self.brackets_minutes):
+            raise ValueError("idle_profile brackets_minutes must be positive")
+
+    # Share of the full warmup needed after idle_minutes (min_fraction..1)
+    def severity(self, idle_minutes: float, ambient_c: Optional[float] = None) -> float:
+        if idle_minutes < 0:
+            raise ValueError("Idle time cannot be negative")
+        if idle_minutes >= self.cold_minutes:
+            return 1.0
+        if self.curve == "exponential":
+            value = 1.0 - math.exp(-idle_minutes / self.time_constant_minutes)
+        else:
+            value = idle_minutes / self.cold_minutes
+        if ambient_c is not None and ambient_c < self.reference_temp_c:
+            value *= 1.0 + self.temp_coefficient * (self.reference_temp_c - ambient_c)
+        return min(1.0, max(self.min_fraction, value))
+
+    # generate_program arguments scaled for idle_minutes. A spindle_ramp table
+    # is scaled in place, so table ramps must be applied before the profile.
+    def apply(self, params: Mapping[str, Any], idle_minutes: float, ambient_c: Optional[float] = None) -> Dict[str, Any]:
+        s = self.severity(idle_minutes, ambient_c)
+        scaled = dict(params)
+        if s >= 1.0:
+            return scaled
+        start_rpm = float(params["start_rpm"])
+        finish_rpm = float(params["finish_rpm"])
+        table = params.get("spindle_ramp")
+        if table:
+            # Explicit table (--ramp table): keep the steps from the scaled start
+            # RPM up, with scaled dwells
+            low = round(finish_rpm - (finish_rpm - start_rpm) * s, 1)
+            kept = [step for step in table if step[0] >= low] or [max(table, key=lambda step: step[0])]
+            scaled["spindle_ramp"] = tuple((rpm, max(0, int(round(dwell * s)))) for rpm, dwell in kept)
+            scaled["steps"] = len(kept)
+            scaled["start_rpm"] = min(rpm for rpm, _ in kept)
+            scaled["seconds_per_step"] = max(0, int(round(int(params["seconds_per_step"]) * s)))
+            return scaled
+        scaled["steps"] = max(1, int(round(int(params["steps"]) * s)))
+        scaled["seconds_per_step"] = max(0, int(round(int(params["seconds_per_step"]) * s)))
+        scaled["start_rpm"] = round(finish_rpm - (finish_rpm - start_rpm) * s, 1)
+        return scaled
+
+
+# "after up to 30 min idle" program file/name suffix
+def bracket_suffix(minutes: float) -> str:
+    return f"_IDLE{minutes:g}".replace(".", "P")
+
+
+# Machine label of a bracket program
+def bracket_label(label: str, minutes: float) -> str:
+    return f"{label} (idle <= {minutes:g} min)"
+
+
+_BRACKET_NAME = re.compile(r"^(.+)_IDLE(\d+(?:P\d+)?)$", re.IGNORECASE)
+_BRACKET_LABEL = re.compile(r"^(.+) \(idle <= (\d+(?:\.\d+)?) min\)$")
+
+
+# Program name and label of the full program a bracket program was derived
+# from, and the bracket's idle minutes (None if it is not a bracket program)
+def split_bracket(program_name: str, machine_label: Optional[str]) -> Tuple[str, Optional[str], Optional[float]]:
+    minutes: Optional[float] = None
+    name = _BRACKET_NAME.match(program_name)
+    if name is not None:
+        program_name = name.group(1)
+        minutes = float(name.group(2).upper().replace("P", "."))
+    label = _BRACKET_LABEL.match(machine_label or "")
+    if label is not None:
+        machine_label = label.group(1)
+        minutes = float(label.group(2)) if minutes is None else minutes
+    return program_name, machine_label, minutes
+
+
+# Add one job per idle bracket next to each full-warmup job (BatchJob-like:
+# .machine, .controller, .path, .params). Returns the extended job list.
+def bracket_jobs(jobs: Sequence[Any], profile: IdleProfile, ambient_c: Optional[float] = None) -> List[Any]:
+    expanded: List[Any] = []
+    for job in jobs:
+        expanded.append(job)
+        root, ext = os.path.splitext(job.path)
+        for minutes in profile.brackets_minutes:
+            if minutes >= profile.cold_minutes:
+                continue
+            suffix = bracket_suffix(minutes)
+            params = profile.apply(job.params, minutes, ambient_c)
+            params["program_name"] = f"{job.params['program_name']}{suffix}"
+            params["machine_label"] = bracket_label(job.params.get("machine_label") or job.machine, minutes)
+            expanded.append(replace(job, path=root + suffix + ext, params=params))
+    return expanded
@@ -0,0 +1,509 @@
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+from .batch import iter_jobs, machine_slug
+from .config_loader import get_defaults, get_machine_index, load_config
+from .generators import GENERATOR_VERSION, render_program
+from .profiles import IdleProfile, split_bracket
+from .ramps import apply_ramp, ramp_settings
+from .recover import RecoverError, RecoveredProgram, recover_lines, recover_text
+
+"""
+
+Index of warmup programs already on disk or on the controllers.
+
+Run with:
+python -m cnc_warmup index DIR... [--db warmup_index.sqlite] [--jobs N] [--list drift]
+
+Every .nc / .h file under the given directories is read with the reverse
+parser (cnc_warmup.recover) and recorded in a SQLite table, programs: the
+file (path, size, mtime, SHA-256), what it was generated with (controller,
+program name, machine label, travels, feeds, spindle ramp, coolant, overlap,
+compact; all of it as JSON in settings, and the generate_program arguments
+in params) and whether regenerating it from those arguments gives the same
+bytes (verbatim = 0: the body was edited by hand or written by an older
+version; NULL for overlapped programs, see cnc_warmup.recover). Files that are not
+warmup programs are kept with the reason in error.
+
+Each program is then matched to a machine of the config (by machine label,
+else by the machine slug ending its program name, as batch mode names them)
+and compared with the program the current config would generate for it:
+machine is the matched preset, drift a JSON object {field: [in file, from
+config]} and drift_count its size. Query it with any SQLite client, e.g.
+
+    sqlite3 warmup_index.sqlite "SELECT machine, path, drift FROM programs WHERE drift_count > 0"
+
+Files are hashed and parsed in a process pool, each read through mmap so
+large trees do not go through Python file buffers. Rerunning is incremental:
+files whose size and mtime are unchanged are not read again and rows of
+files that disappeared are removed. Drift is recomputed for every row when
+the config (or inventory) changed since the last run, so a config edit shows
+up without rescanning; otherwise only the files just read are compared.
+
+Notes:
+Overlap and compact are run options rather than config, so the program a
+file is compared with uses the file's own. --idle-brackets programs (name
+suffix _IDLE30, label "... (idle <= 30 min)") match their machine and are
+compared with the program scaled by the config's idle_profile. The config's ramp shape
+("ramp", "dwell_taper", ...) is applied as in batch mode; --inventory
+compares against an inventory file's machines (cnc_warmup.inventory)
+instead of the config presets. The index is a cache of the scanned trees:
+it is rebuilt from scratch when its schema changes.
+
+"""
+
+DEFAULT_DB = "warmup_index.sqlite"
+# Extensions the built-in generators write
+DEFAULT_EXTENSIONS = (".nc", ".h")
+# Files per pool task
+INDEX_CHUNK = 32
+# Bump when the programs table changes; older indexes are rebuilt
+_SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE programs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT,
+    controller TEXT,
+    program_name TEXT,
+    machine_label TEXT,
+    x_travel REAL,
+    y_travel REAL,
+    z_travel REAL,
+    start_feed REAL,
+    finish_feed REAL,
+    start_rpm REAL,
+    finish_rpm REAL,
+    steps INTEGER,
+    seconds_per_step INTEGER,
+    coolant INTEGER,
+    overlap INTEGER,
+    compact INTEGER,
+    verbatim INTEGER,
+    settings TEXT,
+    params TEXT,
+    error TEXT,
+    machine TEXT,
+    drift TEXT,
+    drift_count INTEGER
+);
+CREATE INDEX programs_machine ON programs (machine);
+CREATE INDEX programs_sha256 ON programs (sha256);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# Columns written by the scan, in order (machine and drift are filled afterwards)
+_SCAN_COLUMNS = (
+    "path", "size", "mtime_ns", "sha256", "controller", "program_name", "machine_label",
+    "x_travel", "y_travel", "z_travel", "start_feed", "finish_feed", "start_rpm", "finish_rpm",
+    "steps", "seconds_per_step", "coolant", "overlap", "compact", "verbatim", "settings", "params", "error",
+)
+
+
+# Totals reported at the end of an index run
+@dataclass
+class IndexSummary:
+    files: int = 0
+    scanned: int = 0  # new or changed files read this run
+    removed: int = 0
+    programs: int = 0  # rows that are warmup programs
+    unreadable: int = 0  # rows that are not
+    matched: int = 0
+    drifted: int = 0
+    seconds: float = 0.0
+
+    def format(self) -> str:
+        return (
+            f"Indexed {self.files} files in {self.seconds:.3f} s: {self.scanned} new or changed, "
+            f"{self.files - self.scanned} unchanged, {self.removed} removed\n"
+            f"{self.programs} warmup programs ({self.unreadable} other files), "
+            f"{self.matched} matched to a machine, {self.drifted} drifted from the config"
+        )
+
+
+def open_index(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path)
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version != _SCHEMA_VERSION:
+        db.execute("DROP TABLE IF EXISTS programs")
+        db.execute("DROP TABLE IF EXISTS meta")
+        db.executescript(_SCHEMA)
+        db.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+        db.commit()
+    return db
+
+
+# Lines of a mapped file, decoded lazily (the parser stops after the header)
+def _mapped_lines(mapped: mmap.mmap) -> Iterator[str]:
+    mapped.seek(0)
+    for raw in iter(mapped.readline, b""):
+        yield raw.decode("utf-8", "replace")
+
+
+# Scan columns for a recovered program
+def _program_columns(program: RecoveredProgram, digest: str) -> Dict[str, Any]:
+    settings = program.settings()
+    verbatim = None
+    params = None
+    if program.complete:
+        params = program.params()
+        regenerated = render_program(program.controller, params).encode("utf-8")
+        verbatim = hashlib.sha256(regenerated).hexdigest() == digest
+    return {
+        "controller": program.controller,
+        "program_name": program.program_name,
+        "machine_label": program.machine_label,
+        "x_travel": settings["x_travel"],
+        "y_travel": settings["y_travel"],
+        "z_travel": settings["z_travel"],
+        "start_feed": settings["start_feed_mm_min"],
+        "finish_feed": settings["finish_feed_mm_min"],
+        "start_rpm": settings.get("start_rpm"),
+        "finish_rpm": settings.get("finish_rpm"),
+        "steps": settings.get("steps"),
+        "seconds_per_step": settings.get("seconds_per_step"),
+        "coolant": program.include_coolant,
+        "overlap": program.overlap,
+        "compact": program.compact,
+        "verbatim": verbatim,
+        "settings": json.dumps(settings, sort_keys=True),
+        "params": json.dumps(params, sort_keys=True) if params is not None else None,
+    }
+
+
+# Hash and parse one file. Module-level so it can be pickled into pool workers.
+def index_file(path: str) -> Tuple[Any, ...]:
+    row: Dict[str, Any] = {"path": path, "size": 0, "mtime_ns": 0}
+    try:
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            row.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            if not stat.st_size:
+                row.update(sha256=hashlib.sha256().hexdigest(), error="empty file")
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    row["sha256"] = hashlib.sha256(mapped).hexdigest()
+                    row.update(_program_columns(recover_lines(_mapped_lines(mapped)), row["sha256"]))
+    except (OSError, ValueError) as exc:
+        # RecoverError is a ValueError: the file is not a warmup program
+        row["error"] = str(exc) if isinstance(exc, RecoverError) else f"{type(exc).__name__}: {exc}"
+    return tuple(row.get(column) for column in _SCAN_COLUMNS)
+
+
+def _index_chunk(paths: List[str]) -> List[Tuple[Any, ...]]:
+    return [index_file(path) for path in paths]
+
+
+# Program files under the roots: absolute path -> (size, mtime_ns)
+def find_programs(roots: Sequence[str], extensions: Sequence[str] = DEFAULT_EXTENSIONS) -> Dict[str, Tuple[int, int]]:
+    suffixes = tuple(ext.lower() for ext in extensions)
+    found: Dict[str, Tuple[int, int]] = {}
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(root)):
+            dirnames.sort()
+            for name in sorted(filenames):
+                if not name.lower().endswith(suffixes):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_size, stat.st_mtime_ns)
+    return found
+
+
+# True if path is one of roots or inside one
+def _under(path: str, roots: Sequence[str]) -> bool:
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep) for root in roots)
+
+
+# Hash and parse the files that are new or changed since the last run, in parallel.
+# Returns the summary so far and the paths read.
+def scan(
+    db: sqlite3.Connection,
+    roots: Sequence[str],
+    workers: int = 0,
+    extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+    rescan: bool = False,
+) -> Tuple[IndexSummary, List[str]]:
+    roots = [os.path.abspath(root) for root in roots]
+    found = find_programs(roots, extensions)
+    known = {path: (size, mtime) for path, size, mtime in db.execute("SELECT path, size, mtime_ns FROM programs")}
+    todo = [path for path, stamp in found.items() if rescan or known.get(path) != stamp]
+    gone = [(path,) for path in known if path not in found and _under(path, roots)]
+
+    insert = (
+        f"INSERT OR REPLACE INTO programs ({', '.join(_SCAN_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in _SCAN_COLUMNS)})"
+    )
+    chunks = [todo[i : i + INDEX_CHUNK] for i in range(0, len(todo), INDEX_CHUNK)]
+    workers = max(1, min(workers if workers > 0 else (os.cpu_count() or 1), len(chunks) or 1))
+    with db:
+        if workers == 1:
+            for chunk in chunks:
+                db.executemany(insert, _index_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for rows in pool.map(_index_chunk, chunks):
+                    db.executemany(insert, rows)
+        db.executemany("DELETE FROM programs WHERE path = ?", gone)
+    return IndexSummary(files=len(found), scanned=len(todo), removed=len(gone)), todo
+
+
+# Resolve programs to machines: by label, else by the slug ending the program name
+class MachineMatcher:
+    def __init__(self, machines: Mapping[str, Any]) -> None:
+        self.machines = machines
+        self._labels = {name.lower(): name for name in machines}
+        self._slugs: Dict[str, str] = {}
+        for name in machines:
+            self._slugs.setdefault(machine_slug(name), name)
+
+    def match(self, program_name: str, machine_label: Optional[str]) -> Optional[str]:
+        if machine_label:
+            name = self._labels.get(machine_label.strip().lower())
+            if name is not None:
+                return name
+        return self._slugs.get(str(program_name).upper().rsplit("_", 1)[-1])
+
+    # (machine, idle bracket minutes or None): --idle-brackets programs match
+    # the machine of the full program they were derived from
+    def match_program(self, program_name: str, machine_label: Optional[str]) -> Tuple[Optional[str], Optional[float]]:
+        base_name, base_label, minutes = split_bracket(str(program_name), machine_label)
+        if minutes is not None:
+            name = self.match(base_name, base_label)
+            if name is not None:
+                return name, minutes
+        return self.match(program_name, machine_label), None
+
+
+# Header settings of the program the config generates for a machine, or for
+# one of its idle brackets (scaled by the profile in batch mode's order)
+def expected_settings(
+    machine: Any,
+    controller: str,
+    defaults: Mapping[str, Any],
+    ramp: Mapping[str, Any],
+    overlap: bool,
+    idle_minutes: Optional[float] = None,
+    profile: Optional[IdleProfile] = None,
+) -> Dict[str, Any]:
+    job = next(iter_jobs([machine], defaults, [controller], ""))
+    params = job.params
+    if idle_minutes is None:
+        params = apply_ramp(params, ramp)
+    elif ramp["shape"] == "table":
+        params = (profile or IdleProfile()).apply(apply_ramp(params, ramp), idle_minutes)
+    else:
+        params = apply_ramp((profile or IdleProfile()).apply(params, idle_minutes), ramp)
+    params["overlap"] = overlap
+    return recover_text(render_program(controller, params)).settings()
+
+
+def _same(a: Any, b: Any) -> bool:
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+# {field: [found, expected]} for every field that differs
+def compare_settings(found: Mapping[str, Any], expected: Mapping[str, Any]) -> Dict[str, List[Any]]:
+    return {
+        key: [found.get(key), expected.get(key)]
+        for key in sorted(set(found) | set(expected))
+        if not _same(found.get(key), expected.get(key))
+    }
+
+
+def _expected_chunk(
+    items: List[Tuple[Any, str, bool, Optional[float]]],
+    defaults: Mapping[str, Any],
+    ramp: Mapping[str, Any],
+    profile: Optional[IdleProfile] = None,
+) -> List[Dict[str, Any]]:
+    return [
+        expected_settings(machine, controller, defaults, ramp, overlap, minutes, profile)
+        for machine, controller, overlap, minutes in items
+    ]
+
+
+# Match indexed programs (all, or only those at paths) to a machine and store
+# their drift from the config. The expected programs are rendered in parallel.
+def update_drift(
+    db: sqlite3.Connection,
+    machines: Mapping[str, Any],
+    defaults: Mapping[str, Any],
+    ramp: Mapping[str, Any],
+    paths: Optional[Collection[str]] = None,
+    workers: int = 0,
+    profile: Optional[IdleProfile] = None,
+) -> None:
+    matcher = MachineMatcher(machines)
+    rows = []
+    wanted: Dict[Tuple[str, str, bool, Optional[float]], int] = {}
+    query = "SELECT path, controller, program_name, machine_label, overlap, settings FROM programs WHERE error IS NULL"
+    for path, controller, program_name, label, overlap, settings in db.execute(query):
+        if paths is not None and path not in paths:
+            continue
+        name, minutes = matcher.match_program(program_name, label)
+        key = (name, controller, bool(overlap), minutes) if name is not None else None
+        if key is not None:
+            wanted.setdefault(key, len(wanted))
+        rows.append((path, key, settings))
+
+    items = [(machines[name], controller, overlap, minutes) for name, controller, overlap, minutes in wanted]
+    chunks = [items[i : i + INDEX_CHUNK] for i in range(0, len(items), INDEX_CHUNK)]
+    workers = max(1, min(workers if workers > 0 else (os.cpu_count() or 1), len(chunks) or 1))
+    if workers == 1:
+        results = [_expected_chunk(chunk, defaults, ramp, profile) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            n = len(chunks)
+            results = list(pool.map(_expected_chunk, chunks, [defaults] * n, [ramp] * n, [profile] * n))
+    expected = [settings for chunk in results for settings in chunk]
+
+    updates = []
+    for path, key, settings in rows:
+        if key is None:
+            updates.append((None, None, None, path))
+            continue
+        name, controller, _, _ = key
+        drift = compare_settings(json.loads(settings), expected[wanted[key]])
+        preset = getattr(machines[name], "preset", machines[name])
+        if preset.controller and preset.controller != controller:
+            drift["controller"] = [controller, preset.controller]
+        updates.append((name, json.dumps(drift, sort_keys=True), len(drift), path))
+    db.executemany("UPDATE programs SET machine = ?, drift = ?, drift_count = ? WHERE path = ?", updates)
+
+
+# Fingerprint of what drift is computed against; source names the machines
+# (config content, inventory file stamp)
+def drift_stamp(
+    source: str, defaults: Mapping[str, Any], ramp: Mapping[str, Any], profile: Optional[IdleProfile] = None
+) -> str:
+    text = json.dumps([GENERATOR_VERSION, source, defaults, ramp, profile], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Scan the roots into the index at db_path and compare the programs with the
+# config. Drift is recomputed for every row when the drift stamp changed
+# (or source is empty), else only for the files read this run.
+def build_index(
+    roots: Sequence[str],
+    db_path: str,
+    machines: Mapping[str, Any],
+    defaults: Mapping[str, Any],
+    ramp: Optional[Mapping[str, Any]] = None,
+    workers: int = 0,
+    extensions: Sequence[str] = DEFAULT_EXTENSIONS,
+    rescan: bool = False,
+    source: str = "",
+    profile: Optional[IdleProfile] = None,
+) -> IndexSummary:
+    started = time.perf_counter()
+    ramp = ramp or ramp_settings(defaults)
+    stamp = drift_stamp(source, defaults, ramp, profile) if source else ""
+    db = open_index(db_path)
+    try:
+        summary, scanned = scan(db, roots, workers, extensions, rescan)
+        previous = db.execute("SELECT value FROM meta WHERE key = 'drift_stamp'").fetchone()
+        with db:
+            changed = set(scanned) if stamp and previous == (stamp,) else None
+            update_drift(db, machines, defaults, ramp, changed, workers, profile)
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('drift_stamp', ?)", (stamp,))
+        summary.programs, summary.unreadable, summary.matched, summary.drifted = db.execute(
+            "SELECT COUNT(*) - COUNT(error), COUNT(error), COUNT(machine), COUNT(drift_count > 0 OR NULL) FROM programs"
+        ).fetchone()
+    finally:
+        db.close()
+    summary.seconds = time.perf_counter() - started
+    return summary
+
+
+# Report lines for --list
+def list_rows(db_path: str, what: str) -> Iterator[str]:
+    db = sqlite3.connect(db_path)
+    try:
+        if what == "drift":
+            query = "SELECT path, machine, drift FROM programs WHERE drift_count > 0 ORDER BY machine, path"
+            for path, machine, drift in db.execute(query):
+                fields = "; ".join(f"{k}: {v[0]} -> {v[1]}" for k, v in json.loads(drift).items())
+                yield f"{path}  [{machine}]  {fields}"
+        elif what == "unmatched":
+            query = "SELECT path, program_name FROM programs WHERE error IS NULL AND machine IS NULL ORDER BY path"
+            for path, program_name in db.execute(query):
+                yield f"{path}  ({program_name})"
+        else:
+            for path, error in db.execute("SELECT path, error FROM programs WHERE error IS NOT NULL ORDER BY path"):
+                yield f"{path}  {error}"
+    finally:
+        db.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m cnc_warmup index", description="Index existing warmup programs and their drift from the config"
+    )
+    parser.add_argument("dirs", nargs="+", metavar="DIR", help="Directories to scan")
+    parser.add_argument("--db", default=DEFAULT_DB, help=f"SQLite index file (default {DEFAULT_DB})")
+    parser.add_argument("--config", default=None, help="Config file (defaults to config/warmup_config.json)")
+    parser.add_argument("--inventory", default="", help="Compare against the machines of an inventory file")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes (defaults to CPU count)")
+    parser.add_argument(
+        "--ext", action="append", default=None, help="File extension to index (repeatable, default .nc and .h)"
+    )
+    parser.add_argument("--rescan", action="store_true", help="Read every file, even if unchanged")
+    parser.add_argument(
+        "--list", choices=("drift", "unmatched", "errors"), action="append", default=[], help="Print these rows"
+    )
+    args = parser.parse_args(argv)
+
+    for d in args.dirs:
+        if not os.path.isdir(d):
+            parser.error(f"not a directory: {d}")
+    try:
+        config = load_config(args.config)
+        defaults = get_defaults(config)
+        if args.inventory:
+            from .inventory import iter_inventory
+
+            machines: Mapping[str, Any] = {row.preset.name: row for row in iter_inventory(args.inventory)}
+            stat = os.stat(args.inventory)
+            source = f"{os.path.abspath(args.inventory)}:{stat.st_size}:{stat.st_mtime_ns}"
+        else:
+            machines = get_machine_index(config)
+            source = json.dumps(config.get("machines", {}), sort_keys=True, default=str)
+        summary = build_index(
+            args.dirs,
+            args.db,
+            machines,
+            defaults,
+            ramp_settings(defaults),
+            args.jobs,
+            [ext if ext.startswith(".") else "." + ext for ext in args.ext or DEFAULT_EXTENSIONS],
+            args.rescan,
+            source,
+            IdleProfile.from_config(config),
+        )
+    except (OSError, ValueError, sqlite3.Error) as exc:
+        print(f"Index failed: {exc}", file=sys.stderr)
+        sys.exit(1)
+    for what in args.list:
+        for line in list_rows(args.db, what):
+            print(line)
+    print(summary.format())
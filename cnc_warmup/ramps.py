@@ -0,0 +1,154 @@
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+"""
+
+Spindle and feed ramp shapes.
+
+Both generators ramp linearly by default: evenly spaced RPM steps with the
+same dwell at each, and four evenly spaced axis feeds. A ramp shape turns the
+start/finish values into explicit per-step tables instead, which the
+generators emit as #301.. (Fanuc, read with #[300 + step]) or Q301..
+(TNC, unrolled TOOL CALL / DWELL blocks) variables.
+
+Shapes (t runs 0..1 over the steps):
+
+- linear: t, same spacing as the default programs.
+- geometric: constant RPM ratio between steps, so more steps at low speed.
+- s-curve: smoothstep 3t^2 - 2t^3; gentle entry and approach to the top.
+- table: explicit [[rpm, seconds], ...] pairs from the config ("ramp_table"),
+  with an optional four-entry "feed_table".
+
+dwell_taper shortens the dwell towards the top of the ramp: step dwell is
+seconds_per_step * (1 - dwell_taper * u), u being the step's position in the
+RPM span, so the last step dwells (1 - dwell_taper) * seconds_per_step. A
+bearing that reached temperature at low speed needs less time near the top,
+so this is where total time is saved. Non-linear shapes default to 0.5.
+
+Notes:
+The linear shape with no taper keeps the default loop programs (no tables).
+--target-minutes sizes steps and dwell before the taper, so a tapered program
+finishes early; the estimate reflects the tapered dwells.
+
+"""
+
+SHAPES = ("linear", "geometric", "s-curve", "table")
+# Table variables are #301-#350 / Q301-Q350 (RPM) and #401-#450 / Q401-Q450 (dwell)
+MAX_RAMP_STEPS = 50
+# Axis feed steps both generators use
+FEED_STEPS = 4
+# dwell_taper when the config does not set one
+DEFAULT_TAPER = {"linear": 0.0, "geometric": 0.5, "s-curve": 0.5, "table": 0.0}
+
+
+# Position (0..1) of each of n steps along the ramp for a shape
+def _positions(shape: str, n: int, start: float, finish: float) -> List[float]:
+    if n == 1:
+        return [1.0]
+    ts = [i / (n - 1) for i in range(n)]
+    if shape == "linear":
+        return ts
+    if shape == "s-curve":
+        return [t * t * (3.0 - 2.0 * t) for t in ts]
+    if shape == "geometric":
+        if start <= 0 or finish <= 0 or start == finish:
+            return ts
+        return [(start * (finish / start) ** t - start) / (finish - start) for t in ts]
+    raise ValueError(f"Unknown ramp shape: {shape}")
+
+
+# Per-step (rpm, dwell seconds) for a shaped spindle ramp from start_rpm to finish_rpm
+def spindle_ramp(
+    shape: str,
+    steps: int,
+    start_rpm: float,
+    finish_rpm: float,
+    seconds_per_step: int,
+    dwell_taper: float = 0.0,
+) -> Tuple[Tuple[float, int], ...]:
+    n = max(1, int(steps))
+    if n > MAX_RAMP_STEPS:
+        raise ValueError(f"Ramp shapes support at most {MAX_RAMP_STEPS} RPM steps")
+    if not 0.0 <= dwell_taper < 1.0:
+        raise ValueError("dwell_taper must be in [0, 1)")
+    seconds = max(0, int(seconds_per_step))
+    ramp = []
+    for u in _positions(shape, n, float(start_rpm), float(finish_rpm)):
+        rpm = float(round(start_rpm + (finish_rpm - start_rpm) * u))
+        ramp.append((rpm, int(round(seconds * (1.0 - dwell_taper * u)))))
+    return tuple(ramp)
+
+
+# FEED_STEPS axis feeds for a shaped feed ramp
+def feed_ramp(shape: str, start_feed: float, finish_feed: float) -> Tuple[float, ...]:
+    positions = _positions(shape, FEED_STEPS, float(start_feed), float(finish_feed))
+    return tuple(round(start_feed + (finish_feed - start_feed) * u, 3) for u in positions)
+
+
+# Validate a config "ramp_table": [[rpm, seconds], ...]
+def table_ramp(table: Sequence[Any]) -> Tuple[Tuple[float, int], ...]:
+    try:
+        ramp = tuple((float(rpm), int(seconds)) for rpm, seconds in table)
+    except (TypeError, ValueError):
+        raise ValueError("ramp_table must be a list of [rpm, seconds] pairs") from None
+    if not ramp:
+        raise ValueError("ramp_table is empty")
+    if len(ramp) > MAX_RAMP_STEPS:
+        raise ValueError(f"ramp_table supports at most {MAX_RAMP_STEPS} steps")
+    if any(rpm <= 0 or seconds < 0 for rpm, seconds in ramp):
+        raise ValueError("ramp_table RPMs must be positive and dwells non-negative")
+    return ramp
+
+
+# Ramp settings: the --ramp/--dwell-taper flags over the config defaults
+# ("ramp", "dwell_taper", "ramp_table", "feed_table")
+def ramp_settings(defaults: Mapping[str, Any], shape: Optional[str] = None, taper: Optional[float] = None) -> Dict[str, Any]:
+    shape = shape or str(defaults.get("ramp", "linear"))
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown ramp shape: {shape} (choose from {', '.join(SHAPES)})")
+    if taper is None:
+        taper = float(defaults.get("dwell_taper", DEFAULT_TAPER[shape]))
+    if not 0.0 <= taper < 1.0:
+        raise ValueError("dwell_taper must be in [0, 1)")
+    settings: Dict[str, Any] = {"shape": shape, "dwell_taper": taper}
+    if shape == "table":
+        settings["table"] = table_ramp(defaults.get("ramp_table") or [])
+        feeds = defaults.get("feed_table")
+        if feeds:
+            if len(feeds) != FEED_STEPS or any(float(f) <= 0 for f in feeds):
+                raise ValueError(f"feed_table must hold {FEED_STEPS} positive feeds")
+            settings["feed_table"] = tuple(float(f) for f in feeds)
+    return settings
+
+
+# Add spindle_ramp/feed_ramp tables to generate_program arguments. The plain
+# linear ramp adds nothing, so the default loop programs are unchanged.
+# start/finish RPM are set to the table's range and start/finish feed to its
+# ends, as used by the program headers, estimates and the validator.
+def apply_ramp(params: Mapping[str, Any], settings: Mapping[str, Any]) -> Dict[str, Any]:
+    shape = settings["shape"]
+    taper = float(settings.get("dwell_taper", 0.0))
+    result = dict(params)
+    if shape == "linear" and not taper:
+        return result
+    if shape == "table":
+        spindle = settings["table"]
+        if taper:
+            top = max(rpm for rpm, _ in spindle)
+            low = min(rpm for rpm, _ in spindle)
+            span = (top - low) or 1.0
+            spindle = tuple((rpm, int(round(s * (1.0 - taper * (rpm - low) / span)))) for rpm, s in spindle)
+        feeds = settings.get("feed_table")
+    else:
+        spindle = spindle_ramp(
+            shape, params["steps"], params["start_rpm"], params["finish_rpm"], params["seconds_per_step"], taper
+        )
+        feeds = feed_ramp(shape, params["start_feed_mm_min"], params["finish_feed_mm_min"]) if shape != "linear" else None
+    result["spindle_ramp"] = spindle
+    result["steps"] = len(spindle)
+    result["start_rpm"] = min(rpm for rpm, _ in spindle)
+    result["finish_rpm"] = max(rpm for rpm, _ in spindle)
+    if feeds:
+        result["feed_ramp"] = tuple(feeds)
+        result["start_feed_mm_min"] = feeds[0]
+        result["finish_feed_mm_min"] = feeds[-1]
+    return result
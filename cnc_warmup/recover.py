@@ -0,0 +1,277 @@
+import io
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+"""
+
+Reverse parser: recover generate_program arguments from a warmup program.
+
+Programs written by this tool (or by earlier versions of it) carry every
+parameter in their config header, before the first motion block:
+
+- Fanuc 31i: the O header "O0001 (NAME)", the machine label comment, and the
+  #100-#107 limits, #120/#121 feeds, #200-#203 spindle ramp (or the #202 /
+  #301.. / #401.. ramp table), #361-#364 feed table and #371-#378 overlap speeds;
+- TNC 640: "BEGIN PGM NAME MM", the "; MACHINE:" comment, and Q1-Q6 limits,
+  Q10/Q11 feeds, Q20-Q23 spindle ramp (or the Q301.. / Q401.. table), Q361-Q364
+  feed table and Q371-Q378 overlap speeds.
+
+Only the header is read (recover_lines stops at the first motion block), so
+recovering a program costs the same whatever its length. Both normal and
+compact output are understood; compact programs have no machine label.
+
+Travels come back from the limits (Fanuc: #101 - #100, #103 - #102, -#107;
+TNC: Q2, Q4, -Q6). Ramp tables give start/finish RPM as their range and
+seconds_per_step as the lowest step's dwell, as cnc_warmup.ramps sets them.
+
+Notes:
+Overlapped programs (--overlap) only hold the speed per axis pass and the
+residual ramp, not the spindle ramp they were scheduled from, so their
+spindle arguments cannot be recovered: they are returned incomplete, with
+the per-pass speeds and the residual table instead. The Fanuc linear ramp
+stores max(2, steps) and the TNC one max(1, steps), and table speeds are
+stored as whole RPM, so those come back as the program runs them.
+
+"""
+
+# Header blocks read before giving up on a file that never reaches a motion block
+MAX_HEADER_LINES = 400
+# Controllers the reverse parser understands
+RECOVERABLE_CONTROLLERS = ("fanuc31i", "tnc640")
+
+
+class RecoverError(ValueError):
+    pass
+
+
+# What a program header holds. settings() is the comparable view used for drift.
+@dataclass
+class RecoveredProgram:
+    controller: str
+    program_name: str
+    machine_label: Optional[str]  # None for compact or unlabeled programs
+    compact: bool
+    include_coolant: bool
+    overlap: bool
+    values: Dict[int, float] = field(default_factory=dict)  # header assignments: variable number -> value
+
+    # True when params() regenerates the program (everything but overlap programs)
+    @property
+    def complete(self) -> bool:
+        return not self.overlap
+
+    # Travels and feeds, the same for every program
+    def _common(self) -> Dict[str, Any]:
+        v = self.values
+        if self.controller == "fanuc31i":
+            travels = (v[101] - v[100], v[103] - v[102], -v[107])
+            feeds = (v[120], v[121])
+        else:
+            travels = (v[2], v[4], -v[6])
+            feeds = (v[10], v[11])
+        table = tuple(v[360 + k] for k in range(1, 5)) if 361 in v else None
+        return {
+            "x_travel": travels[0],
+            "y_travel": travels[1],
+            "z_travel": travels[2],
+            "start_feed_mm_min": feeds[0],
+            "finish_feed_mm_min": feeds[1],
+            "feed_ramp": table,
+        }
+
+    # Ramp table rows the header declares (Fanuc: #202, TNC: the Q301.. run), or 0
+    def table_steps(self) -> int:
+        v = self.values
+        if self.controller == "fanuc31i":
+            return max(0, int(v.get(202, 0))) if 301 in v else 0
+        count = 0
+        while 301 + count in v:
+            count += 1
+        return count
+
+    # (rpm, dwell) ramp table (#301../#401.. or Q301../Q401..), or ()
+    def ramp_table(self) -> Tuple[Tuple[float, int], ...]:
+        v = self.values
+        return tuple((v[300 + k], int(v[400 + k])) for k in range(1, self.table_steps() + 1))
+
+    # Spindle speed held during each axis pass (overlap programs), or ()
+    def overlap_rpm(self) -> Tuple[float, ...]:
+        return tuple(self.values[370 + k] for k in range(1, 9)) if self.overlap else ()
+
+    # generate_program keyword arguments, rendering options included.
+    # Raises RecoverError for an incomplete (overlap) program.
+    def params(self) -> Dict[str, Any]:
+        if not self.complete:
+            raise RecoverError(f"{self.program_name}: overlapped program, spindle ramp not recoverable")
+        v = self.values
+        params = self._common()
+        table = self.ramp_table()
+        if table:
+            low = min(table, key=lambda step: step[0])
+            params.update(
+                steps=len(table),
+                start_rpm=low[0],
+                finish_rpm=max(rpm for rpm, _ in table),
+                seconds_per_step=low[1],
+                spindle_ramp=table,
+            )
+        else:
+            base = 200 if self.controller == "fanuc31i" else 20
+            params.update(
+                start_rpm=v[base],
+                finish_rpm=v[base + 1],
+                steps=int(v[base + 2]),
+                seconds_per_step=int(v[base + 3]),
+                spindle_ramp=None,
+            )
+        params.update(
+            include_coolant=self.include_coolant,
+            overlap=False,
+            program_name=self.program_name,
+            machine_label=self.machine_label,
+            compact=self.compact,
+        )
+        return params
+
+    # Everything the header says about the warmup itself, comparable between
+    # two programs: travels, feeds, spindle, coolant and the overlap tables.
+    # Tables are lists, so the result is JSON-ready.
+    def settings(self) -> Dict[str, Any]:
+        settings = self._common()
+        if self.complete:
+            params = self.params()
+            for key in ("start_rpm", "finish_rpm", "steps", "seconds_per_step", "spindle_ramp"):
+                settings[key] = params[key]
+        else:
+            settings["overlap_rpm"] = self.overlap_rpm()
+            settings["residual_ramp"] = self.ramp_table() or None
+        settings["include_coolant"] = self.include_coolant
+        settings["overlap"] = self.overlap
+        return {
+            key: [list(item) if isinstance(item, tuple) else item for item in value]
+            if isinstance(value, tuple)
+            else value
+            for key, value in settings.items()
+        }
+
+
+_NUMBER = r"([-+]?\d+(?:\.\d*)?)"
+_FANUC_NAME = re.compile(r"^O\d+\s*\((.*)\)$")
+_FANUC_LABEL = re.compile("^\\(FANUC 31I \u2022 UNITS: MM(?: \u2022 (.*))?\\)$")
+_FANUC_ASSIGN = re.compile(r"^#(\d+)\s*=\s*" + _NUMBER + r"\s*(?:\(.*\))?$")
+_TNC_BLOCK = re.compile(r"^\d+(\s+)(.*)$")
+_TNC_BEGIN = re.compile(r"^BEGIN PGM (\S+) MM$")
+_TNC_LABEL = re.compile(r"^; MACHINE: (.*)$")
+_TNC_ASSIGN = re.compile(r"^Q(\d+)\s*=\s*" + _NUMBER + r"\s*(?:;.*)?$")
+
+# Header variables every program has
+_REQUIRED = {
+    "fanuc31i": (100, 101, 102, 103, 107, 120, 121),
+    "tnc640": (2, 4, 6, 10, 11),
+}
+# Linear spindle ramp variables (programs without a ramp table or overlap)
+_LINEAR = {"fanuc31i": (200, 201, 202, 203), "tnc640": (20, 21, 22, 23)}
+
+
+def _recover_fanuc(lines: Iterator[str]) -> RecoveredProgram:
+    name_line = next(lines, "").strip()
+    match = _FANUC_NAME.match(name_line)
+    if match is None:
+        raise RecoverError(f"expected an O header after %, got {name_line[:40]!r}")
+    label: Optional[str] = None
+    compact = True
+    coolant = False
+    values: Dict[int, float] = {}
+    for count, line in enumerate(lines):
+        text = line.strip()
+        code = text.split("(", 1)[0]
+        if "G53" in code or code.startswith("WHILE") or count > MAX_HEADER_LINES:
+            break
+        if text[:1] == "#":
+            assign = _FANUC_ASSIGN.match(text)
+            if assign is not None:
+                values[int(assign.group(1))] = float(assign.group(2))
+                compact = compact and " " not in text
+            continue
+        if text.startswith("(FANUC"):
+            heading = _FANUC_LABEL.match(text)
+            if heading is not None:
+                label = heading.group(1)
+                compact = False
+        elif code.strip() == "M08":
+            coolant = True
+    return RecoveredProgram("fanuc31i", match.group(1).strip(), label, compact, coolant, 371 in values, values)
+
+
+def _recover_tnc(first: str, lines: Iterator[str]) -> RecoveredProgram:
+    block = _TNC_BLOCK.match(first)
+    match = _TNC_BEGIN.match(block.group(2).strip()) if block else None
+    if block is None or match is None:
+        raise RecoverError(f"expected BEGIN PGM, got {first[:40]!r}")
+    # Normal output pads block numbers below 10 to two spaces; compact uses one
+    compact = block.group(1) == " "
+    label: Optional[str] = None
+    coolant = False
+    values: Dict[int, float] = {}
+    for count, line in enumerate(lines):
+        number, _, text = line.strip().partition(" ")
+        if not number.isdigit():
+            continue
+        text = text.strip()
+        if text.startswith("L ") or text.startswith("LBL") or count > MAX_HEADER_LINES:
+            break
+        if text[:1] == "Q":
+            assign = _TNC_ASSIGN.match(text)
+            if assign is not None:
+                values[int(assign.group(1))] = float(assign.group(2))
+            continue
+        if text[:1] == ";":
+            heading = _TNC_LABEL.match(text)
+            if heading is not None:
+                label = heading.group(1).strip()
+        elif text.split(";", 1)[0].split() == ["M8"]:
+            coolant = True
+    return RecoveredProgram("tnc640", match.group(1), label, compact, coolant, 371 in values, values)
+
+
+def _check(program: RecoveredProgram) -> RecoveredProgram:
+    v = program.values
+    required: List[int] = list(_REQUIRED[program.controller])
+    if program.overlap:
+        required += [370 + k for k in range(1, 9)]
+    # Every table row needs its RPM and its dwell (hand-edited headers may not)
+    steps = program.table_steps()
+    for k in range(1, steps + 1):
+        required += [300 + k, 400 + k]
+    if not program.overlap and not steps:
+        required += _LINEAR[program.controller]
+    missing = [k for k in required if k not in v]
+    if missing:
+        prefix = "#" if program.controller == "fanuc31i" else "Q"
+        raise RecoverError(f"{program.program_name}: header is missing {', '.join(prefix + str(k) for k in missing)}")
+    return program
+
+
+# Recover a program from its lines (only the header is consumed)
+def recover_lines(lines: Iterable[str]) -> RecoveredProgram:
+    it = iter(lines)
+    first = ""
+    for line in it:
+        first = line.strip()
+        if first:
+            break
+    if first == "%":
+        return _check(_recover_fanuc(it))
+    if _TNC_BLOCK.match(first):
+        return _check(_recover_tnc(first, it))
+    raise RecoverError(f"not a Fanuc or TNC warmup program (starts with {first[:40]!r})")
+
+
+def recover_text(text: str) -> RecoveredProgram:
+    return recover_lines(io.StringIO(text))
+
+
+def recover_file(path: str) -> RecoveredProgram:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return recover_lines(f)
@@ -0,0 +1,136 @@
+import math
+from dataclasses import dataclass
+from typing import Any, List, Mapping, Tuple
+
+"""
+
+Overlapped spindle/axis warmup schedule.
+
+Normally the spindle stays stopped through the Z and XY passes and then runs
+its ramp with dwells. In overlapped mode it is started before the first axis
+pass and its RPM steps are paired with the eight axis passes (four Z, then
+four XY, in feed order), so traverse time counts towards the dwell budget.
+
+The schedule walks the passes in order with the current RPM step. Before
+each pass, if the current step already has its full dwell, the next step
+begins. Time spent in a pass is credited only to the step held during it, so
+every step still gets at least its dwell at its own speed: the same thermal
+exposure as the sequential program. Whatever dwell the passes do not cover
+is run afterwards as usual (the residual ramp).
+
+Pass times follow cnc_warmup.estimate (feed moves only, rapids excluded).
+
+Notes:
+The spindle steps are those the sequential program would run: the
+spindle_ramp table if one is given (cnc_warmup.ramps), otherwise the
+generator's linear ramp (Fanuc: max(2, steps) speeds from start_rpm; TNC:
+max(1, steps) increments above start_rpm).
+
+"""
+
+# Axis passes: four Z passes, then four XY passes. The generators hold the
+# spindle speed for each in #371-#378 (Fanuc) / Q371-Q378 (TNC).
+AXIS_PASSES = 8
+
+
+@dataclass(frozen=True)
+class OverlapSchedule:
+    pass_labels: Tuple[str, ...]  # "Z1".."Z4", "XY1".."XY4"
+    pass_feeds: Tuple[float, ...]
+    pass_seconds: Tuple[float, ...]
+    pass_rpm: Tuple[float, ...]  # spindle speed held during each pass
+    steps: Tuple[Tuple[float, int], ...]  # sequential (rpm, dwell) steps
+    residual: Tuple[Tuple[float, int], ...]  # (rpm, dwell) still run after the passes
+
+    @property
+    def dwell_seconds(self) -> float:
+        return float(sum(d for _, d in self.steps))
+
+    @property
+    def residual_seconds(self) -> float:
+        return float(sum(d for _, d in self.residual))
+
+    @property
+    def saved_seconds(self) -> float:
+        return self.dwell_seconds - self.residual_seconds
+
+    def summary(self) -> str:
+        return (
+            f"spindle dwell {self.dwell_seconds:.0f} sec, {self.saved_seconds:.0f} sec during the "
+            f"axis passes, {self.residual_seconds:.0f} sec after"
+        )
+
+
+# The (rpm, dwell) steps the sequential program runs
+def spindle_steps(controller: str, params: Mapping[str, Any]) -> Tuple[Tuple[float, int], ...]:
+    ramp = params.get("spindle_ramp")
+    if ramp:
+        return tuple((float(rpm), max(0, int(dwell))) for rpm, dwell in ramp)
+    start = float(params["start_rpm"])
+    finish = float(params["finish_rpm"])
+    dwell = max(0, int(params["seconds_per_step"]))
+    if controller == "fanuc31i":
+        n = max(2, int(params["steps"]))
+        return tuple((float(math.floor(start + (finish - start) / (n - 1) * k)), dwell) for k in range(n))
+    n = max(1, int(params["steps"]))
+    return tuple((start + (finish - start) / n * k, dwell) for k in range(1, n + 1))
+
+
+# Feed of each of the four axis feed steps
+def _feeds(params: Mapping[str, Any]) -> List[float]:
+    ramp = params.get("feed_ramp")
+    if ramp:
+        return [float(f) for f in ramp]
+    start = float(params["start_feed_mm_min"])
+    finish = float(params["finish_feed_mm_min"])
+    return [start + (finish - start) / 3.0 * k for k in range(4)]
+
+
+# (label, feed, seconds) for each axis pass, in program order
+def axis_passes(controller: str, params: Mapping[str, Any]) -> List[Tuple[str, float, float]]:
+    x = abs(float(params["x_travel"]))
+    y = abs(float(params["y_travel"]))
+    z = abs(float(params["z_travel"]))
+    if controller == "fanuc31i":
+        z_dist = 2.0 * (z - min(z * 0.05, 10.0))
+        xy_dist = 4.0 * math.hypot(x, y)
+    elif controller == "tnc640":
+        z_dist = z
+        xy_dist = math.hypot(x, y)
+    else:
+        raise ValueError(f"Unknown controller: {controller}")
+    feeds = _feeds(params)
+    passes = []
+    for axis, dist in (("Z", z_dist), ("XY", xy_dist)):
+        for k, feed in enumerate(feeds, 1):
+            seconds = 60.0 * dist / feed if feed > 0 else math.inf
+            passes.append((f"{axis}{k}", feed, seconds))
+    return passes
+
+
+def overlap_schedule(controller: str, params: Mapping[str, Any]) -> OverlapSchedule:
+    steps = spindle_steps(controller, params)
+    passes = axis_passes(controller, params)
+    i = 0
+    covered = 0.0
+    pass_rpm: List[float] = []
+    for _, _, seconds in passes:
+        if covered >= steps[i][1] and i < len(steps) - 1:
+            i += 1
+            covered = 0.0
+        pass_rpm.append(steps[i][0])
+        covered += seconds
+    residual: List[Tuple[float, int]] = []
+    left = steps[i][1] - covered
+    if left > 0:
+        residual.append((steps[i][0], int(math.ceil(left))))
+    residual.extend(steps[i + 1 :])
+    return OverlapSchedule(
+        pass_labels=tuple(label for label, _, _ in passes),
+        pass_feeds=tuple(feed for _, feed, _ in passes),
+        pass_seconds=tuple(seconds for _, _, seconds in passes),
+        pass_rpm=tuple(pass_rpm),
+        steps=steps,
+        residual=tuple(residual),
+    )
+
@@ -0,0 +1,357 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+from .app import _ConfigDefaults, _apply_config_defaults, _build_parser, _program_params
+from .generators import load_generator, render_program
+
+"""
+
+Local HTTP/JSON generator service.
+
+Run with:
+python -m cnc_warmup serve [--host 127.0.0.1] [--port 8765]
+
+POST /generate takes a JSON object whose keys are the CLI flag names (with or
+without the leading dashes, "-" or "_" separators), e.g.
+{"controller": "fanuc31i", "x_travel": 762, "y_travel": 508, "z_travel": 500,
+"coolant": true}. GET /generate?x-travel=762&... works too. The program is
+returned as text/plain with chunked transfer encoding; "estimate": true returns
+the cycle-time estimate instead. GET /stats reports request and cache counters.
+
+One process serves every request, so interpreter startup and config parsing are
+paid once. The config is still checked on every request (load_config is stat
+validated), so edits to warmup_config.json apply without a restart. Raw request
+values are memoized to their resolved parameters (skipping argparse and the
+solver) until the config changes, and responses are memoized per resolved
+parameter set in a size-bounded LRU.
+
+Notes:
+Batch and file output flags (--all-machines, --output, --output-dir, --jobs)
+are rejected; use the CLI for those. The server binds to localhost by default
+and has no authentication.
+
+"""
+
+# Flags that only make sense for the CLI
+_CLI_ONLY = frozenset(
+    {
+        "help", "output", "batch", "output_dir", "jobs", "cache_dir", "cache_mb", "validate", "idle_brackets",
+        "metrics_out", "profile", "archive", "inventory", "unrolled",
+    }
+)
+
+# Size of each chunk written to the socket
+STREAM_CHUNK = 64 * 1024
+# Largest accepted request body
+MAX_BODY = 64 * 1024
+
+
+# Client error, reported as HTTP 400 with a JSON body
+class RequestError(ValueError):
+    pass
+
+
+# LRU of generated responses, bounded by entry count and total bytes
+class ResponseCache:
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Any, Tuple[bytes, str]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Any) -> Optional[Tuple[bytes, str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Any, body: bytes, note: str) -> None:
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(old[0])
+        self._entries[key] = (body, note)
+        self.bytes += len(body)
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+
+class GeneratorService:
+    def __init__(self, cache: ResponseCache) -> None:
+        self.cache = cache
+        self.parser = _build_parser()
+        self.parser.error = self._parser_error  # raise instead of exiting the server
+        self._actions = {a.dest: a for a in self.parser._actions}
+        # Raw request values -> resolved (controller, estimate, params, note), valid
+        # for one loaded config; skips argparse and the solver for repeat requests
+        self._resolved: "OrderedDict[Any, Tuple[str, bool, Dict[str, Any], str]]" = OrderedDict()
+        self._resolved_config: Optional[Dict[str, Any]] = None
+        self.started = time.time()
+        self.requests = 0
+        self.errors = 0
+
+    @staticmethod
+    def _parser_error(message: str) -> None:
+        raise RequestError(message)
+
+    # Request values (CLI flag names) -> argparse namespace with config defaults applied
+    def parse_values(self, values: Mapping[str, Any], defaults: _ConfigDefaults) -> Any:
+        argv: List[str] = []
+        switches: Dict[str, bool] = {}
+        for key, value in values.items():
+            dest = str(key).lstrip("-").replace("-", "_")
+            action = self._actions.get(dest)
+            if action is None or dest in _CLI_ONLY:
+                raise RequestError(f"Unknown or unsupported parameter: {key}")
+            if action.nargs == 0:
+                switches[dest] = _as_bool(value)
+            elif value is not None:
+                argv.append(f"{action.option_strings[0]}={value}")
+        args = self.parser.parse_args(argv)
+        for dest, value in switches.items():
+            setattr(args, dest, value)
+        _apply_config_defaults(args, defaults)
+        if args.x_travel is None or args.y_travel is None or args.z_travel is None:
+            raise RequestError("x_travel, y_travel and z_travel are required")
+        if args.target_minutes is not None and not 0 < args.target_minutes < float("inf"):
+            raise RequestError("target_minutes must be a positive number")
+        return args
+
+    # Request values -> (controller, estimate, generate_program params, solver note)
+    def resolve(self, values: Mapping[str, Any]) -> Tuple[str, bool, Dict[str, Any], str]:
+        defaults = _ConfigDefaults()
+        if defaults.config is not self._resolved_config:
+            # Config file changed (or first request): defaults may differ now
+            self._resolved.clear()
+            self._resolved_config = defaults.config
+        raw = tuple(sorted((str(k), repr(v)) for k, v in values.items()))
+        resolved = self._resolved.get(raw)
+        if resolved is not None:
+            self._resolved.move_to_end(raw)
+            return resolved
+
+        args = self.parse_values(values, defaults)
+        params, note = _program_params(args, defaults)
+        resolved = (args.controller, bool(args.estimate), params, note)
+        self._resolved[raw] = resolved
+        if len(self._resolved) > self.cache.max_entries:
+            self._resolved.popitem(last=False)
+        return resolved
+
+    # Resolve, then serve from the cache or generate. Returns (body, note, cache hit).
+    def render(self, values: Mapping[str, Any]) -> Tuple[bytes, str, bool]:
+        controller, estimate, params, note = self.resolve(values)
+        key = (controller, estimate, tuple(sorted(params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], True
+
+        if estimate:
+            from .estimate import estimate_cycle_time
+
+            text = estimate_cycle_time(controller, **params).format() + "\n"
+        else:
+            text = render_program(controller, params)
+        body = text.encode("utf-8")
+        self.cache.put(key, body, note)
+        return body, note, False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "cache_hits": self.cache.hits,
+            "cache_misses": self.cache.misses,
+            "cache_entries": len(self.cache),
+            "cache_bytes": self.cache.bytes,
+        }
+
+    # One connection; serves requests until the client closes or asks to close
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                keep_alive = _keep_alive(version, headers)
+                await self._dispatch(writer, method, target, version, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except RequestError as exc:
+            self.errors += 1
+            await _send(writer, "HTTP/1.1", 400, _json_body({"error": str(exc)}), "application/json", False)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _dispatch(
+        self, writer: asyncio.StreamWriter, method: str, target: str, version: str, body: bytes, keep_alive: bool
+    ) -> None:
+        self.requests += 1
+        url = urlsplit(target)
+        if url.path == "/stats" and method == "GET":
+            await _send(writer, version, 200, _json_body(self.stats()), "application/json", keep_alive)
+            return
+        if url.path != "/generate" or method not in ("GET", "POST"):
+            self.errors += 1
+            await _send(writer, version, 404, _json_body({"error": f"No route for {method} {url.path}"}),
+                        "application/json", keep_alive)
+            return
+
+        try:
+            if method == "POST":
+                values = json.loads(body or b"{}")
+                if not isinstance(values, dict):
+                    raise RequestError("Request body must be a JSON object")
+            else:
+                values = dict(parse_qsl(url.query))
+            payload, note, hit = self.render(values)
+        except (RequestError, ValueError) as exc:
+            self.errors += 1
+            await _send(writer, version, 400, _json_body({"error": str(exc)}), "application/json", keep_alive)
+            return
+        except Exception as exc:
+            # A bug, not a bad request: log it and keep the connection usable
+            self.errors += 1
+            print(f"Error serving {method} {target}: {exc!r}", file=sys.stderr)
+            await _send(writer, version, 500, _json_body({"error": "Internal server error"}),
+                        "application/json", keep_alive)
+            return
+
+        extra = {"X-Cache": "hit" if hit else "miss"}
+        # One note line per header: the solver's, then the idle profile's
+        for line in note.splitlines():
+            extra["X-Warmup-Idle" if line.startswith("Idle ") else "X-Warmup-Target"] = line
+        await _send(writer, version, 200, payload, "text/plain; charset=utf-8", keep_alive, extra)
+
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def _json_body(obj: Any) -> bytes:
+    return (json.dumps(obj) + "\n").encode("utf-8")
+
+
+def _keep_alive(version: str, headers: Mapping[str, str]) -> bool:
+    connection = headers.get("connection", "").lower()
+    if version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+# Parse one request; None on a clean close between requests
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, str, Dict[str, str], bytes]]:
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise RequestError("Malformed request line")
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0") or 0)
+    except ValueError:
+        raise RequestError("Bad Content-Length")
+    if length < 0:
+        raise RequestError("Bad Content-Length")
+    if length > MAX_BODY:
+        raise RequestError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version.upper(), headers, body
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 500: "Internal Server Error"}
+
+
+# Write a response; HTTP/1.1 bodies are streamed in chunks with flow control
+async def _send(
+    writer: asyncio.StreamWriter,
+    version: str,
+    status: int,
+    body: bytes,
+    content_type: str,
+    keep_alive: bool,
+    extra: Optional[Mapping[str, str]] = None,
+) -> None:
+    chunked = version != "HTTP/1.0"
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}", f"Content-Type: {content_type}"]
+    # A CR or LF in a value would end the header early
+    head += [f"{k}: {' '.join(str(v).splitlines())}" for k, v in (extra or {}).items()]
+    head.append("Transfer-Encoding: chunked" if chunked else f"Content-Length: {len(body)}")
+    head.append("Connection: keep-alive" if keep_alive else "Connection: close")
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+    if not chunked:
+        writer.write(body)
+        await writer.drain()
+        return
+    view = memoryview(body)
+    for start in range(0, len(body), STREAM_CHUNK):
+        piece = view[start:start + STREAM_CHUNK]
+        writer.write(b"%x\r\n" % len(piece))
+        writer.write(piece)
+        writer.write(b"\r\n")
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+async def serve(host: str, port: int, cache: ResponseCache, ready: Optional[asyncio.Event] = None) -> None:
+    service = GeneratorService(cache)
+    # Warm the config cache and the default controller's generator before accepting requests
+    defaults = _ConfigDefaults()
+    load_generator(str(defaults.get("controller", "tnc640")))
+    server = await asyncio.start_server(service.handle, host, port, backlog=1024)
+    addresses = ", ".join(f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in server.sockets)
+    print(f"Serving warmup programs on {addresses}", file=sys.stderr)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m cnc_warmup serve", description="Serve warmup programs over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default: localhost only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-entries", type=int, default=1024, help="Memoized responses to keep")
+    parser.add_argument("--cache-mb", type=float, default=64.0, help="Memory bound for memoized responses")
+    args = parser.parse_args(argv)
+
+    cache = ResponseCache(max(1, args.cache_entries), int(args.cache_mb * 1024 * 1024))
+    try:
+        asyncio.run(serve(args.host, args.port, cache))
+    except KeyboardInterrupt:
+        pass
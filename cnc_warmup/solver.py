@@ -0,0 +1,174 @@
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from .estimate import estimate_batch
+
+"""
+
+Target-duration solver.
+
+Picks RPM steps, dwell per step and the axis feed ramp so a warmup fits a fixed
+time window while maximizing thermal coverage: dwell seconds weighted by the
+spindle speed held, relative to the finish RPM, so time spent near the top of
+the ramp counts most.
+
+The search is batched: axis phase times for every machine and feed candidate
+come from one estimate_batch call per controller, and the spindle phase is
+solved analytically per feed candidate and step count (dwell = remaining
+budget / steps), so no program text is generated while searching.
+
+Notes:
+Feeds stay within the default start/finish feed bounds; the start feed is one
+of FEED_CANDIDATES values between them. Feed, steps and dwell are chosen
+together for the highest coverage that fits, so a faster axis ramp wins when
+the time it saves buys spindle dwell; the slower feed ramp only breaks ties.
+
+"""
+
+# Start feed candidates between the start and finish feed bounds
+FEED_CANDIDATES = 9
+
+
+# Search bounds, usually taken from the config defaults
+@dataclass
+class SolverBounds:
+    start_rpm: float
+    finish_rpm: float
+    start_feed: float
+    finish_feed: float
+    min_steps: int
+    max_steps: int
+    max_seconds_per_step: int
+
+    @classmethod
+    def from_defaults(cls, defaults: Mapping[str, Any]) -> "SolverBounds":
+        min_steps = max(1, int(defaults.get("rpm_steps", 5)))
+        return cls(
+            start_rpm=float(defaults.get("start_rpm", 500)),
+            finish_rpm=float(defaults.get("finish_rpm", 6000)),
+            start_feed=float(defaults.get("start_feed", 1000)),
+            finish_feed=float(defaults.get("finish_feed", 2000)),
+            min_steps=min_steps,
+            max_steps=max(min_steps, int(defaults.get("max_rpm_steps", 50))),
+            max_seconds_per_step=max(1, int(defaults.get("max_seconds_per_step", 600))),
+        )
+
+
+# Chosen settings for one machine
+@dataclass
+class WarmupSolution:
+    steps: int
+    seconds_per_step: int
+    start_feed: float
+    finish_feed: float
+    estimated_seconds: float
+    coverage_seconds: float  # RPM-weighted dwell seconds
+    feasible: bool  # False if even the shortest program overruns the target
+
+    # Keyword arguments for generate_program
+    def params(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "seconds_per_step": self.seconds_per_step,
+            "start_feed_mm_min": self.start_feed,
+            "finish_feed_mm_min": self.finish_feed,
+        }
+
+    def format(self) -> str:
+        minutes = self.estimated_seconds / 60.0
+        status = "" if self.feasible else " (target too short, shortest program shown)"
+        return (
+            f"steps={self.steps} seconds_per_step={self.seconds_per_step} "
+            f"feed={self.start_feed:g}->{self.finish_feed:g} mm/min "
+            f"estimated={minutes:.2f} min coverage={self.coverage_seconds:.0f} s{status}"
+        )
+
+
+# RPM held at each dwell, per controller loop semantics (see estimate.py)
+def _dwell_rpms(controller: str, steps: int, start_rpm: float, finish_rpm: float) -> List[float]:
+    if controller == "fanuc31i":
+        n = max(2, steps)
+        return [start_rpm + (finish_rpm - start_rpm) * i / (n - 1) for i in range(n)]
+    n = max(1, steps)
+    return [start_rpm + (finish_rpm - start_rpm) * i / n for i in range(1, n + 1)]
+
+
+# Solve every machine of a fleet for one controller.
+def solve_fleet(
+    controller: str,
+    travels: Sequence[Tuple[float, float, float]],
+    target_seconds: float,
+    bounds: SolverBounds,
+) -> List[WarmupSolution]:
+    if not math.isfinite(target_seconds) or target_seconds <= 0:
+        raise ValueError(f"Target duration must be a positive number of seconds, got {target_seconds!r}")
+    lo, hi = bounds.start_feed, bounds.finish_feed
+    feeds = [lo + (hi - lo) * k / (FEED_CANDIDATES - 1) for k in range(FEED_CANDIDATES)]
+
+    # Axis phase time for every (machine, start feed) pair in one call
+    rows = [(t, f) for t in travels for f in feeds]
+    axis = estimate_batch(
+        controller,
+        {
+            "x_travel": [t[0] for t, _ in rows],
+            "y_travel": [t[1] for t, _ in rows],
+            "z_travel": [t[2] for t, _ in rows],
+            "start_feed_mm_min": [f for _, f in rows],
+            "finish_feed_mm_min": [hi] * len(rows),
+            "steps": [0] * len(rows),
+            "seconds_per_step": [0] * len(rows),
+        },
+    )
+    axis_seconds = [a + b for a, b in zip(axis["z_seconds"], axis["xy_seconds"])]
+
+    # Per step count: number of dwells and RPM-weighted dwell count (machine independent)
+    step_options = []
+    for n in range(bounds.min_steps, bounds.max_steps + 1):
+        rpms = _dwell_rpms(controller, n, bounds.start_rpm, bounds.finish_rpm)
+        weight = sum(rpms) / bounds.finish_rpm if bounds.finish_rpm else 0.0
+        step_options.append((n, len(rpms), weight))
+
+    solutions = []
+    for m in range(len(travels)):
+        times = axis_seconds[m * FEED_CANDIDATES:(m + 1) * FEED_CANDIDATES]
+        best = None
+        for k, axis_time in enumerate(times):
+            budget = target_seconds - axis_time
+            for n, dwells, weight in step_options:
+                dwell = min(bounds.max_seconds_per_step, int(math.floor(budget / dwells))) if budget > 0 else 0
+                dwell = max(1, dwell)
+                total = axis_time + dwells * dwell
+                coverage = dwell * weight
+                # Maximize coverage, then prefer the slower (wider) feed ramp, then
+                # fill the window, then the finer ramp; if nothing fits, fall back
+                # to the shortest program
+                fits = total <= target_seconds
+                key = (fits, coverage if fits else -total, -k, total if fits else -n, n)
+                if best is None or key > best[0]:
+                    best = (key, k, n, dwell, total, coverage)
+        key, k, n, dwell, total, coverage = best
+        solutions.append(
+            WarmupSolution(
+                steps=n,
+                seconds_per_step=dwell,
+                start_feed=feeds[k],
+                finish_feed=hi,
+                estimated_seconds=total,
+                coverage_seconds=coverage,
+                feasible=key[0],
+            )
+        )
+    return solutions
+
+
+# Solve a single machine.
+def solve(
+    controller: str,
+    x_travel: float,
+    y_travel: float,
+    z_travel: float,
+    target_seconds: float,
+    bounds: SolverBounds,
+) -> WarmupSolution:
+    return solve_fleet(controller, [(x_travel, y_travel, z_travel)], target_seconds, bounds)[0]
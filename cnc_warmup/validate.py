@@ -0,0 +1,902 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+"""
+
+Post-generation validator for warmup programs.
+
+Each controller has a small streaming interpreter: blocks are consumed once, in
+order, and executed as they arrive (loop bodies are buffered only until their
+closing block has been seen, then run). Executed blocks that no loop or jump
+can reach again are dropped, so straight-line programs validate in constant
+memory. While executing, every move is checked
+against the machine envelope derived from the generate_program arguments, and
+spindle speed and feed against their configured ranges. Structure is checked
+as blocks arrive, so the first bad block fails immediately.
+
+- Fanuc 31i: % delimiters and O number, macro expressions and variables
+  (reads of unset variables are errors), WHILE/DO/END pairing and nesting,
+  IF/THEN/ELSE/ENDIF balance, modal G00/G01, G90/G91 and F, G53 only in G90,
+  absolute moves only in machine coordinates (G53).
+- TNC 640: contiguous block numbers from 0, BEGIN/END PGM names, Q parameter
+  expressions, L moves in machine coordinates (M91), modal F, LBL definitions
+  and FN 9-12 conditional jumps.
+
+Envelope (machine coordinates): Fanuc X/Y centered on 0 (+-travel/2), TNC X/Y
+from 0 to travel; Z from -z_travel to 0 on both.
+
+Notes:
+Only the constructs the generators emit are understood; anything else is
+reported as unsupported rather than skipped. Jumps must target blocks already
+seen (backward), which is all the generators produce.
+
+"""
+
+# Budget for blocks executed again by loops and jumps; a program re-executing
+# more is treated as a runaway loop. Straight-line (unrolled) blocks run once
+# each and do not count against it.
+MAX_EXECUTED_BLOCKS = 1_000_000
+# Slack for values rounded when formatted into the program (mm, rpm, mm/min)
+TOLERANCE = 1e-3
+
+
+class ValidationError(ValueError):
+    def __init__(self, message: str, block: Optional[int] = None, text: str = "", source: str = "") -> None:
+        self.message = message
+        self.block = block
+        self.text = text
+        self.source = source
+        where = f"block {block}" if block is not None else "end of program"
+        prefix = f"{source}: " if source else ""
+        suffix = f": {text.strip()}" if text.strip() else ""
+        super().__init__(f"{prefix}{where}: {message}{suffix}")
+
+    # Keep the block reference when raised in a batch pool worker
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (ValidationError, (self.message, self.block, self.text, self.source))
+
+
+# Allowed motion, spindle and feed ranges for one program
+@dataclass
+class Envelope:
+    limits: Dict[str, Tuple[float, float]]
+    max_rpm: float
+    max_feed: float
+
+    @classmethod
+    def for_program(cls, controller: str, params: Mapping[str, Any]) -> "Envelope":
+        x = abs(float(params["x_travel"]))
+        y = abs(float(params["y_travel"]))
+        z = abs(float(params["z_travel"]))
+        if controller == "fanuc31i":
+            limits = {"X": (-x / 2.0, x / 2.0), "Y": (-y / 2.0, y / 2.0), "Z": (-z, 0.0)}
+        elif controller == "tnc640":
+            limits = {"X": (0.0, x), "Y": (0.0, y), "Z": (-z, 0.0)}
+        else:
+            raise ValueError(f"Unknown controller: {controller}")
+        rpms = [float(params.get("start_rpm", 0)), float(params.get("finish_rpm", 0))]
+        rpms += [float(rpm) for rpm, _ in params.get("spindle_ramp") or ()]
+        feeds = [float(params["start_feed_mm_min"]), float(params["finish_feed_mm_min"])]
+        feeds += [float(f) for f in params.get("feed_ramp") or ()]
+        return cls(limits=limits, max_rpm=max(rpms), max_feed=max(feeds))
+
+
+# What a validated program did
+@dataclass
+class ValidationReport:
+    controller: str
+    blocks: int = 0
+    executed: int = 0
+    moves: int = 0
+    extents: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    max_rpm: float = 0.0
+
+    def format(self) -> str:
+        axes = "  ".join(f"{a} {lo:g}..{hi:g}" for a, (lo, hi) in sorted(self.extents.items()))
+        return (
+            f"{self.controller}: {self.blocks} blocks, {self.executed} executed, {self.moves} moves, "
+            f"max S{self.max_rpm:g}  {axes}"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Shared machine state
+
+
+class _Machine:
+    def __init__(self, controller: str, envelope: Envelope, source: str) -> None:
+        self.envelope = envelope
+        self.source = source
+        self.report = ValidationReport(controller)
+        self.position: Dict[str, Optional[float]] = {"X": None, "Y": None, "Z": None}
+        self.block = 0
+        self.text = ""
+
+    def error(self, message: str) -> ValidationError:
+        return ValidationError(message, self.block, self.text, self.source)
+
+    def tick(self) -> None:
+        self.report.executed += 1
+        if self.report.executed - self.report.blocks > MAX_EXECUTED_BLOCKS:
+            raise self.error(f"more than {MAX_EXECUTED_BLOCKS} blocks re-executed (loop does not terminate?)")
+
+    # Move to machine coordinates (None = axis not programmed)
+    def move_to(self, target: Mapping[str, float]) -> None:
+        for axis, value in target.items():
+            lo, hi = self.envelope.limits[axis]
+            if not lo - TOLERANCE <= value <= hi + TOLERANCE:
+                raise self.error(f"{axis}{value:g} outside machine envelope {axis}{lo:g}..{hi:g}")
+            self.position[axis] = value
+            seen = self.report.extents.get(axis)
+            self.report.extents[axis] = (value, value) if seen is None else (min(seen[0], value), max(seen[1], value))
+        self.report.moves += 1
+
+    # Incremental move; every moved axis must have a known position
+    def move_by(self, delta: Mapping[str, float]) -> None:
+        target = {}
+        for axis, d in delta.items():
+            current = self.position[axis]
+            if current is None:
+                raise self.error(f"incremental {axis} move from an unknown position")
+            target[axis] = current + d
+        self.move_to(target)
+
+    def check_feed(self, feed: Optional[float]) -> None:
+        if feed is None:
+            raise self.error("feed move without a programmed feed rate")
+        if feed <= 0 or feed > self.envelope.max_feed + TOLERANCE:
+            raise self.error(f"feed {feed:g} outside 0..{self.envelope.max_feed:g} mm/min")
+
+    def check_rpm(self, rpm: float) -> None:
+        if rpm < 0 or rpm > self.envelope.max_rpm + TOLERANCE:
+            raise self.error(f"spindle speed S{rpm:g} outside 0..{self.envelope.max_rpm:g}")
+        self.report.max_rpm = max(self.report.max_rpm, rpm)
+
+
+# ---------------------------------------------------------------------------
+# Fanuc 31i
+
+_FANUC_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*|\.\d+)|([A-Z]+)|(.))")
+_FANUC_FUNCS: Dict[str, Callable[[float], float]] = {
+    "FIX": lambda v: float(math.floor(v)),
+    "FUP": lambda v: float(math.ceil(v)),
+    "ROUND": lambda v: float(math.floor(v + 0.5)) if v >= 0 else -float(math.floor(-v + 0.5)),
+    "ABS": abs,
+    "SQRT": math.sqrt,
+    "SIN": lambda v: math.sin(math.radians(v)),
+    "COS": lambda v: math.cos(math.radians(v)),
+}
+_FANUC_COMPARE: Dict[str, Callable[[float, float], bool]] = {
+    "EQ": lambda a, b: a == b,
+    "NE": lambda a, b: a != b,
+    "LT": lambda a, b: a < b,
+    "LE": lambda a, b: a <= b,
+    "GT": lambda a, b: a > b,
+    "GE": lambda a, b: a >= b,
+}
+# G codes that only set up modes the validator does not track
+_FANUC_SETUP_G = {17.0, 21.0, 40.0, 49.0, 80.0, 94.0}
+_FANUC_M = {3.0, 5.0, 8.0, 9.0, 30.0}
+
+
+class _FanucParser:
+    def __init__(self, text: str, fail: Callable[[str], ValidationError]) -> None:
+        self.tokens = [(m.group(1), m.group(2), m.group(3)) for m in _FANUC_TOKEN.finditer(text) if m.group(0).strip()]
+        self.pos = 0
+        self.fail = fail
+
+    def peek(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None, None)
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self.tokens)
+
+    def take(self) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        token = self.peek()
+        if self.at_end():
+            raise self.fail("unexpected end of block")
+        self.pos += 1
+        return token
+
+    def expect(self, symbol: str) -> None:
+        number, word, other = self.take()
+        if (word or other) != symbol:
+            raise self.fail(f"expected '{symbol}'")
+
+    def word(self) -> Optional[str]:
+        return self.peek()[1]
+
+    def integer(self) -> int:
+        number, _, _ = self.take()
+        if number is None or "." in number:
+            raise self.fail("expected an integer")
+        return int(number)
+
+    # Expression trees are tuples: ("num", v) ("var", expr) ("neg", e) ("func", f, e) (op, a, b)
+    def condition(self) -> tuple:
+        left = self.additive()
+        word = self.word()
+        if word in _FANUC_COMPARE:
+            self.pos += 1
+            left = ("cmp", word, left, self.additive())
+        while self.word() in ("AND", "OR"):
+            op = self.take()[1]
+            left = (op, left, self.condition())
+        return left
+
+    def additive(self) -> tuple:
+        left = self.term()
+        while self.peek()[2] in ("+", "-"):
+            op = self.take()[2]
+            left = (op, left, self.term())
+        return left
+
+    def term(self) -> tuple:
+        left = self.unary()
+        while self.peek()[2] in ("*", "/"):
+            op = self.take()[2]
+            left = (op, left, self.unary())
+        return left
+
+    def unary(self) -> tuple:
+        number, word, other = self.take()
+        if other == "-":
+            return ("neg", self.unary())
+        if other == "+":
+            return self.unary()
+        if number is not None:
+            return ("num", float(number))
+        if other == "#":
+            return ("var", self.variable_index())
+        if other == "[":
+            inner = self.condition()
+            self.expect("]")
+            return inner
+        if word in _FANUC_FUNCS:
+            self.expect("[")
+            inner = self.condition()
+            self.expect("]")
+            return ("func", word, inner)
+        raise self.fail(f"unexpected '{number or word or other}' in expression")
+
+    # After '#': a number or an indirect [expression]
+    def variable_index(self) -> tuple:
+        number, _, other = self.take()
+        if number is not None:
+            return ("num", float(number))
+        if other == "[":
+            inner = self.condition()
+            self.expect("]")
+            return inner
+        raise self.fail("expected a variable number after '#'")
+
+
+class _FanucValidator(_Machine):
+    def __init__(self, envelope: Envelope, source: str) -> None:
+        super().__init__("fanuc31i", envelope, source)
+        self.vars: Dict[int, float] = {}
+        self.absolute = True
+        self.motion: Optional[float] = None  # modal G00/G01
+        self.feed: Optional[float] = None
+        self.spindle_rpm = 0.0
+        self.statements: List[Tuple[int, str, tuple]] = []
+        self.open: List[Tuple[str, int, int]] = []  # (kind, DO number, statement index)
+        self.matches: Dict[int, int] = {}  # WHILE -> END, IF -> ELSE/ENDIF, ELSE -> ENDIF
+        self.pc = 0
+        self.started = False
+        self.numbered = False  # O number no longer allowed
+        self.ended = False
+        self.finished = False
+
+    def feed_line(self, lineno: int, line: str) -> None:
+        self.block = lineno
+        self.text = line
+        self.report.blocks += 1
+        text = _strip_fanuc_comments(line, self.error).strip().upper()
+        if not text:
+            return
+        if self.finished:
+            raise self.error("block after the closing %")
+        if text == "%":
+            if not self.started:
+                self.started = True
+                return
+            if self.open:
+                kind, number, index = self.open[-1]
+                raise ValidationError(f"unclosed {kind}{number or ''}", self.statements[index][0], self.statements[index][1], self.source)
+            if not self.ended:
+                raise self.error("program ends without M30")
+            self.finished = True
+            return
+        if not self.started:
+            raise self.error("program must start with %")
+        if text.startswith("N") and re.match(r"N\d+", text):
+            text = re.sub(r"^N\d+\s*", "", text)
+        if text.startswith("O"):
+            if self.numbered:
+                raise self.error("O number must be the first block")
+            if not re.fullmatch(r"O\d{1,4}", text):
+                raise self.error("malformed program number")
+            return
+
+        self.numbered = True
+        statement = self.parse(text)
+        index = len(self.statements)
+        self.statements.append((lineno, line, statement))
+        self.link(statement, index)
+        if not self.open:
+            self.run()
+            # Nothing can jump back into executed blocks once every loop and IF
+            # is closed, so drop them: memory stays flat for unrolled programs
+            self.statements.clear()
+            self.matches.clear()
+            self.pc = 0
+
+    def finish(self) -> ValidationReport:
+        self.block, self.text = None, ""
+        if not self.finished:
+            raise self.error("missing closing %")
+        return self.report
+
+    def parse(self, text: str) -> tuple:
+        p = _FanucParser(text, self.error)
+        word = p.word()
+        if word == "WHILE":
+            p.take()
+            p.expect("[")
+            cond = p.condition()
+            p.expect("]")
+            if p.word() != "DO":
+                raise self.error("WHILE without DO")
+            p.take()
+            number = p.integer()
+            return self.done(p, ("while", cond, number))
+        if word == "END":
+            p.take()
+            return self.done(p, ("end", p.integer()))
+        if word == "IF":
+            p.take()
+            p.expect("[")
+            cond = p.condition()
+            p.expect("]")
+            if p.word() == "THEN":
+                p.take()
+                if p.at_end():
+                    return ("if", cond)
+                target, expr = self.assignment(p)
+                return self.done(p, ("if_assign", cond, target, expr))
+            if p.word() == "GOTO":
+                raise self.error("GOTO is not supported by the validator")
+            raise self.error("IF without THEN")
+        if word in ("ELSE", "ENDIF"):
+            p.take()
+            return self.done(p, (word.lower(),))
+        if word == "GOTO":
+            raise self.error("GOTO is not supported by the validator")
+        if p.peek()[2] == "#":
+            target, expr = self.assignment(p)
+            return self.done(p, ("assign", target, expr))
+
+        words: List[Tuple[str, tuple]] = []
+        while not p.at_end():
+            _, letter, _ = p.take()
+            if letter is None or len(letter) != 1:
+                raise self.error("expected an address letter")
+            words.append((letter, p.unary()))
+        return ("words", words)
+
+    def assignment(self, p: _FanucParser) -> Tuple[tuple, tuple]:
+        p.expect("#")
+        target = p.variable_index()
+        p.expect("=")
+        return target, p.condition()
+
+    def done(self, p: _FanucParser, statement: tuple) -> tuple:
+        if not p.at_end():
+            raise self.error("unexpected text after statement")
+        return statement
+
+    # Track WHILE/END and IF/ELSE/ENDIF pairing as blocks arrive
+    def link(self, statement: tuple, index: int) -> None:
+        kind = statement[0]
+        if kind == "while":
+            number = statement[2]
+            if not 1 <= number <= 3:
+                raise self.error("DO number must be 1-3")
+            if any(k == "WHILE" and n == number for k, n, _ in self.open):
+                raise self.error(f"DO{number} reused inside an open DO{number} loop")
+            self.open.append(("WHILE", number, index))
+        elif kind == "end":
+            if not self.open or self.open[-1][0] != "WHILE" or self.open[-1][1] != statement[1]:
+                if self.open and self.open[-1][0] == "WHILE":
+                    raise self.error(f"END{statement[1]} does not close the innermost loop (expected END{self.open[-1][1]})")
+                raise self.error(f"END{statement[1]} without an open WHILE loop")
+            _, _, start = self.open.pop()
+            self.matches[start] = index
+            self.matches[index] = start
+        elif kind == "if":
+            self.open.append(("IF", 0, index))
+        elif kind == "else":
+            if not self.open or self.open[-1][0] != "IF":
+                raise self.error("ELSE without IF")
+            _, _, start = self.open.pop()
+            self.matches[start] = index
+            self.open.append(("ELSE", 0, index))
+        elif kind == "endif":
+            if not self.open or self.open[-1][0] not in ("IF", "ELSE"):
+                raise self.error("ENDIF without IF")
+            _, _, start = self.open.pop()
+            self.matches[start] = index
+
+    # Execute buffered statements (all control structures are closed at this point)
+    def run(self) -> None:
+        while self.pc < len(self.statements):
+            self.block, self.text, statement = self.statements[self.pc]
+            self.tick()
+            if self.ended:
+                raise self.error("block after M30")
+            kind = statement[0]
+            next_pc = self.pc + 1
+            if kind == "assign":
+                self.assign(statement[1], statement[2])
+            elif kind == "if_assign":
+                if self.eval(statement[1]):
+                    self.assign(statement[2], statement[3])
+            elif kind == "if":
+                if not self.eval(statement[1]):
+                    next_pc = self.matches[self.pc] + 1
+            elif kind == "else":
+                # Reached the end of the THEN branch: skip to after ENDIF
+                next_pc = self.matches[self.pc] + 1
+            elif kind == "while":
+                if not self.eval(statement[1]):
+                    next_pc = self.matches[self.pc] + 1
+            elif kind == "end":
+                next_pc = self.matches[self.pc]
+            elif kind == "words":
+                self.execute_words(statement[1])
+            self.pc = next_pc
+
+    def assign(self, target: tuple, expr: tuple) -> None:
+        index = self.eval(target)
+        if index != int(index) or not 1 <= index <= 999:
+            raise self.error(f"invalid variable #{index:g}")
+        self.vars[int(index)] = self.eval(expr)
+
+    def eval(self, expr: tuple) -> float:
+        kind = expr[0]
+        if kind == "num":
+            return expr[1]
+        if kind == "var":
+            index = self.eval(expr[1])
+            if index not in self.vars:
+                raise self.error(f"#{index:g} used before it is set")
+            return self.vars[int(index)]
+        if kind == "neg":
+            return -self.eval(expr[1])
+        if kind == "func":
+            return _FANUC_FUNCS[expr[1]](self.eval(expr[2]))
+        if kind == "cmp":
+            return float(_FANUC_COMPARE[expr[1]](self.eval(expr[2]), self.eval(expr[3])))
+        a, b = self.eval(expr[1]), self.eval(expr[2])
+        if kind == "+":
+            return a + b
+        if kind == "-":
+            return a - b
+        if kind == "*":
+            return a * b
+        if kind == "/":
+            if b == 0:
+                raise self.error("division by zero")
+            return a / b
+        if kind == "AND":
+            return float(bool(a) and bool(b))
+        return float(bool(a) or bool(b))
+
+    def execute_words(self, words: List[Tuple[str, tuple]]) -> None:
+        g_codes = []
+        axes: Dict[str, float] = {}
+        m_codes = []
+        feed = None
+        rpm = None
+        for letter, expr in words:
+            value = self.eval(expr)
+            if letter == "G":
+                g_codes.append(value)
+            elif letter in ("X", "Y", "Z"):
+                if letter in axes:
+                    raise self.error(f"{letter} programmed twice")
+                axes[letter] = value
+            elif letter == "F":
+                feed = value
+            elif letter == "S":
+                rpm = value
+            elif letter == "M":
+                m_codes.append(value)
+            else:
+                raise self.error(f"unsupported address {letter}")
+
+        machine_coords = False
+        dwell = False
+        for g in g_codes:
+            if g in (0.0, 1.0):
+                self.motion = g
+            elif g == 90.0:
+                self.absolute = True
+            elif g == 91.0:
+                self.absolute = False
+            elif g == 53.0:
+                machine_coords = True
+            elif g == 4.0:
+                dwell = True
+            elif g not in _FANUC_SETUP_G:
+                raise self.error(f"unsupported G{g:g}")
+        if feed is not None:
+            if feed <= 0:
+                raise self.error(f"feed F{feed:g} must be positive")
+            self.feed = feed
+        if rpm is not None:
+            self.check_rpm(rpm)
+            self.spindle_rpm = rpm
+        for m in m_codes:
+            if m not in _FANUC_M:
+                raise self.error(f"unsupported M{m:g}")
+            if m == 30.0:
+                self.ended = True
+
+        if dwell:
+            if set(axes) - {"X"} or axes.get("X", 0.0) < 0:
+                raise self.error("G04 needs a non-negative X dwell and no other axes")
+            return
+        if machine_coords and not self.absolute:
+            raise self.error("G53 in incremental mode (G91) is ignored by the control")
+        if not axes:
+            return
+        if self.motion is None:
+            raise self.error("axis move without G00/G01")
+        if self.motion == 1.0:
+            self.check_feed(self.feed)
+        if not self.absolute:
+            self.move_by(axes)
+        elif machine_coords:
+            self.move_to(axes)
+        else:
+            raise self.error("absolute move in work coordinates (G53 required to check the envelope)")
+
+
+def _strip_fanuc_comments(line: str, error: Callable[[str], ValidationError]) -> str:
+    out = []
+    depth = 0
+    for ch in line:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            if depth == 0:
+                raise error("unbalanced ')'")
+            depth -= 1
+        elif depth == 0:
+            out.append(ch)
+    if depth:
+        raise error("unclosed comment")
+    return "".join(out)
+
+
+# ---------------------------------------------------------------------------
+# TNC 640
+
+_TNC_BLOCK = re.compile(r"(\d+)(?:\s(.*))?$")
+_TNC_EXPR_TOKEN = re.compile(r"\s*(?:(\d+\.?\d*|\.\d+)|Q(\d+)|([A-Z]+)|(.))")
+_TNC_FUNCS: Dict[str, Callable[[float], float]] = {"ABS": abs, "INT": lambda v: float(math.trunc(v)), "SQRT": math.sqrt}
+_TNC_JUMPS: Dict[int, Tuple[str, Callable[[float, float], bool]]] = {
+    9: ("EQU", lambda a, b: a == b),
+    10: ("NE", lambda a, b: a != b),
+    11: ("GT", lambda a, b: a > b),
+    12: ("LT", lambda a, b: a < b),
+}
+_TNC_FIXED = {"PLANE RESET", "TRANS DATUM RESET", "FUNCTION RESET TCPM"}
+_TNC_M = {3, 5, 8, 9, 91}
+_TNC_OPERAND = r"([+-]?(?:Q\d+|\d+\.?\d*|\.\d+))"
+
+
+class _TncValidator(_Machine):
+    def __init__(self, envelope: Envelope, source: str) -> None:
+        super().__init__("tnc640", envelope, source)
+        self.q: Dict[int, float] = {}
+        self.feed: Optional[float] = None
+        self.spindle_rpm = 0.0
+        self.statements: List[Tuple[int, str, tuple]] = []
+        self.labels: Dict[str, int] = {}
+        self.pc = 0
+        self.expected_block = 0
+        self.program: Optional[Tuple[str, str]] = None
+        self.ended = False
+        self.calls: List[int] = []
+
+    def feed_line(self, lineno: int, line: str) -> None:
+        self.text = line
+        self.report.blocks += 1
+        self.block = self.expected_block
+        match = _TNC_BLOCK.match(line.strip())
+        if not match:
+            raise self.error("block without block number")
+        number = int(match.group(1))
+        if number != self.expected_block:
+            raise self.error(f"block number {number}, expected {self.expected_block}")
+        self.expected_block += 1
+        if self.ended:
+            raise self.error("block after END PGM")
+        body = (match.group(2) or "").split(";", 1)[0].strip().upper()
+        body = re.sub(r"\s+", " ", body)
+
+        if number == 0:
+            begin = re.fullmatch(r"BEGIN PGM (\S+) (MM|INCH)", body)
+            if not begin:
+                raise self.error("program must start with BEGIN PGM <name> MM|INCH")
+            self.program = (begin.group(1), begin.group(2))
+            return
+        end = re.fullmatch(r"END PGM (\S+) (MM|INCH)", body)
+        if end:
+            if self.program is None or (end.group(1), end.group(2)) != self.program:
+                raise self.error(f"END PGM does not match BEGIN PGM {' '.join(self.program or ())}")
+            self.ended = True
+            return
+        if not body:
+            return
+
+        statement = self.parse(body)
+        index = len(self.statements)
+        self.statements.append((number, line, statement))
+        if statement[0] == "label":
+            if statement[1] != "0":
+                if statement[1] in self.labels:
+                    raise self.error(f"LBL {statement[1]} defined twice")
+                self.labels[statement[1]] = index
+        self.run()
+        if not self.labels:
+            # Blocks before the first LBL can never run again (jumps and calls
+            # target labels), so unrolled programs are not kept in memory
+            self.statements.clear()
+            self.pc = 0
+
+    def finish(self) -> ValidationReport:
+        self.block, self.text = None, ""
+        if not self.ended:
+            raise self.error("missing END PGM")
+        return self.report
+
+    def parse(self, body: str) -> tuple:
+        if body in _TNC_FIXED:
+            return ("noop",)
+        assign = re.fullmatch(r"Q(\d+) ?= ?(.+)", body)
+        if assign:
+            return ("assign", int(assign.group(1)), self.expression(assign.group(2)))
+        if body == "L" or body.startswith("L "):
+            return ("move", self.move_words(body[2:].split()))
+        tool = re.fullmatch(r"TOOL CALL (\d+) ([XYZ])(?: S" + _TNC_OPERAND + r")?", body)
+        if tool:
+            return ("tool", self.operand(tool.group(3)) if tool.group(3) else None)
+        dwell = re.fullmatch(r"FUNCTION DWELL TIME ?" + _TNC_OPERAND, body)
+        if dwell:
+            return ("dwell", self.operand(dwell.group(1)))
+        label = re.fullmatch(r"LBL (\d+|\"[^\"]+\")", body)
+        if label:
+            return ("label", label.group(1))
+        call = re.fullmatch(r"CALL LBL (\d+|\"[^\"]+\")", body)
+        if call:
+            return ("call", call.group(1))
+        jump = re.fullmatch(
+            r"FN (\d+) ?: ?IF " + _TNC_OPERAND + r" (EQU|NE|GT|LT) " + _TNC_OPERAND + r" GOTO LBL (\d+|\"[^\"]+\")",
+            body,
+        )
+        if jump:
+            fn = int(jump.group(1))
+            if fn not in _TNC_JUMPS or _TNC_JUMPS[fn][0] != jump.group(3):
+                raise self.error(f"FN {fn} does not take {jump.group(3)}")
+            return ("jump", fn, self.operand(jump.group(2)), self.operand(jump.group(4)), jump.group(5))
+        m_only = re.fullmatch(r"M\d+(?: M\d+)*", body)
+        if m_only:
+            return ("m", [int(m[1:]) for m in body.split()])
+        raise self.error("unsupported block")
+
+    def operand(self, text: str) -> tuple:
+        return self.expression(text)
+
+    def move_words(self, words: List[str]) -> List[Tuple[str, Any]]:
+        parsed: List[Tuple[str, Any]] = []
+        for word in words:
+            if word == "FMAX":
+                parsed.append(("FMAX", None))
+            elif word[0] in "XYZ" and re.fullmatch(r"[XYZ]" + _TNC_OPERAND, word):
+                parsed.append((word[0], self.operand(word[1:])))
+            elif word[0] == "F" and re.fullmatch(r"F" + _TNC_OPERAND, word):
+                parsed.append(("F", self.operand(word[1:])))
+            elif re.fullmatch(r"M\d+", word):
+                parsed.append(("M", int(word[1:])))
+            elif word in ("R0", "RL", "RR"):
+                if word != "R0":
+                    raise self.error("radius compensation is not supported by the validator")
+            else:
+                raise self.error(f"unsupported word {word}")
+        return parsed
+
+    # Expression trees: ("num", v) ("q", n) ("neg", e) ("func", f, e) (op, a, b)
+    def expression(self, text: str) -> tuple:
+        tokens = [(m.group(1), m.group(2), m.group(3), m.group(4)) for m in _TNC_EXPR_TOKEN.finditer(text) if m.group(0).strip()]
+        pos = 0
+
+        def peek() -> Optional[str]:
+            return tokens[pos][3] if pos < len(tokens) else None
+
+        def additive() -> tuple:
+            nonlocal pos
+            left = term()
+            while peek() in ("+", "-"):
+                op = tokens[pos][3]
+                pos += 1
+                left = (op, left, term())
+            return left
+
+        def term() -> tuple:
+            nonlocal pos
+            left = unary()
+            while peek() in ("*", "/"):
+                op = tokens[pos][3]
+                pos += 1
+                left = (op, left, unary())
+            return left
+
+        def unary() -> tuple:
+            nonlocal pos
+            if pos >= len(tokens):
+                raise self.error("unexpected end of expression")
+            number, q, word, other = tokens[pos]
+            pos += 1
+            if other == "-":
+                return ("neg", unary())
+            if other == "+":
+                return unary()
+            if number is not None:
+                return ("num", float(number))
+            if q is not None:
+                return ("q", int(q))
+            if other == "(":
+                inner = additive()
+                if peek() != ")":
+                    raise self.error("missing ')'")
+                pos += 1
+                return inner
+            if word in _TNC_FUNCS:
+                return ("func", word, unary())
+            raise self.error(f"unexpected '{number or word or other}' in expression")
+
+        tree = additive()
+        if pos != len(tokens):
+            raise self.error("unexpected text after expression")
+        return tree
+
+    def eval(self, expr: tuple) -> float:
+        kind = expr[0]
+        if kind == "num":
+            return expr[1]
+        if kind == "q":
+            if expr[1] not in self.q:
+                raise self.error(f"Q{expr[1]} used before it is set")
+            return self.q[expr[1]]
+        if kind == "neg":
+            return -self.eval(expr[1])
+        if kind == "func":
+            return _TNC_FUNCS[expr[1]](self.eval(expr[2]))
+        a, b = self.eval(expr[1]), self.eval(expr[2])
+        if kind == "+":
+            return a + b
+        if kind == "-":
+            return a - b
+        if kind == "*":
+            return a * b
+        if b == 0:
+            raise self.error("division by zero")
+        return a / b
+
+    def run(self) -> None:
+        while self.pc < len(self.statements):
+            self.block, self.text, statement = self.statements[self.pc]
+            self.tick()
+            kind = statement[0]
+            next_pc = self.pc + 1
+            if kind == "assign":
+                self.q[statement[1]] = self.eval(statement[2])
+            elif kind == "move":
+                self.execute_move(statement[1])
+            elif kind == "tool":
+                if statement[1] is not None:
+                    rpm = self.eval(statement[1])
+                    self.check_rpm(rpm)
+                    self.spindle_rpm = rpm
+            elif kind == "dwell":
+                if self.eval(statement[1]) < 0:
+                    raise self.error("negative dwell time")
+            elif kind == "m":
+                self.check_m(statement[1])
+            elif kind == "label":
+                if statement[1] == "0" and self.calls:
+                    next_pc = self.calls.pop()
+            elif kind == "call":
+                next_pc = self.jump_target(statement[1])
+                self.calls.append(self.pc + 1)
+                if len(self.calls) > 8:
+                    raise self.error("label calls nested too deeply")
+            elif kind == "jump":
+                _, compare = _TNC_JUMPS[statement[1]]
+                if compare(self.eval(statement[2]), self.eval(statement[3])):
+                    next_pc = self.jump_target(statement[4])
+            self.pc = next_pc
+
+    def jump_target(self, label: str) -> int:
+        if label not in self.labels:
+            raise self.error(f"LBL {label} is not defined before this block")
+        return self.labels[label]
+
+    def check_m(self, codes: List[int]) -> None:
+        for m in codes:
+            if m not in _TNC_M or m == 91:
+                raise self.error(f"unsupported M{m}")
+
+    def execute_move(self, words: List[Tuple[str, Any]]) -> None:
+        axes: Dict[str, float] = {}
+        m_codes = []
+        rapid = False
+        for letter, value in words:
+            if letter in ("X", "Y", "Z"):
+                if letter in axes:
+                    raise self.error(f"{letter} programmed twice")
+                axes[letter] = self.eval(value)
+            elif letter == "F":
+                feed = self.eval(value)
+                if feed <= 0:
+                    raise self.error(f"feed F{feed:g} must be positive")
+                self.feed = feed
+            elif letter == "FMAX":
+                rapid = True
+            else:
+                m_codes.append(value)
+        if not axes:
+            self.check_m(m_codes)
+            return
+        if 91 not in m_codes:
+            raise self.error("move without M91 (machine coordinates required to check the envelope)")
+        self.check_m([m for m in m_codes if m != 91])
+        if not rapid:
+            self.check_feed(self.feed)
+        self.move_to(axes)
+
+
+# ---------------------------------------------------------------------------
+
+
+_VALIDATORS: Dict[str, Callable[[Envelope, str], Any]] = {
+    "fanuc31i": _FanucValidator,
+    "tnc640": _TncValidator,
+}
+
+
+# Validate program blocks (lines without newlines, or with them) as they are produced.
+# params are the generate_program arguments the program was generated from.
+def validate_program(
+    controller: str, blocks: Iterable[str], params: Mapping[str, Any], source: str = ""
+) -> ValidationReport:
+    if controller not in _VALIDATORS:
+        raise ValueError(f"Unknown controller: {controller}")
+    validator = _VALIDATORS[controller](Envelope.for_program(controller, params), source)
+    lineno = 0
+    for chunk in blocks:
+        for line in chunk.splitlines() or [""]:
+            lineno += 1
+            validator.feed_line(lineno, line)
+    return validator.finish()
+
+
+def validate_file(controller: str, path: str, params: Mapping[str, Any]) -> ValidationReport:
+    with open(path, "r", encoding="utf-8") as f:
+        return validate_program(controller, f, params, source=path)
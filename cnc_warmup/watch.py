@@ -0,0 +1,275 @@
+import argparse
+import os
+import select
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from .batch import BatchSummary, plan_jobs, run_batch
+from .config_loader import MachinePreset, default_config_path, get_defaults, get_machine_index, load_config
+from .config_loader import clear_config_cache
+from .generators import available_controllers
+from .ramps import apply_ramp, ramp_settings
+
+"""
+
+Watch mode: regenerate programs when the config changes.
+
+Run with:
+python -m cnc_warmup watch [--output-dir generated] [--debounce 0.3] [--poll]
+
+Writes every program once at startup (like --all-machines; files that are
+already up to date are not rewritten), then waits for warmup_config.json to
+change. Each change is diffed against the previously loaded config:
+
+- a change to "defaults" regenerates every machine,
+- an added or edited preset regenerates only that machine,
+- a removed preset is reported; its files are left in place.
+
+Edits are debounced: regeneration starts once the file has been quiet for
+--debounce seconds, so an editor's save (often several writes or a rename)
+triggers one run. A config that fails to parse is reported and the previous
+one stays in effect until the next change.
+
+Notes:
+On Linux the config's directory is watched with inotify (through ctypes), which
+also catches editors that save by renaming a temporary file over the config.
+Elsewhere, or with --poll, the file's mtime/size/inode are polled every
+--poll-interval seconds.
+
+"""
+
+# inotify event masks (linux/inotify.h)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+# struct inotify_event header: wd, mask, cookie, len
+_IN_EVENT = struct.Struct("iIII")
+
+
+# What changed between two loaded configs
+@dataclass
+class ConfigChange:
+    defaults: bool = False
+    changed: List[str] = field(default_factory=list)  # added or edited presets
+    removed: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return self.defaults or bool(self.changed) or bool(self.removed)
+
+    def format(self) -> str:
+        parts = []
+        if self.defaults:
+            parts.append("defaults changed")
+        if self.changed:
+            parts.append(f"changed: {', '.join(self.changed)}")
+        if self.removed:
+            parts.append(f"removed (files kept): {', '.join(self.removed)}")
+        return "; ".join(parts) or "no changes affecting programs"
+
+
+# Only the travels of a preset go into its programs (controller/cell are labels)
+def _travels(preset: MachinePreset) -> tuple:
+    return (preset.x_travel, preset.y_travel, preset.z_travel)
+
+
+def diff_configs(old: Dict[str, Any], new: Dict[str, Any]) -> ConfigChange:
+    change = ConfigChange(defaults=get_defaults(old) != get_defaults(new))
+    old_index = get_machine_index(old)
+    new_index = get_machine_index(new)
+    for name, preset in new_index.items():
+        before = old_index.get(name)
+        if before is None or _travels(before) != _travels(preset):
+            change.changed.append(name)
+    change.removed = [name for name in old_index if name not in new_index]
+    return change
+
+
+# Regenerate the given machines (None = all) from config
+def regenerate(
+    config: Dict[str, Any],
+    output_dir: str,
+    controllers: Sequence[str],
+    machines: Optional[Sequence[str]] = None,
+    workers: int = 0,
+    validate: bool = False,
+) -> BatchSummary:
+    # Plan the whole fleet so file name collisions are still caught
+    jobs = plan_jobs(get_machine_index(config), get_defaults(config), controllers, output_dir)
+    if machines is not None:
+        wanted = set(machines)
+        jobs = [j for j in jobs if j.machine in wanted]
+    settings = ramp_settings(get_defaults(config))
+    for job in jobs:
+        job.params = apply_ramp(job.params, settings)
+        job.validate = validate
+    return run_batch(jobs, workers)
+
+
+# Waits for the config file to change, polling its stat stamp
+class PollingWatcher:
+    def __init__(self, path: str, interval: float = 0.5) -> None:
+        self.path = path
+        self.interval = interval
+        self._stamp = self._read_stamp()
+
+    def _read_stamp(self) -> Optional[tuple]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        # ctime too: an mtime-preserving copy (cp -p, rsync -t) still changes it
+        return (st.st_mtime_ns, st.st_size, st.st_ino, st.st_ctime_ns)
+
+    # True once the file changed, False if timeout (seconds, None = forever) passed first
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stamp = self._read_stamp()
+            if stamp != self._stamp:
+                self._stamp = stamp
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def close(self) -> None:
+        pass
+
+
+# Waits for the config file to change using inotify on its directory
+class InotifyWatcher:
+    def __init__(self, path: str) -> None:
+        import ctypes
+
+        # The running interpreter already links libc
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.name = os.fsencode(os.path.basename(path))
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), _IN_WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"cannot watch {directory}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if not ready:
+                return False
+            if self._drain():
+                return True
+
+    # Read queued events; True if any concerns the config file
+    def _drain(self) -> bool:
+        hit = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return hit
+            offset = 0
+            while offset + _IN_EVENT.size <= len(data):
+                _, _, _, length = _IN_EVENT.unpack_from(data, offset)
+                start = offset + _IN_EVENT.size
+                if data[start : start + length].rstrip(b"\0") == self.name:
+                    hit = True
+                offset = start + length
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def open_watcher(path: str, poll: bool = False, interval: float = 0.5) -> Any:
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except OSError:
+            pass
+    return PollingWatcher(path, interval)
+
+
+def _log(message: str) -> None:
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def _run(config: Dict[str, Any], args: Any, controllers: List[str], machines: Optional[List[str]]) -> None:
+    started = time.perf_counter()
+    try:
+        summary = regenerate(config, args.output_dir, controllers, machines, args.jobs, args.validate)
+    except ValueError as exc:
+        _log(f"Regeneration failed: {exc}")
+        return
+    elapsed = time.perf_counter() - started
+    written = summary.programs - summary.unchanged
+    _log(
+        f"Regenerated {summary.programs} program(s) for {len(machines) if machines is not None else 'all'} "
+        f"machine(s) in {elapsed * 1000:.1f} ms ({written} written, {summary.unchanged} unchanged)"
+    )
+
+
+def watch(args: Any, controllers: List[str], watcher: Any) -> None:
+    path = args.config or default_config_path()
+    config = load_config(path)
+    _log(f"Watching {path} ({type(watcher).__name__})")
+    _run(config, args, controllers, None)
+    while True:
+        watcher.wait()
+        # Debounce: wait until the file has been quiet for the whole window
+        while watcher.wait(args.debounce):
+            pass
+        # load_config's (mtime, size) stamp can miss a same-size edit within the
+        # mtime granularity or an mtime-preserving copy, so always reread
+        clear_config_cache()
+        try:
+            new_config = load_config(path)
+        except (OSError, ValueError) as exc:
+            _log(f"Config not reloaded, keeping the previous one: {exc}")
+            continue
+        if new_config == config:
+            continue
+        change = diff_configs(config, new_config)
+        config = new_config
+        _log(f"Config changed: {change.format()}")
+        if change.defaults:
+            _run(config, args, controllers, None)
+        elif change.changed:
+            _run(config, args, controllers, change.changed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m cnc_warmup watch", description="Regenerate programs on config changes")
+    parser.add_argument("--config", default=None, help="Config file (defaults to config/warmup_config.json)")
+    parser.add_argument("--output-dir", default="generated", help="Output directory")
+    parser.add_argument("--controller", choices=available_controllers(), default=None, help="Only this controller")
+    parser.add_argument("--jobs", type=int, default=0, help="Worker processes per run (defaults to CPU count)")
+    parser.add_argument("--debounce", type=float, default=0.3, help="Seconds the config must be quiet before regenerating")
+    parser.add_argument("--poll", action="store_true", help="Poll the file instead of using inotify")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="Seconds between polls")
+    parser.add_argument("--validate", action="store_true", help="Check programs before writing them")
+    args = parser.parse_args(argv)
+
+    controllers = [args.controller] if args.controller else available_controllers()
+    watcher = open_watcher(args.config or default_config_path(), args.poll, args.poll_interval)
+    try:
+        watch(args, controllers, watcher)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()